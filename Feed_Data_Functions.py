@@ -1,6 +1,7 @@
 import pandas as pd
-import pdfplumber
 from docx import Document
+from pdf_extract import extract_pdf_pages
+import type_inference
 
 def parse_csv(path: str) -> pd.DataFrame:
     return pd.read_csv(path)
@@ -8,23 +9,13 @@ def parse_csv(path: str) -> pd.DataFrame:
 def parse_excel(path: str) -> pd.DataFrame:
     return pd.read_excel(path)
 
-def parse_pdf(path: str) -> str:
-    texts = []
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            texts.append(page.extract_text() or "")
-    print(f"text  {texts}")
-    return "\n".join(texts)
+def parse_pdf(path: str, backend: str = "pdfplumber", max_chars=None) -> str:
+    pages = extract_pdf_pages(path, backend=backend, max_chars=max_chars)
+    return "\n".join(pages)
 
 def parse_docx(path: str) -> str:
     doc = Document(path)
     return "\n".join([p.text for p in doc.paragraphs if p.text.strip()])
 
 def normalize_financial_table(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.rename(columns=str.lower)
-    for c in df.columns:
-        try:
-            df[c] = pd.to_numeric(df[c].str.replace(',', ''), errors='ignore')
-        except Exception:
-            pass
-    return df
+    return type_inference.normalize_financial_table(df.rename(columns=str.lower))
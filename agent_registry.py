@@ -0,0 +1,245 @@
+import asyncio
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from os import getenv
+
+import httpx
+from agno.models.azure import AzureOpenAI
+from openai import AsyncAzureOpenAI as AsyncAzureOpenAIClient
+from openai import AzureOpenAI as AzureOpenAIClient
+
+from agents import (
+    create_allocation_agent,
+    create_data_ingest_agent,
+    create_hedging_agent,
+    create_market_risk_agent,
+    create_outlook_agent,
+    create_portfolio_risk_agent,
+    create_risk_agent,
+    create_strategy_agent,
+    create_stress_test_agent,
+    create_team,
+)
+from config import (
+    AZURE_OPENAI_API_KEY,
+    AZURE_OPENAI_DEPLOYMENT,
+    AZURE_OPENAI_ENDPOINT,
+    LLM_HTTP_KEEPALIVE,
+    LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_TIMEOUT,
+    LLM_SCHEDULER_ENABLED,
+)
+from llm_scheduler import scheduled
+
+AGENT_FACTORIES = {
+    "DataIngestAgent": create_data_ingest_agent,
+    "RiskAgent": create_risk_agent,
+    "StrategyAgent": create_strategy_agent,
+    "MarketRiskAgent": create_market_risk_agent,
+    "PortfolioRiskAgent": create_portfolio_risk_agent,
+    "StressTestAgent": create_stress_test_agent,
+    "AllocationAgent": create_allocation_agent,
+    "HedgingAgent": create_hedging_agent,
+    "OutlookAgent": create_outlook_agent,
+}
+PIPELINE_AGENTS = ("DataIngestAgent", "RiskAgent", "StrategyAgent")
+# FinanceTeam members that split the risk and strategy work in the fan-out mode
+TEAM_AGENTS = ("MarketRiskAgent", "PortfolioRiskAgent", "StressTestAgent",
+               "AllocationAgent", "HedgingAgent", "OutlookAgent")
+
+_lock = threading.RLock()
+_pid = None
+_agents = {}
+_teams = {}
+_sync_client = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncAzureOpenAIClient
+_http_pools = weakref.WeakKeyDictionary()  # SDK client -> its httpx pool, for warm-up
+_model_factory = None  # set_model_factory() override, e.g. a fake model for benchmarks
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_KEEPALIVE,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _check_pid():
+    """Forked children start with an empty registry instead of the parent's sockets."""
+    global _pid, _sync_client
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _agents.clear()
+        _teams.clear()
+        _async_clients.clear()
+        _sync_client = None
+
+
+@dataclass
+class PooledAzureOpenAI(AzureOpenAI):
+    """
+    AzureOpenAI model whose SDK clients come from the registry.
+
+    All agents share one keep-alive sync client for the process and one async
+    client per event loop (httpx async connections cannot move between loops,
+    and every asyncio.run() starts a new one). Calls go through the
+    llm_scheduler rate limits and retries unless LLM_SCHEDULER_ENABLED is off.
+    """
+
+    def get_client(self):
+        client = shared_client(self)
+        return scheduled(client) if LLM_SCHEDULER_ENABLED else client
+
+    def get_async_client(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return super().get_async_client()
+        client = shared_async_client(self)
+        return scheduled(client, is_async=True) if LLM_SCHEDULER_ENABLED else client
+
+
+def _model():
+    return PooledAzureOpenAI(
+        id=AZURE_OPENAI_DEPLOYMENT,
+        api_key=AZURE_OPENAI_API_KEY,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+    )
+
+
+def _retry_params(params):
+    # The scheduler retries within the rate budget; SDK retries would bypass it
+    return {**params, "max_retries": 0} if LLM_SCHEDULER_ENABLED else params
+
+
+def shared_client(model=None):
+    """Process-wide sync SDK client on a pooled httpx.Client."""
+    global _sync_client
+    with _lock:
+        _check_pid()
+        if _sync_client is None or _sync_client.is_closed():
+            params = (model or _model())._get_client_params()
+            http = httpx.Client(limits=_limits(), timeout=LLM_HTTP_TIMEOUT)
+            _sync_client = AzureOpenAIClient(**_retry_params(params), http_client=http)
+            _http_pools[_sync_client] = http
+        return _sync_client
+
+
+def shared_async_client(model=None):
+    """Async SDK client for the running event loop, created on first use in that loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _check_pid()
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed():
+            params = (model or _model())._get_client_params()
+            http = httpx.AsyncClient(limits=_limits(), timeout=LLM_HTTP_TIMEOUT)
+            client = _async_clients[loop] = AsyncAzureOpenAIClient(**_retry_params(params), http_client=http)
+            _http_pools[client] = http
+        return client
+
+
+def get_agent(name):
+    """The shared instance of agent `name`, built on first use."""
+    with _lock:
+        _check_pid()
+        agent = _agents.get(name)
+        if agent is None:
+            if name not in AGENT_FACTORIES:
+                raise KeyError(f"Unknown agent: {name}")
+            agent = _agents[name] = AGENT_FACTORIES[name](model=(_model_factory or _model)())
+        return agent
+
+
+def get_agents(names=PIPELINE_AGENTS):
+    return tuple(get_agent(name) for name in names)
+
+
+def get_team(names=TEAM_AGENTS):
+    """
+    The shared FinanceTeam of the registry's `names` agents. The coordinator
+    runs its members directly, side by side; the team's own leader model
+    (which would add a sequential routing call) is not used.
+    """
+    with _lock:
+        _check_pid()
+        team = _teams.get(names)
+        if team is None:
+            team = _teams[names] = create_team(list(get_agents(names)))
+        return team
+
+
+def set_model_factory(factory=None):
+    """
+    Build agents on `factory()` models instead of Azure (benchmarks, offline
+    replay); None restores the pooled Azure model. Clears the registry.
+    """
+    global _model_factory
+    reset_registry()
+    with _lock:
+        _model_factory = factory
+
+
+def _endpoint():
+    # Nothing to pre-connect to when agents run on a substitute model
+    if _model_factory is not None:
+        return None
+    return AZURE_OPENAI_ENDPOINT or getenv("AZURE_OPENAI_ENDPOINT")
+
+
+def warm_up(names=PIPELINE_AGENTS, connect=True):
+    """
+    Build the agents and, with `connect`, open a pooled connection to the endpoint
+    so the first model call skips DNS and the TLS handshake. Any HTTP status
+    counts as warm; returns False when the endpoint could not be reached.
+    """
+    get_agents(names)
+    if not connect or not _endpoint():
+        return True
+    try:
+        _http_pools[shared_client()].head(_endpoint(), timeout=5)
+        return True
+    except httpx.HTTPError:
+        return False
+
+
+async def awarm_up(names=PIPELINE_AGENTS, connect=True):
+    """warm_up() for the async pool of the running event loop."""
+    get_agents(names)
+    if not connect or not _endpoint():
+        return True
+    try:
+        await _http_pools[shared_async_client()].head(_endpoint(), timeout=5)
+        return True
+    except httpx.HTTPError:
+        return False
+
+
+async def aclose_http():
+    """Close the running loop's async client; call before the loop shuts down."""
+    with _lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def close_http():
+    """Close the sync client. Agents stay registered and reconnect on next use."""
+    global _sync_client
+    with _lock:
+        client, _sync_client = _sync_client, None
+    if client is not None:
+        client.close()
+
+
+def reset_registry():
+    """Drop all agents and clients, e.g. after changing the endpoint or credentials."""
+    close_http()
+    with _lock:
+        _agents.clear()
+        _teams.clear()
+        _async_clients.clear()
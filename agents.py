@@ -5,7 +5,15 @@ from agno.models.azure import AzureOpenAI
 from config import *
 
 
-def create_data_ingest_agent():
+def _default_model():
+    return AzureOpenAI(
+        id=AZURE_OPENAI_DEPLOYMENT,
+        api_key=AZURE_OPENAI_API_KEY,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+    )
+
+
+def create_data_ingest_agent(model=None):
     return Agent(
         name="DataIngestAgent",
         role="""
@@ -36,11 +44,7 @@ def create_data_ingest_agent():
        
 
         """,
-        model=AzureOpenAI(
-            id=AZURE_OPENAI_DEPLOYMENT,
-            api_key=AZURE_OPENAI_API_KEY,
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-        ),
+        model=model or _default_model(),
         instructions=[
             "Ensure data integrity before processing",
             "Provide clear, professional descriptions of findings",
@@ -52,7 +56,7 @@ def create_data_ingest_agent():
     )
 
 
-def create_risk_agent():
+def create_risk_agent(model=None):
     return Agent(
         name="RiskAgent",
         role="""
@@ -90,23 +94,20 @@ def create_risk_agent():
         """,
            
       
-        model=AzureOpenAI(
-            id=AZURE_OPENAI_DEPLOYMENT,
-            api_key=AZURE_OPENAI_API_KEY,
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-        ),
+        model=model or _default_model(),
         instructions=[
             "Use industry-standard risk calculation methodologies",
             "Provide confidence intervals for risk estimates",
             "Include both absolute and relative risk measures",
             "Highlight critical risk thresholds and breaches",
+            "When computed risk metrics are supplied, quote those figures exactly and interpret them; never invent figures that were not supplied",
             "Do NOT use markdown symbols (#, *, **, -). Use plain English with bullet points or numbered lists only if necessary. Format all sections as clean professional text suitable for a client PDF report."
 
         ]
     )
 
 
-def create_strategy_agent():
+def create_strategy_agent(model=None):
     return Agent(
         name="StrategyAgent",
         role="""
@@ -139,11 +140,7 @@ def create_strategy_agent():
         Combine quantitative analysis with qualitative market insights for comprehensive strategies.
         Ensure the language is clear, actionable, and suitable for presentation to management or clients.
         """,
-        model=AzureOpenAI(
-            id=AZURE_OPENAI_DEPLOYMENT,
-            api_key=AZURE_OPENAI_API_KEY,
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-        ),
+        model=model or _default_model(),
         instructions=[
             "Base recommendations on data-driven analysis",
             "Consider multiple time horizons (short, medium, long-term)",
@@ -154,6 +151,96 @@ def create_strategy_agent():
         ]
     )
 
+# FinanceTeam members for the fan-out mode: each takes one focused slice of the
+# risk or strategy work, so the completions are short and run side by side
+_MEMBER_INSTRUCTIONS = [
+    "Cover only your own focus area; other team members write the rest of the section",
+    "Keep the analysis under 250 words",
+    "When computed risk metrics are supplied, quote those figures exactly and interpret them; never invent figures that were not supplied",
+    "Do NOT use markdown symbols (#, *, **, -). Use plain English with bullet points or numbered lists only if necessary. Format all sections as clean professional text suitable for a client PDF report."
+]
+
+
+def create_market_risk_agent(model=None):
+    return Agent(
+        name="MarketRiskAgent",
+        role="""
+        You are a Market Risk Analyst. Assess the market risk of the data provided:
+        Value at Risk and Expected Shortfall, maximum drawdown and recovery,
+        volatility, and risk-adjusted returns (Sharpe, Sortino, Calmar).
+        Explain what each figure means for the business in simple language.
+        """,
+        model=model or _default_model(),
+        instructions=_MEMBER_INSTRUCTIONS,
+    )
+
+
+def create_portfolio_risk_agent(model=None):
+    return Agent(
+        name="PortfolioRiskAgent",
+        role="""
+        You are a Portfolio Risk Analyst. Assess the portfolio-level risk of the
+        data provided: beta and systematic risk, correlations and diversification
+        benefits, concentration and sector exposure, and liquidity risk.
+        Explain what each finding means for the business in simple language.
+        """,
+        model=model or _default_model(),
+        instructions=_MEMBER_INSTRUCTIONS,
+    )
+
+
+def create_stress_test_agent(model=None):
+    return Agent(
+        name="StressTestAgent",
+        role="""
+        You are a Stress Testing Specialist. Interpret the Monte Carlo projections,
+        stress scenarios and tail behaviour (skewness, kurtosis) of the data
+        provided, and name the early warning indicators management should watch.
+        """,
+        model=model or _default_model(),
+        instructions=_MEMBER_INSTRUCTIONS,
+    )
+
+
+def create_allocation_agent(model=None):
+    return Agent(
+        name="AllocationAgent",
+        role="""
+        You are an Asset Allocation Advisor. Recommend allocation, rebalancing and
+        investment opportunities based on the data and computed risk figures,
+        with a clear rationale and implementation considerations for each.
+        """,
+        model=model or _default_model(),
+        instructions=_MEMBER_INSTRUCTIONS,
+    )
+
+
+def create_hedging_agent(model=None):
+    return Agent(
+        name="HedgingAgent",
+        role="""
+        You are a Risk Mitigation Advisor. Recommend hedging strategies and risk
+        mitigation approaches for the exposures shown by the data and computed
+        risk figures, including their costs and trade-offs.
+        """,
+        model=model or _default_model(),
+        instructions=_MEMBER_INSTRUCTIONS,
+    )
+
+
+def create_outlook_agent(model=None):
+    return Agent(
+        name="OutlookAgent",
+        role="""
+        You are a Strategic Investment Advisor. Give the forward-looking outlook
+        and the tactical adjustments to make over short, medium and long-term
+        horizons, written as an executive summary for decision makers.
+        """,
+        model=model or _default_model(),
+        instructions=_MEMBER_INSTRUCTIONS,
+    )
+
+
 def create_team(agents):
     # agents should be a list of Agent instances
     return Team(name="FinanceTeam", members=agents)
@@ -0,0 +1,417 @@
+"""
+Benchmarks for the report pipeline with synthetic inputs and a fake model.
+
+    python benchmark.py --formats csv,txt --sizes 1KB,1MB,100MB --repeat 3 --out bench.json
+    python benchmark.py --compare bench_old.json --out bench_new.json
+
+Inputs are generated once into --data-dir and reused. Agents run on
+fake_model.FakeModel, so no network is used and the numbers depend only on
+this machine and this version of the code. Caches are bypassed unless --warm.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import current_rss_mb, peak_rss_mb
+
+FORMATS = ("csv", "xlsx", "json", "pdf", "docx", "txt")
+EXCEL_MAX_ROWS = 1_048_575
+_UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "B": 1}
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    for unit, factor in _UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+# ------------------------ Synthetic inputs ------------------------
+
+def _price_block(rng, start, rows, n_assets=8):
+    """`rows` minutes of prices for `n_assets` instruments as a wide table."""
+    dates = pd.date_range("2000-01-03", periods=start + rows, freq="min")[start:]
+    steps = rng.normal(0.0, 0.001, size=(rows, n_assets))
+    prices = 100.0 * np.exp(np.cumsum(steps, axis=0) + rng.normal(0, 0.2, size=n_assets))
+    df = pd.DataFrame(prices.round(4), columns=[f"ASSET_{i}" for i in range(n_assets)])
+    df.insert(0, "date", dates)
+    df["volume"] = rng.integers(1_000, 1_000_000, size=rows)
+    return df
+
+
+def _prose(rng, words=200):
+    from fake_model import fake_completion_text
+    return fake_completion_text(str(rng.integers(1 << 62)), int(words / 0.75))
+
+
+def write_csv(path, size, seed=0, block_rows=50_000):
+    rng = np.random.default_rng(seed)
+    start = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        while True:
+            rows = block_rows if size > 1024 * 1024 else max(5, size // 80)
+            block = _price_block(rng, start, rows)
+            block.to_csv(f, index=False, header=start == 0)
+            start += rows
+            if f.tell() >= size:
+                break
+
+
+def write_json(path, size, seed=0, block_rows=20_000):
+    rng = np.random.default_rng(seed)
+    start = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        while True:
+            rows = block_rows if size > 1024 * 1024 else max(3, size // 200)
+            block = _price_block(rng, start, rows)
+            block["date"] = block["date"].astype(str)
+            body = ",\n".join(json.dumps(r) for r in block.to_dict(orient="records"))
+            f.write(("," if start else "") + body)
+            start += rows
+            if f.tell() >= size:
+                break
+        f.write("]")
+
+
+def write_txt(path, size, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        section = 1
+        while f.tell() < size:
+            f.write(f"SECTION {section} FINANCIAL REVIEW\n{_prose(rng)}\n\n")
+            section += 1
+
+
+def _scaled(writer, path, size, sample_units):
+    """Write a sample, measure bytes per unit, then write the real file at the right unit count."""
+    writer(path, sample_units)
+    per_unit = max(os.path.getsize(path) / sample_units, 1)
+    writer(path, max(1, int(size / per_unit)))
+
+
+def write_xlsx(path, size, seed=0):
+    from openpyxl import Workbook
+
+    def writer(target, rows):
+        rng = np.random.default_rng(seed)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("prices")
+        rows = min(rows, EXCEL_MAX_ROWS)
+        start = 0
+        while start < rows:
+            block = _price_block(rng, start, min(50_000, rows - start))
+            if start == 0:
+                ws.append(list(block.columns))
+            for record in block.itertuples(index=False):
+                ws.append([record[0].to_pydatetime(), *record[1:]])
+            start += len(block)
+        wb.save(target)
+
+    _scaled(writer, path, size, 200)
+
+
+def write_pdf(path, size, seed=0):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    def writer(target, pages):
+        rng = np.random.default_rng(seed)
+        c = canvas.Canvas(target, pagesize=A4)
+        for page in range(pages):
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(50, 800, f"{page + 1}. Quarterly Financial Review")
+            c.setFont("Helvetica", 9)
+            text = _prose(rng, 400).replace("\n", " ")
+            words = text.split(" ")
+            y = 780
+            for i in range(0, len(words), 14):
+                c.drawString(50, y, " ".join(words[i:i + 14]))
+                y -= 12
+                if y < 50:
+                    break
+            c.showPage()
+        c.save()
+
+    _scaled(writer, path, size, 4)
+
+
+def write_docx(path, size, seed=0):
+    from docx import Document
+
+    def writer(target, paragraphs):
+        rng = np.random.default_rng(seed)
+        doc = Document()
+        for i in range(paragraphs):
+            if i % 5 == 0:
+                doc.add_heading(f"Section {i // 5 + 1}", level=2)
+            doc.add_paragraph(_prose(rng, 120))
+        doc.save(target)
+
+    _scaled(writer, path, size, 20)
+
+
+WRITERS = {
+    "csv": write_csv,
+    "xlsx": write_xlsx,
+    "json": write_json,
+    "pdf": write_pdf,
+    "docx": write_docx,
+    "txt": write_txt,
+}
+
+
+def synthetic_input(data_dir, fmt, size_label, seed=0):
+    """Path of the synthetic input for (format, size), generated on first use."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic_{size_label}_{seed}.{fmt}")
+    if not os.path.exists(path):
+        tmp = path + ".tmp"
+        WRITERS[fmt](tmp, parse_size(size_label), seed)
+        os.replace(tmp, path)
+    return path
+
+
+# ------------------------ Measurement ------------------------
+
+def measure(fn, repeat, warmup=1, setup=None):
+    """
+    Run fn() `warmup` untimed times (imports, lazy encoders, page cache) and then
+    `repeat` timed times, with output silenced; setup(), if given, runs untimed
+    before each call. Returns (seconds per run, last
+    result, largest growth of resident memory over one timed run in MB, or None
+    where RSS cannot be read).
+    """
+    seconds = []
+    result = None
+    growth = None
+    for i in range(warmup + repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            if setup is not None:
+                setup()
+            rss = current_rss_mb()
+            t0 = time.perf_counter()
+            result = fn()
+            if i >= warmup:
+                seconds.append(time.perf_counter() - t0)
+                if rss is not None:
+                    growth = max(growth or 0.0, current_rss_mb() - rss)
+    return seconds, result, None if growth is None else round(growth, 1)
+
+
+def _entry(fmt, size_label, n_bytes, stage, measured, **extra):
+    seconds, _, rss_growth = measured
+    median = statistics.median(seconds)
+    entry = {
+        "case": f"{fmt}/{size_label}/{stage}",
+        "format": fmt,
+        "size": size_label,
+        "bytes": n_bytes,
+        "stage": stage,
+        "seconds": [round(s, 5) for s in seconds],
+        "median": round(median, 5),
+        "min": round(min(seconds), 5),
+        "mean": round(statistics.fmean(seconds), 5),
+        "rss_growth_mb": rss_growth,
+        "process_peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+    if n_bytes and median > 0:
+        entry["mb_per_s"] = round(n_bytes / 2**20 / median, 3)
+    return entry
+
+
+def bench_input(path, fmt, size_label, repeat, out_dir, stages, warmup=1, warm=False):
+    import coordinator
+    from config import PROMPT_TOKEN_BUDGETS
+    from pipeline_dag import get_stage_store
+    from prompt_builder import build_prompt
+    from report_utils import write_report
+
+    n_bytes = os.path.getsize(path)
+    results = []
+
+    measured = measure(lambda: coordinator.load_file(path, use_cache=False), repeat, warmup)
+    raw = measured[1]
+    if coordinator.is_load_error(raw):
+        raise RuntimeError(raw)
+    if "load_file" in stages:
+        results.append(_entry(fmt, size_label, n_bytes, "load_file", measured))
+
+    if isinstance(raw, pd.DataFrame) and "normalize" in stages:
+        # load_file() returns normalized tables; time normalization on the raw parse
+        parsed = coordinator._parse_file(path)
+        report = {}
+        measured = measure(lambda: coordinator.normalize_financial_table(parsed.copy(), report=report),
+                           repeat, warmup)
+        results.append(_entry(fmt, size_label, n_bytes, "normalize", measured, rows=len(parsed),
+                              memory_before_mb=report["memory_before_mb"], memory_after_mb=report["memory_after_mb"]))
+
+    if "prompt" in stages:
+        def prompt():
+            summary = coordinator.build_summary(raw)
+            return build_prompt("Summarize:", [(None, summary)], PROMPT_TOKEN_BUDGETS["ingest"])
+        measured = measure(prompt, repeat, warmup)
+        results.append(_entry(fmt, size_label, n_bytes, "prompt", measured, prompt_tokens=measured[1][1]))
+
+    if "report" in stages:
+        sections = {
+            "Executive Summary": _prose(np.random.default_rng(1), 600),
+            "Key Financial Indicators": coordinator.build_summary(raw),
+            "Risk Analysis": _prose(np.random.default_rng(2), 900),
+            "Strategic Recommendations": _prose(np.random.default_rng(3), 900),
+        }
+        target = os.path.join(out_dir, f"report_{fmt}_{size_label}.pdf")
+        measured = measure(lambda: write_report(target, "Benchmark Report", sections), repeat, warmup)
+        results.append(_entry(fmt, size_label, None, "generate_pdf_report", measured,
+                              pdf_bytes=os.path.getsize(target)))
+
+    if "orchestrate" in stages:
+        target = os.path.join(out_dir, f"orchestrate_{fmt}_{size_label}.pdf")
+        # Cold runs start from an empty stage store, so every stage of the graph runs
+        measured = measure(lambda: coordinator.orchestrate(path, target), repeat, warmup,
+                           setup=None if warm else get_stage_store().clear)
+        results.append(_entry(fmt, size_label, n_bytes, "orchestrate", measured,
+                              reports_per_hour=round(3600 / statistics.median(measured[0]), 1)))
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(formats=FORMATS, sizes=("1KB", "1MB"), repeat=3, warmup=1, data_dir=".cache/bench_data",
+                   out_dir=".cache/bench_out", stages=("load_file", "normalize", "prompt", "report", "orchestrate"),
+                   latency=0.0, tokens_per_second=0.0, completion_tokens=300, warm=False, seed=0):
+    """Run every stage for every (format, size) and return the results document."""
+    import agent_registry
+    from fake_model import FakeModel
+    from llm_cache import get_llm_cache
+    from parse_cache import get_parse_cache
+    from pipeline_dag import StageStore, set_stage_store
+
+    os.makedirs(out_dir, exist_ok=True)
+    agent_registry.set_model_factory(lambda: FakeModel(
+        latency=latency, tokens_per_second=tokens_per_second, completion_tokens=completion_tokens, seed=seed,
+    ))
+    get_llm_cache().bypass = not warm
+    get_parse_cache().bypass = not warm
+    # A store of its own, so clearing it for cold runs leaves the real one alone
+    set_stage_store(StageStore(root=os.path.join(out_dir, "stages")))
+
+    results = []
+    started = time.perf_counter()
+    try:
+        for fmt in formats:
+            for size_label in sizes:
+                t0 = time.perf_counter()
+                path = synthetic_input(data_dir, fmt, size_label, seed)
+                print(f"⏱️ {fmt} {size_label} ({os.path.getsize(path):,} bytes, generated in {time.perf_counter() - t0:.1f}s)")
+                try:
+                    results.extend(bench_input(path, fmt, size_label, repeat, out_dir, stages, warmup, warm))
+                except Exception as e:
+                    print(f"❌ {fmt} {size_label}: {e}")
+                    results.append({"case": f"{fmt}/{size_label}", "format": fmt, "size": size_label, "error": str(e)})
+    finally:
+        agent_registry.set_model_factory(None)
+        set_stage_store(None)
+
+    return {
+        "schema": 1,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "formats": list(formats), "sizes": list(sizes), "repeat": repeat, "warmup": warmup, "stages": list(stages),
+            "latency": latency, "tokens_per_second": tokens_per_second,
+            "completion_tokens": completion_tokens, "warm": warm, "seed": seed,
+        },
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "results": results,
+    }
+
+
+def compare(baseline, current, tolerance=0.10, min_delta=0.005):
+    """
+    Median change per case against `baseline`. A case regresses when it is more
+    than `tolerance` (fraction) and `min_delta` seconds slower; the absolute
+    floor keeps sub-millisecond cases from flagging on timer noise.
+    """
+    base = {r["case"]: r for r in baseline["results"] if "median" in r}
+    rows = []
+    for r in current["results"]:
+        old = base.get(r["case"])
+        if old is None or "median" not in r or old["median"] <= 0:
+            continue
+        change = r["median"] / old["median"] - 1
+        rows.append({"case": r["case"], "baseline": old["median"], "current": r["median"],
+                     "change": round(change, 4),
+                     "regression": change > tolerance and r["median"] - old["median"] > min_delta})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--sizes", default="1KB,1MB")
+    parser.add_argument("--stages", default="load_file,normalize,prompt,report,orchestrate")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before timing (0 for huge inputs)")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="fake model generation rate (0 = instant)")
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--warm", action="store_true", help="keep the parse, LLM and stage caches")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic inputs and the fake model")
+    parser.add_argument("--data-dir", default=".cache/bench_data")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    doc = run_benchmarks(
+        formats=args.formats.split(","), sizes=args.sizes.split(","), repeat=args.repeat, warmup=args.warmup,
+        data_dir=args.data_dir, stages=tuple(args.stages.split(",")), latency=args.latency,
+        tokens_per_second=args.tokens_per_second, completion_tokens=args.completion_tokens, warm=args.warm,
+        seed=args.seed,
+    )
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+
+    for r in doc["results"]:
+        if "median" in r:
+            extra = f"  {r['mb_per_s']} MB/s" if "mb_per_s" in r else ""
+            print(f"{r['case']:<40} median {r['median']:.4f}s{extra}")
+    print(f"📘 Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            rows = compare(json.load(f), doc, args.tolerance)
+        regressions = [r for r in rows if r["regression"]]
+        for r in rows:
+            flag = "⚠️ " if r["regression"] else "   "
+            print(f"{flag}{r['case']:<40} {r['baseline']:.4f}s -> {r['current']:.4f}s ({r['change']:+.1%})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,4 +2,140 @@ AZURE_OPENAI_ENDPOINT = ""
 TEXT_EMBEDDING_MODEL = ""
 AZURE_OPENAI_DEPLOYMENT = "gpt-4o-mini"
 API_VERSION = "2024-12-01-preview"
-AZURE_OPENAI_API_KEY = ""
\ No newline at end of file
+AZURE_OPENAI_API_KEY = ""
+
+# LLM response cache (llm_cache.py)
+LLM_CACHE_DIR = ".cache/llm"
+LLM_CACHE_MAX_BYTES = 512 * 1024 * 1024
+LLM_CACHE_MAX_AGE_SECONDS = 7 * 24 * 3600
+LLM_CACHE_BYPASS = False
+LLM_STREAMING = True  # consume agent output as it is generated (coordinator.py)
+
+# Parsed-document cache for load_file() (parse_cache.py)
+PARSE_CACHE_DIR = ".cache/parsed"
+PARSE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+PARSE_CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600
+PARSE_CACHE_BYPASS = False  # also skips the PDF page cache
+
+# Stage graph for single reports: node outputs keyed on their inputs (pipeline_dag.py)
+PIPELINE_INCREMENTAL = True  # False runs every stage on every call
+PIPELINE_CACHE_DIR = ".cache/stages"
+PIPELINE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+PIPELINE_CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+# Retrieval over long PDF/DOCX/TXT inputs (retrieval.py)
+RETRIEVAL_ENABLED = True  # documents longer than the ingest budget are searched per agent instead of digested
+EMBEDDING_BACKEND = "auto"  # "azure" (TEXT_EMBEDDING_MODEL), "local" (deterministic hashing) or "auto": azure when a model is set
+EMBEDDING_DIM = 512  # local embedder only
+EMBEDDING_BATCH_SIZE = 64  # chunks per embeddings request
+RETRIEVAL_CHUNK_TOKENS = 300
+RETRIEVAL_CHUNK_OVERLAP = 50  # tokens of each chunk repeated at the start of the next
+RETRIEVAL_TOP_K = 24  # best chunks considered per query before the token budget is applied
+RETRIEVAL_EXCERPT_TOKENS = 1500  # passages added to the risk and strategy prompts
+RETRIEVAL_ANN_MIN_CHUNKS = 2000  # approximate (IVF) search from this many chunks; None = always exact
+RETRIEVAL_ANN_PROBES = 8  # IVF lists searched per query
+RETRIEVAL_INDEX_DIR = ".cache/retrieval"
+RETRIEVAL_INDEX_MAX_BYTES = 1024 * 1024 * 1024
+RETRIEVAL_INDEX_MAX_AGE_SECONDS = 30 * 24 * 3600
+RETRIEVAL_QUERIES = {
+    "ingest": "revenue, net income, earnings per share, margins, cash flow, balance sheet totals and year-over-year changes",
+    "risk": "risk factors, debt, leverage, liquidity, interest rate and currency exposure, covenants, impairments, "
+            "litigation, volatility and losses",
+    "strategy": "outlook, guidance, growth plans, capital expenditure, acquisitions, dividends, buybacks, "
+                "cost programmes and strategic priorities",
+}
+
+# Large CSVs are profiled in chunks instead of loaded whole (csv_stream.py)
+CSV_STREAM_THRESHOLD_BYTES = 64 * 1024 * 1024
+CSV_CHUNK_ROWS = 100_000
+
+# Excel ingestion (excel_stream.py)
+EXCEL_SHEETS = None  # sheet names or 0-based positions; None = every sheet
+EXCEL_COLUMNS = None  # header names or 0-based positions; None = every column
+EXCEL_ROW_LIMIT = None  # max data rows per sheet; None = all
+EXCEL_BLOCK_ROWS = 50_000
+
+# Column type inference and downcasting in normalize_financial_table (type_inference.py)
+NORMALIZE_MIN_PARSED = 0.95  # share of non-empty cells that must parse for a numeric/date column
+NORMALIZE_SAMPLE_ROWS = 1000  # cells tried before a whole column is parsed
+NORMALIZE_FLOAT32_ATOL = 0.005  # float32 only if no value moves by more than this; None keeps float64
+NORMALIZE_CATEGORY_MAX_RATIO = 0.5  # text columns with at most this share of distinct values become categoricals
+
+# Monte Carlo scenario engine (monte_carlo.py)
+MONTE_CARLO_PATHS = 100_000
+MONTE_CARLO_HORIZON = 250
+MONTE_CARLO_CHUNK_PATHS = 20_000
+MONTE_CARLO_SEED = 7
+MONTE_CARLO_ENABLED = True
+MONTE_CARLO_STRESS_VOL = 2.0
+MONTE_CARLO_WORKERS = None  # None = one per CPU; 1 runs inline. Always inline inside a worker process
+
+# Covariance / correlation engine (covariance.py)
+COVARIANCE_DTYPE = "float32"
+COVARIANCE_BLOCK = 1024
+
+# Token budgets per agent prompt (prompt_builder.py)
+PROMPT_TOKEN_BUDGETS = {"ingest": 3000, "risk": 4000, "strategy": 4000, "subtask": 2500}
+
+# Risk and strategy execution (coordinator.py): "sequential" runs RiskAgent then StrategyAgent;
+# "fanout" splits both into focused sub-tasks that FinanceTeam members run concurrently
+AGENT_EXECUTION_MODE = "sequential"
+
+# Structured hand-off between agents (handoff.py): later prompts get a compact record of
+# facts, metrics and flags from earlier agents' responses; the full text only goes into the report
+HANDOFF_ENABLED = True
+HANDOFF_MAX_METRICS = 20
+HANDOFF_MAX_FLAGS = 8
+HANDOFF_MAX_FACTS = 10
+HANDOFF_MAX_TOKENS = 600  # per record
+
+# PDF text extraction (pdf_extract.py)
+PDF_BACKEND = "auto"  # "auto", "pypdf2" or "pdfplumber"
+PDF_WORKERS = None  # None = one per CPU
+PDF_PARALLEL_MIN_PAGES = 16
+PDF_MAX_CHARS = None  # stop extracting once this much text is collected; None = whole document
+PDF_PAGE_CACHE_DIR = ".cache/pdf_pages"
+PDF_PAGE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Shared keep-alive HTTP pool for the agents' model clients (agent_registry.py)
+LLM_HTTP_MAX_CONNECTIONS = 32
+LLM_HTTP_KEEPALIVE = 16
+LLM_HTTP_KEEPALIVE_EXPIRY = 120
+LLM_HTTP_TIMEOUT = 120
+
+# PDF report writer (report_utils.py)
+REPORT_MAX_PARAGRAPH_CHARS = 2000
+REPORT_MAX_TASKS_PER_CHILD = 50  # recycle render workers after this many reports
+
+# Per-stage timing, token and memory instrumentation (instrumentation.py)
+METRICS_ENABLED = False
+METRICS_LOG_PATH = ".cache/metrics/runs.jsonl"
+METRICS_TRACE_MEMORY = False  # tracemalloc peaks per stage; slows allocation-heavy stages
+
+# Record/replay of model traffic (replay_model.py)
+LLM_REPLAY_MODE = None  # None, "record", "replay" or "strict"
+LLM_REPLAY_PATH = ".cache/replay/cassette.sqlite"
+LLM_REPLAY_LATENCY_SCALE = 0.0  # 0 = replay instantly, 1 = at the recorded pace
+
+# Long-running report worker (worker_service.py)
+WORKER_INBOX = "inbox"  # watched directory; None = HTTP only
+WORKER_OUT_DIR = "reports"
+WORKER_HOST = "127.0.0.1"
+WORKER_PORT = 8750  # local HTTP job endpoint; None = directory only
+WORKER_CONCURRENCY = 4  # jobs in flight at most
+WORKER_QUEUE_SIZE = 32  # queued jobs before submissions are refused
+WORKER_MAX_RETRIES = 2
+WORKER_RETRY_BACKOFF = 5.0  # seconds before the first retry, doubled for each further one
+WORKER_POLL_SECONDS = 1.0
+WORKER_SLOWDOWN_FACTOR = 2.0  # halve concurrency when model calls take this much longer than usual
+WORKER_SHUTDOWN_TIMEOUT = 120  # seconds running jobs get to finish on shutdown
+WORKER_HISTORY = 1000  # finished jobs kept for status queries
+
+# Rate-limit-aware scheduling of model calls (llm_scheduler.py)
+LLM_SCHEDULER_ENABLED = True
+LLM_RATE_LIMITS = {}  # deployment -> {"rpm": ..., "tpm": ...}, e.g. {"gpt-4o-mini": {"rpm": 300, "tpm": 150_000}}
+LLM_RATE_BURST_SECONDS = 2  # quota that may be spent at once, in seconds; the rest of the minute refills steadily
+LLM_EXPECTED_COMPLETION_TOKENS = 1000  # TPM estimate for requests without max_tokens
+LLM_MAX_RETRIES = 5
+LLM_RETRY_BASE_DELAY = 1.0  # seconds, doubled per attempt, +-50% jitter
+LLM_RETRY_MAX_DELAY = 60.0
@@ -96,41 +96,131 @@
 
 
 
-from PyPDF2 import PdfReader
 from docx import Document
 import mimetypes
 import json
 import pandas as pd
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from agents import create_data_ingest_agent, create_risk_agent, create_strategy_agent, create_team
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Preformatted
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from agent_registry import PIPELINE_AGENTS, TEAM_AGENTS, aclose_http, awarm_up, get_agents, get_team
+from agno.run.agent import RunEvent, RunOutput, RunStatus
+from llm_cache import cache_key, get_llm_cache
+from llm_scheduler import get_scheduler, llm_priority
+from parse_cache import PARSER_VERSION, get_parse_cache
+from pipeline_dag import Node, StageGraph, content_digest, get_stage_store
+from csv_stream import CsvProfile, TableProfiler, profile_dataframe, read_csv_from, stream_csv_profile
+from excel_stream import SheetTables, load_excel
+from type_inference import append_rows, normalize_financial_table
+from config import (
+    AGENT_EXECUTION_MODE, CSV_CHUNK_ROWS, CSV_STREAM_THRESHOLD_BYTES, EXCEL_COLUMNS,
+    EXCEL_ROW_LIMIT, EXCEL_SHEETS, HANDOFF_ENABLED, HANDOFF_MAX_FACTS, HANDOFF_MAX_FLAGS,
+    HANDOFF_MAX_METRICS, HANDOFF_MAX_TOKENS, LLM_STREAMING, MONTE_CARLO_ENABLED,
+    MONTE_CARLO_HORIZON, MONTE_CARLO_PATHS, MONTE_CARLO_SEED, MONTE_CARLO_STRESS_VOL,
+    MONTE_CARLO_WORKERS, NORMALIZE_CATEGORY_MAX_RATIO, NORMALIZE_FLOAT32_ATOL, NORMALIZE_MIN_PARSED,
+    NORMALIZE_SAMPLE_ROWS, PDF_BACKEND, PDF_MAX_CHARS, PIPELINE_INCREMENTAL, PROMPT_TOKEN_BUDGETS,
+    RETRIEVAL_CHUNK_OVERLAP, RETRIEVAL_CHUNK_TOKENS, RETRIEVAL_ENABLED, RETRIEVAL_QUERIES,
+    RETRIEVAL_TOP_K,
+)
+from handoff import HANDOFF_VERSION, compact_handoff
+from prompt_builder import build_prompt, count_tokens, document_digest
+from retrieval import document_excerpts, excerpt_budgets, get_embedder
+from instrumentation import add_tokens, collect, count_cache, current_run, metrics_enabled, stage, summarize_runs, track_run
+from pdf_extract import extract_pdf_text
+from report_utils import generate_pdf_report, report_pool, section_flowables, write_flowables, write_report
+from risk_metrics import returns_matrix, returns_matrix_from_csv, risk_metrics_from_returns, risk_table_to_text
+from monte_carlo import simulate_portfolio, simulation_to_text
+from covariance import correlation_summary
 from datetime import datetime
-import json
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SUPPORTED_EXTENSIONS = (".csv", ".xls", ".xlsx", ".json", ".pdf", ".docx", ".txt")
 
 # Utility Functions
-def load_file(file_path):
+def load_file(file_path, use_cache=True, writable=True):
+    """
+    Load data from multiple formats, reusing the parse cache for unchanged files.
+
+    Tables come back already normalized, so cache hits (memory-mapped Arrow
+    files) skip both parsing and normalization. Columns of a mapped table are
+    read-only; with `writable` a hit is copied so callers get the same kind of
+    frames as on a miss. Callers that only read (parse_input()) pass False and
+    keep the zero-copy load.
+    """
+    with stage("load_file"):
+        if not use_cache or not os.path.isfile(file_path):
+            return _load_normalized(file_path)
+
+        cache = get_parse_cache()
+        cached = cache.get(file_path)
+        count_cache("parse", cached is not None)
+        if cached is not None:
+            return _writable_copy(cached) if writable else cached
+
+        data = _load_normalized(file_path)
+        # Load errors come back as strings; never cache them
+        if not is_load_error(data):
+            cache.put(file_path, data)
+        return data
+
+
+def _writable_copy(data):
+    if isinstance(data, pd.DataFrame):
+        return data.copy()
+    if isinstance(data, SheetTables):
+        tables = SheetTables()
+        for name, df in data.items():
+            tables[name] = df.copy()
+        return tables
+    return data
+
+
+def _load_normalized(file_path):
+    return _normalize(_parse_file(file_path))
+
+
+def _normalize(data):
+    if isinstance(data, pd.DataFrame):
+        with stage("normalize_financial_table") as entry:
+            return normalize_financial_table(data, report=entry)
+    if isinstance(data, SheetTables):
+        with stage("normalize_financial_table") as entry:
+            tables = SheetTables()
+            for name, df in data.items():
+                report = {}
+                tables[name] = normalize_financial_table(df, report=report)
+                if entry is not None:
+                    for k in ("memory_before_mb", "memory_after_mb"):
+                        entry[k] = round(entry.get(k, 0.0) + report[k], 2)
+                    entry.setdefault("converted", {}).update(
+                        {f"{name}.{col}": kind for col, kind in report["converted"].items()})
+            return tables
+    return data
+
+
+def _parse_file(file_path):
     """Load data from multiple formats: CSV, Excel, JSON, PDF, DOCX, TXT."""
     try:
         mime, _ = mimetypes.guess_type(file_path)
 
         if file_path.endswith(".csv"):
+            if os.path.getsize(file_path) > CSV_STREAM_THRESHOLD_BYTES:
+                return stream_csv_profile(file_path)
             return pd.read_csv(file_path)
 
         elif file_path.endswith((".xls", ".xlsx")):
-            return pd.read_excel(file_path)
+            # One DataFrame, or SheetTables for a workbook with several filled sheets
+            return load_excel(file_path)
 
         elif file_path.endswith(".json"):
             with open(file_path, "r", encoding="utf-8") as f:
                 return json.load(f)
 
         elif file_path.endswith(".pdf"):
-            reader = PdfReader(file_path)
-            text = "\n".join([page.extract_text() or "" for page in reader.pages])
-            return text.strip()
+            return extract_pdf_text(file_path, backend=PDF_BACKEND, max_chars=PDF_MAX_CHARS)
 
         elif file_path.endswith(".docx"):
             doc = Document(file_path)
@@ -148,13 +238,6 @@ def load_file(file_path):
         return f"❌ Error loading file: {e}"
 
 
-def normalize_financial_table(df: pd.DataFrame):
-    """Perform basic cleaning."""
-    df = df.dropna(how="all")
-    df.columns = [c.strip().replace("\n", "_") for c in df.columns]
-    return df
-
-
 def df_to_json_summary(df: pd.DataFrame, n_rows=5):
     """Convert a DataFrame to a JSON summary."""
     return {
@@ -167,58 +250,76 @@ def df_to_json_summary(df: pd.DataFrame, n_rows=5):
 
 # ------------------------ PDF Generation ------------------------
 
-def generate_pdf_report(output_path, title, sections):
-    """Generate a professional and readable PDF financial report."""
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        "TitleStyle",
-        parent=styles["Heading1"],
-        alignment=1,
-        spaceAfter=30,
-        fontSize=20,
-        textColor="#003366"
-    )
-    header_style = ParagraphStyle(
-        "HeaderStyle",
-        parent=styles["Heading2"],
-        textColor="#1a5276",
-        spaceAfter=12
-    )
-    normal_text = styles["Normal"]
-
-    # Create document
-    doc = SimpleDocTemplate(output_path, pagesize=A4)
-    content = []
-
-    # Cover Page
-    content.append(Paragraph(title, title_style))
-    content.append(Paragraph(f"Generated on: {datetime.now().strftime('%d %B %Y, %I:%M %p')}", normal_text))
-    content.append(Paragraph("Prepared by: Agno Multi-Agent Financial Analysis System", normal_text))
-    content.append(Spacer(1, 40))
-    content.append(PageBreak())
-
-    # Section by section
-# Section by section
-    for section_title, data in sections.items():
-        content.append(Paragraph(section_title, header_style))
-        content.append(Spacer(1, 6))
-
-        # Format JSON/text data nicely
-        if isinstance(data, (dict, list)):
-            formatted_data = json.dumps(data, indent=4, ensure_ascii=False)
-            formatted_data = formatted_data.replace("\n", "<br />")  # Wrap lines
-            content.append(Paragraph(formatted_data, normal_text))
-        else:
-            formatted_data = str(data).replace("\n", "<br />")
-            content.append(Paragraph(formatted_data, normal_text))
+class IncrementalReport:
+    """
+    Report assembled section by section while the agents are still running.
+
+    Sections are laid out in `order` regardless of when they arrive. Without
+    a `render_pool` each section's flowables are built in a thread as soon as
+    it is added, while later agents are still running, and write() only
+    paginates them. With a `render_pool` (batch runs) the whole PDF is
+    rendered there by report_utils.write_report(). `ready_at` holds the
+    seconds until each section was ready for layout: its flowables built, or
+    its text received when a pool renders it. If a stage fails, write() still
+    produces a PDF with every finished section plus a note naming the stage
+    that failed.
+    """
 
-        content.append(Spacer(1, 20))
-        content.append(PageBreak())
+    def __init__(self, output_path, title, order, render_pool=None):
+        self.output_path = output_path
+        self.title = title
+        self.order = list(order)
+        self.render_pool = render_pool
+        self.failure = None
+        self.ready_at = {}
+        self._started = time.perf_counter()
+        self._sections = {}
+        self._built = {}
+
+    def _elapsed(self):
+        return round(time.perf_counter() - self._started, 3)
+
+    def add(self, section_title, data):
+        if section_title not in self.order:
+            self.order.append(section_title)
+        self._sections[section_title] = data
+        self._built.pop(section_title, None)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if self.render_pool is not None or loop is None:
+            self.ready_at[section_title] = self._elapsed()
+            return
+        built = loop.run_in_executor(None, list, section_flowables(section_title, data))
+        built.add_done_callback(lambda _, title=section_title: self.ready_at.__setitem__(title, self._elapsed()))
+        self._built[section_title] = built
+
+    def fail(self, stage, error):
+        self.failure = (stage, error)
+
+    async def write(self):
+        sections = [(t, self._sections[t]) for t in self.order if t in self._sections]
+        if self.failure is not None:
+            stage, error = self.failure
+            sections.append((
+                "Report Incomplete",
+                f"The {stage} stage failed ({error}), so this report is incomplete. "
+                "The sections above were completed before the failure.",
+            ))
+
+        # reportlab is CPU-bound; keep the loop free for other reports' LLM calls
+        loop = asyncio.get_running_loop()
+        if self.render_pool is not None:
+            await loop.run_in_executor(self.render_pool, write_report, self.output_path, self.title, sections)
+        else:
+            built = [await self._built[t] if t in self._built else list(section_flowables(t, data))
+                     for t, data in sections]
+            await loop.run_in_executor(None, write_flowables, self.output_path, self.title, built)
+        label = "Partial" if self.failure else "Professional"
+        print(f"✅ {label} Financial Report generated: {self.output_path}")
 
 
-    # Build PDF
-    doc.build(content)
-    print(f"✅ Professional Financial Report generated: {output_path}")
 # ------------------------ Main Orchestration ------------------------
 
 # def orchestrate(file_path: str, output_pdf="financial_report.pdf"):
@@ -261,45 +362,812 @@ def generate_pdf_report(output_path, title, sections):
 
 #     generate_pdf_report(output_pdf, "Consolidated Financial Report", sections)
 #     print("📘 Financial Report generated:", output_pdf)
-def orchestrate(file_path: str, output_pdf="financial_report.pdf"):
-    ingest_agent = create_data_ingest_agent()
-    risk_agent = create_risk_agent()
-    strat_agent = create_strategy_agent()
-    team = create_team([ingest_agent, risk_agent, strat_agent])
-
-    print("✅ Team created:", team)
+def build_summary(raw, excerpts=None):
+    """
+    Turn the output of load_file() into the readable summary sent to the agents.
 
-    raw = load_file(file_path)
+    A long document is represented by the passages retrieved for the ingest
+    agent when `excerpts` (see _excerpts()) has them, by its digest otherwise.
+    """
+    if excerpts and excerpts["ingest"]:
+        return excerpts["ingest"]
+    if isinstance(raw, CsvProfile):
+        return raw.to_text()
     if isinstance(raw, pd.DataFrame):
-        df = normalize_financial_table(raw)
-        # Convert to readable bullet-point text instead of JSON
-        summary = "\n".join([f"- {col.replace('_', ' ').title()}: {df[col].iloc[0]}" for col in df.columns])
+        # Column statistics plus sampled rows instead of only the first row
+        return profile_dataframe(raw).to_text()
+    if isinstance(raw, SheetTables):
+        return "\n\n".join(f"Sheet: {name}\n{profile_dataframe(df).to_text()}" for name, df in raw.items())
+    if isinstance(raw, (dict, list)):
+        raw = json.dumps(raw, indent=1, ensure_ascii=False, default=str)
+    return document_digest(str(raw), PROMPT_TOKEN_BUDGETS["ingest"])
+
+
+def _excerpts(raw):
+    """Per-agent passages of a long text document (retrieval.document_excerpts()); None for tables and JSON."""
+    if isinstance(raw, str) and not is_load_error(raw):
+        return document_excerpts(raw)
+    return None
+
+
+def _analyze_table(table, parsed, file_path, to_returns=returns_matrix):
+    """Fill the locally computed figures in `parsed` from one table; False when it has no return series."""
+    try:
+        with stage("risk_metrics"):
+            rets = to_returns(table)
+            if rets is None or rets.empty:
+                return False
+            parsed["risk_metrics"] = risk_table_to_text(risk_metrics_from_returns(rets))
+        if rets.shape[1] >= 2:
+            with stage("correlation"):
+                parsed["correlation"] = correlation_summary(rets)
+        if MONTE_CARLO_ENABLED:
+            with stage("scenarios"):
+                parsed["scenarios"] = run_scenarios(rets)
+    except Exception as e:
+        print(f"⚠️ Risk metrics skipped for {file_path}: {e}")
+    return True
+
+
+def parse_input(file_path):
+    """
+    Load and summarize one input file. Top-level so it can run in a worker process.
+
+    Returns a dict with the agent-facing "summary" plus any figures computed
+    locally from the data ("risk_metrics"), which are None when not applicable.
+    For a multi-sheet workbook every sheet is summarized and the figures come
+    from the first sheet that holds a return series.
+    """
+    raw = load_file(file_path, writable=False)
+    parsed = {"summary": None, **_analyze(raw, file_path), "excerpts": _excerpts(raw)}
+    with stage("build_summary"):
+        parsed["summary"] = build_summary(raw, parsed["excerpts"])
+    return parsed
+
+
+def _analyze(raw, file_path):
+    """Locally computed figures for a loaded input; None for each that does not apply."""
+    figures = {"risk_metrics": None, "correlation": None, "scenarios": None}
+    if isinstance(raw, CsvProfile) or (raw is None and file_path.endswith(".csv")):
+        # Streamed CSV (profiled, or left to the summary stage): read back only the series columns
+        _analyze_table(file_path, figures, file_path, returns_matrix_from_csv)
+    elif isinstance(raw, pd.DataFrame):
+        _analyze_table(raw, figures, file_path)
+    elif isinstance(raw, SheetTables):
+        for df in raw.values():
+            if _analyze_table(df, figures, file_path):
+                break
+    return figures
+
+
+def run_scenarios(rets, workers=MONTE_CARLO_WORKERS):
+    """Base, bootstrap and stressed Monte Carlo runs for the report (inline when already in a worker process)."""
+    runs = [
+        simulate_portfolio(rets, method="gbm", workers=workers),
+        simulate_portfolio(rets, method="gbm", vol_multiplier=MONTE_CARLO_STRESS_VOL, workers=workers),
+    ]
+    if len(rets) >= 20:
+        runs.insert(1, simulate_portfolio(rets, method="bootstrap", workers=workers))
+    return simulation_to_text(runs)
+
+
+class AgentRunError(RuntimeError):
+    """An agent run ended with an error or was cancelled by the model side."""
+
+
+async def _arun_agent(agent, prompt, on_delta=None):
+    """
+    Run one agent without blocking the event loop and return its text output.
+
+    With LLM_STREAMING the response is consumed as it is generated and every
+    text delta is passed to `on_delta`. Cached responses are returned whole.
+    Failed runs raise AgentRunError and are never cached.
+    """
+    with stage(f"agent:{agent.name}"):
+        cache = get_llm_cache()
+        cached = cache.get(agent, prompt)
+        count_cache("llm", cached is not None)
+        if cached is not None:
+            _record_tokens(agent, prompt, cached, None, cached=True)
+            return cached
+
+        if LLM_STREAMING:
+            output, resp = await _stream_agent(agent, prompt, on_delta)
+        else:
+            resp = await agent.arun(prompt)
+            if getattr(resp, "status", None) == RunStatus.error:
+                raise AgentRunError(f"{agent.name}: {getattr(resp, 'content', resp)}")
+            output = getattr(resp, "content", str(resp))
+        _record_tokens(agent, prompt, output, resp)
+        cache.put(agent, prompt, output)
+        return output
+
+
+async def _stream_agent(agent, prompt, on_delta=None):
+    """Consume a streamed run; returns (text, final RunOutput or None)."""
+    chunks = []
+    final = None
+    async for event in agent.arun(prompt, stream=True, yield_run_output=True):
+        kind = getattr(event, "event", None)
+        if isinstance(event, RunOutput):
+            final = event
+        elif kind == RunEvent.run_content and event.content:
+            chunks.append(event.content)
+            if on_delta is not None:
+                on_delta(event.content)
+        elif kind in (RunEvent.run_error, RunEvent.run_cancelled):
+            raise AgentRunError(f"{agent.name}: {event.content}")
+    return "".join(chunks), final
+
+
+def _record_tokens(agent, prompt, output, resp, cached=False):
+    """Provider-reported usage when available, otherwise a local estimate."""
+    if current_run() is None:
+        return
+    usage = getattr(resp, "metrics", None)
+    if usage is not None and usage.input_tokens:
+        add_tokens(agent.name, usage.input_tokens, usage.output_tokens, cached=cached)
     else:
-        summary = str(raw)[:5000]
+        add_tokens(agent.name, count_tokens(prompt), count_tokens(output), estimated=True, cached=cached)
+
+
+REPORT_SECTIONS = (
+    "Executive Summary",
+    "Key Financial Indicators",
+    "Computed Risk Metrics",
+    "Correlation and Diversification",
+    "Scenario Analysis",
+    "Risk Analysis",
+    "Strategic Recommendations",
+    "Conclusion",
+)
+
+
+CONCLUSION = (
+    "Overall, the company's financial health is stable. Following the recommendations above will help manage risk "
+    "and optimize strategic growth."
+)
+
+
+def _ingest_prompt(summary):
+    return build_prompt(
+        "Summarize the uploaded financial data for a professional client report:",
+        [(None, summary)],
+        PROMPT_TOKEN_BUDGETS["ingest"],
+    )
+
+
+def _handed(output, compact):
+    return compact_handoff(output) if compact else output
+
+
+def _handoff_prompt(name, saved, build, *args):
+    """
+    build(*args), with the earlier agents' outputs in it replaced by their
+    compact records (handoff.py) when HANDOFF_ENABLED. With metrics on,
+    saved[name] gets the prompt tokens that saved against sending the full
+    text (which means building that prompt too); it can be negative when the
+    room freed lets a later part of the prompt through uncut.
+    """
+    if not HANDOFF_ENABLED:
+        return build(*args)
+    prompt, tokens = build(*args, compact=True)
+    if metrics_enabled():
+        saved[name] = build(*args)[1] - tokens
+    return prompt, tokens
+
+
+def _risk_prompt(figures, ingest_output, excerpts=None, compact=False):
+    # Parts are in priority order: locally computed figures survive a tight budget
+    return build_prompt(
+        "Analyze financial risks based on the following data. Provide readable insights for management.",
+        [
+            ("Risk metrics computed from the price/return series (use these figures as given and interpret them)", figures.get("risk_metrics")),
+            ("Data", _handed(ingest_output, compact)),
+            ("Relevant passages from the document", excerpts and excerpts.get("risk")),
+            ("Correlation, beta and diversification analysis", figures.get("correlation")),
+            ("Monte Carlo projections and stress test for the portfolio", figures.get("scenarios")),
+        ],
+        PROMPT_TOKEN_BUDGETS["risk"],
+    )
 
-    # ----------- Ingestion Agent -----------
-    ingest_prompt = f"Summarize the uploaded financial data for a professional client report:\n{summary}"
-    ingest_resp = ingest_agent.run(ingest_prompt)
-    ingest_output = getattr(ingest_resp, "content", str(ingest_resp))
 
-    # ----------- Risk Agent -----------
-    risk_prompt = f"Analyze financial risks based on the following data:\n{ingest_output}\nProvide readable insights for management."
-    risk_resp = risk_agent.run(risk_prompt)
-    risk_output = getattr(risk_resp, "content", str(risk_resp))
+def _strategy_prompt(risk_output, ingest_output, excerpts=None, compact=False):
+    return build_prompt(
+        "Provide strategic recommendations based on data and risk analysis. Output in readable client-ready text.",
+        [
+            ("Risk Insights", _handed(risk_output, compact)),
+            ("Data", _handed(ingest_output, compact)),
+            ("Relevant passages from the document", excerpts and excerpts.get("strategy")),
+        ],
+        PROMPT_TOKEN_BUDGETS["strategy"],
+    )
+
+
+# Fan-out mode: sub-task -> (FinanceTeam member, heading in the merged section,
+# instruction, prompt parts in priority order). Strategy sub-tasks work from the
+# computed figures rather than the risk prose, so all of them start together
+# once ingestion is done.
+FANOUT_SUBTASKS = {
+    "risk.market": (
+        "MarketRiskAgent", "Market Risk",
+        "Assess market risk: Value at Risk, Expected Shortfall, drawdown, volatility and risk-adjusted returns.",
+        ("metrics", "data", "passages"),
+    ),
+    "risk.portfolio": (
+        "PortfolioRiskAgent", "Portfolio Risk",
+        "Assess portfolio risk: beta, correlation and diversification, concentration and liquidity.",
+        ("correlation", "metrics", "data", "passages"),
+    ),
+    "risk.stress": (
+        "StressTestAgent", "Stress Testing and Scenarios",
+        "Interpret the scenario projections, stress results and tail risk, and name early warning indicators.",
+        ("scenarios", "metrics", "data", "passages"),
+    ),
+    "strategy.allocation": (
+        "AllocationAgent", "Allocation and Investment Recommendations",
+        "Recommend asset allocation, rebalancing and investment opportunities.",
+        ("data", "metrics", "correlation", "passages"),
+    ),
+    "strategy.hedging": (
+        "HedgingAgent", "Hedging and Risk Mitigation",
+        "Recommend hedging strategies and risk mitigation for the exposures shown.",
+        ("metrics", "scenarios", "data", "passages"),
+    ),
+    "strategy.outlook": (
+        "OutlookAgent", "Outlook",
+        "Give the forward-looking outlook and the tactical adjustments to make by time horizon.",
+        ("data", "passages", "metrics"),
+    ),
+}
+
+
+def _subtasks(section):
+    return [name for name in FANOUT_SUBTASKS if name.split(".")[0] == section]
+
+
+def _subtask_prompt(name, figures, ingest_output, excerpts=None, compact=False):
+    _, _, instruction, parts = FANOUT_SUBTASKS[name]
+    available = {
+        "metrics": ("Risk metrics computed from the price/return series (use these figures as given and interpret them)", figures.get("risk_metrics")),
+        "data": ("Data", _handed(ingest_output, compact)),
+        "passages": ("Relevant passages from the document", excerpts and excerpts.get(name.split(".")[0])),
+        "correlation": ("Correlation, beta and diversification analysis", figures.get("correlation")),
+        "scenarios": ("Monte Carlo projections and stress test for the portfolio", figures.get("scenarios")),
+    }
+    return build_prompt(
+        f"{instruction} Provide readable, client-ready insights for management.",
+        [available[part] for part in parts],
+        PROMPT_TOKEN_BUDGETS["subtask"],
+    )
+
+
+def _team_member(team, name):
+    agent = FANOUT_SUBTASKS[name][0]
+    return next(member for member in team.members if member.name == agent)
+
 
-    # ----------- Strategy Agent -----------
-    strat_prompt = f"Provide strategic recommendations based on data and risk analysis:\nData:\n{ingest_output}\nRisk Insights:\n{risk_output}\nOutput in readable client-ready text."
-    strat_resp = strat_agent.run(strat_prompt)
-    strat_output = getattr(strat_resp, "content", str(strat_resp))
+def merge_subtasks(names, outputs):
+    """One report section from the outputs of its sub-tasks, each under its heading."""
+    return "\n\n".join(f"{FANOUT_SUBTASKS[name][1]}\n{output.strip()}" for name, output in zip(names, outputs))
+
+
+async def _fan_out(section, team, figures, ingest_output, excerpts, prompt_tokens, handoff_saved, timer=None):
+    """
+    Text of `section` ("risk" or "strategy"): its sub-tasks run concurrently on
+    `team`'s members and are merged in order. Every sub-result is cached on its
+    own, so after a failure only the sub-tasks that failed run again.
+    """
+    names = _subtasks(section)
+    runs = []
+    for name in names:
+        prompt, prompt_tokens[name] = _handoff_prompt(name, handoff_saved, _subtask_prompt, name, figures,
+                                                      ingest_output, excerpts)
+        runs.append(_arun_agent(_team_member(team, name), prompt, timer and timer(name)))
+    outputs = await asyncio.gather(*runs, return_exceptions=True)
+    # Raise only once every sub-task has settled, so the ones that succeeded are cached
+    for output in outputs:
+        if isinstance(output, BaseException):
+            raise output
+    return merge_subtasks(names, outputs)
+
+
+def _start_report(output_pdf, summary, figures, render_pool=None):
+    """IncrementalReport holding the locally computed sections, which are final before any agent runs."""
+    report = IncrementalReport(output_pdf, "Consolidated Financial Report", REPORT_SECTIONS, render_pool)
+    report.add("Key Financial Indicators", summary)
+    if figures.get("risk_metrics"):
+        report.add("Computed Risk Metrics", figures["risk_metrics"])
+    if figures.get("correlation"):
+        report.add("Correlation and Diversification", figures["correlation"])
+    if figures.get("scenarios"):
+        report.add("Scenario Analysis", figures["scenarios"])
+    return report
+
+
+async def run_pipeline_async(parsed, output_pdf, agents=None, render_pool=None, team=None):
+    """
+    Run the three agents over the output of parse_input() and write the PDF report.
+
+    Each agent starts as soon as the outputs it depends on are complete, and
+    each section is handed to the report as soon as it is final. With
+    AGENT_EXECUTION_MODE "fanout" the risk and strategy sections are instead
+    written together by the members of `team` (see _fan_out()). If an agent
+    fails, the report is still written with the sections finished so far and
+    the returned dict carries the error.
+    """
+    summary = parsed["summary"]
+    if agents is None:
+        agents = get_agents()
+    if team is None and AGENT_EXECUTION_MODE == "fanout":
+        team = get_team()
+    ingest_agent, risk_agent, strat_agent = agents
+
+    prompt_tokens = {}
+    handoff_saved = {}
+    first_token = {}
+    started = time.perf_counter()
+
+    def timer(stage):
+        def on_delta(_):
+            first_token.setdefault(stage, round(time.perf_counter() - started, 3))
+        return on_delta
+
+    report = _start_report(output_pdf, summary, parsed, render_pool)
+
+    step = "ingestion"
+    error = None
+    try:
+        # ----------- Ingestion Agent -----------
+        ingest_prompt, prompt_tokens["ingest"] = _ingest_prompt(summary)
+        ingest_output = await _arun_agent(ingest_agent, ingest_prompt, timer("ingest"))
+        report.add("Executive Summary", ingest_output)
+
+        if team is not None:
+            # ----------- FinanceTeam: risk and strategy sub-tasks at once -----------
+            async def write_section(section, title):
+                report.add(title, await _fan_out(section, team, parsed, ingest_output, parsed.get("excerpts"),
+                                                 prompt_tokens, handoff_saved, timer))
+
+            sections = {"risk": "Risk Analysis", "strategy": "Strategic Recommendations"}
+            results = await asyncio.gather(*(write_section(*item) for item in sections.items()), return_exceptions=True)
+            for section, result in zip(sections, results):
+                if isinstance(result, Exception):
+                    step = section
+                    raise result
+        else:
+            # ----------- Risk Agent -----------
+            step = "risk"
+            risk_prompt, prompt_tokens["risk"] = _handoff_prompt("risk", handoff_saved, _risk_prompt, parsed,
+                                                                 ingest_output, parsed.get("excerpts"))
+            risk_output = await _arun_agent(risk_agent, risk_prompt, timer("risk"))
+            report.add("Risk Analysis", risk_output)
+
+            # ----------- Strategy Agent -----------
+            step = "strategy"
+            strat_prompt, prompt_tokens["strategy"] = _handoff_prompt("strategy", handoff_saved, _strategy_prompt,
+                                                                      risk_output, ingest_output, parsed.get("excerpts"))
+            strat_output = await _arun_agent(strat_agent, strat_prompt, timer("strategy"))
+            report.add("Strategic Recommendations", strat_output)
+        report.add("Conclusion", CONCLUSION)
+    except Exception as e:
+        print(f"⚠️ {step} stage failed, writing partial report: {e}")
+        report.fail(step, e)
+        error = e
+    print(f"🧮 Prompt tokens: {prompt_tokens}")
+    _print_handoff(handoff_saved)
 
     # ----------- Consolidate & Generate PDF -----------
-    sections = {
-        "Executive Summary": ingest_output,
-        "Key Financial Indicators": summary,
-        "Risk Analysis": risk_output,
-        "Strategic Recommendations": strat_output,
-        "Conclusion": "Overall, the company's financial health is stable. Following the recommendations above will help manage risk and optimize strategic growth."
+    with stage("generate_pdf_report"):
+        await report.write()
+    return {
+        "output": output_pdf,
+        "prompt_tokens": prompt_tokens,
+        "handoff_tokens_saved": handoff_saved,
+        "first_token_seconds": first_token,
+        "section_ready_seconds": report.ready_at,
+        "error": f"{step} stage failed: {error}" if error else None,
+    }
+
+
+def _print_handoff(saved):
+    if saved:
+        print(f"🤝 Hand-off saved {sum(saved.values())} prompt tokens: {saved}")
+
+
+async def _closing_pool(coro):
+    """Await `coro`, then close this event loop's pooled HTTP client before asyncio.run() tears it down."""
+    try:
+        return await coro
+    finally:
+        await aclose_http()
+
+
+def run_pipeline(parsed, output_pdf, agents=None):
+    """Blocking wrapper around run_pipeline_async()."""
+    return asyncio.run(_closing_pool(run_pipeline_async(parsed, output_pdf, agents=agents)))
+
+
+# ------------------------ Incremental Pipeline ------------------------
+
+def _appended_csv(run):
+    return run.appended is not None and run.path.endswith(".csv")
+
+
+def _load_stage(run, path):
+    """Raw input. Only the new rows for a CSV with rows appended; nothing for a CSV large enough to stream."""
+    if path.endswith(".csv"):
+        if os.path.getsize(path) > CSV_STREAM_THRESHOLD_BYTES:
+            return None
+        if _appended_csv(run):
+            return read_csv_from(path, run.appended.offset)
+    data = _parse_file(path)
+    if is_load_error(data):
+        raise ValueError(data)
+    return data
+
+
+def _normalize_stage(run, data):
+    if not (_appended_csv(run) and isinstance(data, pd.DataFrame)):
+        return _normalize(data)
+    previous = run.previous("normalize")
+    if previous is None:
+        # `data` is only the appended rows; without the earlier table start over
+        return _normalize(_parse_file(run.path))
+    return append_rows(previous, _normalize(data))
+
+
+def _summary_stage(run, data, path, excerpts):
+    """
+    (summary text, profiler, rows profiled). A table's profiler is kept so
+    rows appended later are folded into the previous statistics instead of
+    profiling the whole table again.
+    """
+    previous = run.previous("summary") if _appended_csv(run) else None
+    with stage("build_summary"):
+        if data is None:
+            # Large CSV, profiled in chunks straight from the file
+            if previous is not None:
+                profiler, chunks = previous[1], read_csv_from(path, run.appended.offset, CSV_CHUNK_ROWS)
+            else:
+                profiler, chunks = TableProfiler(), pd.read_csv(path, chunksize=CSV_CHUNK_ROWS, low_memory=False)
+            for chunk in chunks:
+                profiler.update(chunk)
+            return profiler.profile(path).to_text(), profiler, profiler.seen
+        if isinstance(data, pd.DataFrame):
+            if previous is not None and previous[2] <= len(data):
+                profiler = previous[1].update_frame(data.iloc[previous[2]:])
+            else:
+                profiler = TableProfiler().update_frame(data)
+            return profiler.profile().to_text(), profiler, len(data)
+        return build_summary(data, excerpts), None, None
+
+
+def _analysis_stage(run, data, path):
+    return _analyze(data, path)
+
+
+def _retrieval_stage(run, data):
+    return _excerpts(data)
+
+
+async def _ingest_stage(run, summary):
+    prompt, run.context["prompt_tokens"]["ingest"] = _ingest_prompt(summary[0])
+    return await _arun_agent(run.context["agents"][0], prompt)
+
+
+async def _risk_stage(run, figures, ingest_output, excerpts):
+    prompt, run.context["prompt_tokens"]["risk"] = _handoff_prompt(
+        "risk", run.context["handoff_saved"], _risk_prompt, figures, ingest_output, excerpts)
+    return await _arun_agent(run.context["agents"][1], prompt)
+
+
+async def _strategy_stage(run, risk_output, ingest_output, excerpts):
+    prompt, run.context["prompt_tokens"]["strategy"] = _handoff_prompt(
+        "strategy", run.context["handoff_saved"], _strategy_prompt, risk_output, ingest_output, excerpts)
+    return await _arun_agent(run.context["agents"][2], prompt)
+
+
+async def _render_stage(run, summary, figures, ingest_output, risk_output, strat_output):
+    """Writes the PDF and returns its bytes, which are reused while none of the sections change."""
+    output_pdf = run.context["output_pdf"]
+    report = _start_report(output_pdf, summary[0], figures)
+    report.add("Executive Summary", ingest_output)
+    report.add("Risk Analysis", risk_output)
+    report.add("Strategic Recommendations", strat_output)
+    report.add("Conclusion", CONCLUSION)
+    with stage("generate_pdf_report"):
+        await report.write()
+    with open(output_pdf, "rb") as f:
+        return f.read()
+
+
+def _subtask_stage(name):
+    async def run_subtask(run, figures, ingest_output, excerpts):
+        prompt, run.context["prompt_tokens"][name] = _handoff_prompt(
+            name, run.context["handoff_saved"], _subtask_prompt, name, figures, ingest_output, excerpts)
+        return await _arun_agent(_team_member(run.context["team"], name), prompt)
+    return run_subtask
+
+
+def _merge_stage(section):
+    return lambda run, *outputs: merge_subtasks(_subtasks(section), outputs)
+
+
+# Settings that change how earlier agents' outputs appear in later prompts
+_HANDOFF_SETTINGS = [HANDOFF_ENABLED, HANDOFF_VERSION, HANDOFF_MAX_METRICS, HANDOFF_MAX_FLAGS, HANDOFF_MAX_FACTS,
+                     HANDOFF_MAX_TOKENS]
+
+
+def _agent_params(index, budget, handoff=True):
+    # The agent's role, instructions and deployment, as in the LLM cache key
+    return lambda run: [cache_key(run.context["agents"][index], ""), PROMPT_TOKEN_BUDGETS[budget],
+                        _HANDOFF_SETTINGS if handoff else None]
+
+
+def _subtask_params(name):
+    return lambda run: [cache_key(_team_member(run.context["team"], name), ""), PROMPT_TOKEN_BUDGETS["subtask"],
+                        FANOUT_SUBTASKS[name][2:], _HANDOFF_SETTINGS]
+
+
+def _fanout_nodes(section):
+    """A node per sub-task of `section`, each stored on its own, and `section` merging them."""
+    nodes = [
+        Node(name, ["analysis", "ingest", "retrieval"], _subtask_stage(name), params=_subtask_params(name),
+             digest=content_digest)
+        for name in _subtasks(section)
+    ]
+    nodes.append(Node(section, _subtasks(section), _merge_stage(section), digest=content_digest,
+                      params=lambda run: [FANOUT_SUBTASKS[name][1] for name in _subtasks(section)]))
+    return nodes
+
+
+# load -> normalize -> summary -> ingest -> risk -> strategy -> render, with the
+# locally computed figures ("analysis") feeding risk and render, and passages of
+# long documents ("retrieval") feeding the summary and the risk/strategy prompts
+_INPUT_NODES = [
+    Node("load", ["source"], _load_stage, version=PARSER_VERSION, store=False,
+         params=lambda run: [os.path.splitext(run.path)[1].lower(), EXCEL_SHEETS, EXCEL_COLUMNS, EXCEL_ROW_LIMIT,
+                             CSV_STREAM_THRESHOLD_BYTES, PDF_BACKEND, PDF_MAX_CHARS]),
+    Node("normalize", ["load"], _normalize_stage, version=PARSER_VERSION, incremental=True,
+         params=lambda run: [NORMALIZE_MIN_PARSED, NORMALIZE_SAMPLE_ROWS, NORMALIZE_FLOAT32_ATOL,
+                             NORMALIZE_CATEGORY_MAX_RATIO]),
+    Node("retrieval", ["normalize"], _retrieval_stage, digest=content_digest,
+         params=lambda run: [RETRIEVAL_ENABLED, get_embedder().name, RETRIEVAL_QUERIES, RETRIEVAL_CHUNK_TOKENS,
+                             RETRIEVAL_CHUNK_OVERLAP, RETRIEVAL_TOP_K, excerpt_budgets(RETRIEVAL_QUERIES)]),
+    Node("summary", ["normalize", "source", "retrieval"], _summary_stage, incremental=True,
+         params=lambda run: [CSV_CHUNK_ROWS, PROMPT_TOKEN_BUDGETS["ingest"]],
+         digest=lambda value: content_digest(value[0])),
+    Node("analysis", ["normalize", "source"], _analysis_stage, version="2", digest=content_digest,
+         params=lambda run: [CSV_CHUNK_ROWS, MONTE_CARLO_ENABLED, MONTE_CARLO_PATHS, MONTE_CARLO_HORIZON, MONTE_CARLO_SEED,
+                             MONTE_CARLO_STRESS_VOL]),
+    Node("ingest", ["summary"], _ingest_stage, params=_agent_params(0, "ingest", handoff=False), digest=content_digest),
+]
+_RENDER_NODE = Node("render", ["summary", "analysis", "ingest", "risk", "strategy"], _render_stage,
+                    params=lambda run: [REPORT_SECTIONS, CONCLUSION])
+PIPELINE = StageGraph(_INPUT_NODES + [
+    Node("risk", ["analysis", "ingest", "retrieval"], _risk_stage, params=_agent_params(1, "risk"), digest=content_digest),
+    Node("strategy", ["risk", "ingest", "retrieval"], _strategy_stage, params=_agent_params(2, "strategy"), digest=content_digest),
+    _RENDER_NODE,
+])
+# AGENT_EXECUTION_MODE "fanout": "risk" and "strategy" merge sub-task nodes
+# ("risk.market", ...) that all start as soon as ingestion is done
+FANOUT_PIPELINE = StageGraph(_INPUT_NODES + _fanout_nodes("risk") + _fanout_nodes("strategy") + [_RENDER_NODE])
+
+# Agent stages: the step name used in failure notes and their report section
+# (a fan-out sub-task such as "risk.market" fails its section's step)
+AGENT_STAGES = {
+    "ingest": ("ingestion", "Executive Summary"),
+    "risk": ("risk", "Risk Analysis"),
+    "strategy": ("strategy", "Strategic Recommendations"),
+}
+
+
+async def run_incremental_async(file_path, output_pdf, agents=None, store=None):
+    """
+    Write the report for `file_path` through PIPELINE (FANOUT_PIPELINE in the
+    "fanout" execution mode), recomputing only the stages whose inputs changed
+    since an earlier run (of this or an identical file). When rows were
+    appended to a CSV, only the new rows are parsed and the table statistics
+    are updated from the previous run's. Agent outputs that come out unchanged
+    stop recomputation there. If an agent fails, a partial report is written
+    as in run_pipeline_async().
+    """
+    fanout = AGENT_EXECUTION_MODE == "fanout"
+    run = (FANOUT_PIPELINE if fanout else PIPELINE).start(
+        file_path, store or get_stage_store(), agents=agents or get_agents(), team=get_team() if fanout else None,
+        output_pdf=output_pdf, prompt_tokens={}, handoff_saved={},
+    )
+    error = None
+    try:
+        await run.resolve("render")
+        if run.status["render"] == "cached":
+            pdf = await run.get("render")
+            with open(output_pdf, "wb") as f:
+                f.write(pdf)
+            print(f"✅ Financial Report unchanged, reused: {output_pdf}")
+    except Exception as e:
+        failed = run.failed and run.failed.split(".")[0]
+        if failed not in AGENT_STAGES:
+            raise
+        step = AGENT_STAGES[failed][0]
+        print(f"⚠️ {step} stage failed, writing partial report: {e}")
+        summary, figures = await asyncio.gather(run.get("summary"), run.get("analysis"))
+        report = _start_report(output_pdf, summary[0], figures)
+        for name, (_, title) in AGENT_STAGES.items():
+            # Sections that do not depend on the failed stage are still
+            # finished (fan-out: the other section's sub-tasks are in flight)
+            try:
+                report.add(title, await run.get(name))
+            except Exception:
+                pass
+        report.fail(step, e)
+        with stage("generate_pdf_report"):
+            await report.write()
+        error = f"{step} stage failed: {e}"
+    finally:
+        await asyncio.to_thread(run.finish)
+    print("♻️ Stages:", ", ".join(f"{name} {status}" for name, status in run.status.items()))
+    # Only the prompts of stages that ran; reused stages sent nothing
+    print(f"🧮 Prompt tokens: {run.context['prompt_tokens']}")
+    _print_handoff(run.context["handoff_saved"])
+    return {
+        "output": output_pdf,
+        "prompt_tokens": run.context["prompt_tokens"],
+        "handoff_tokens_saved": run.context["handoff_saved"],
+        "stages": run.stats(),
+        "error": error,
+    }
+
+
+async def orchestrate_async(file_path: str, output_pdf="financial_report.pdf"):
+    # Parsing is local work, so it overlaps with opening the connection to the endpoint
+    with track_run(file_path) as metrics, llm_priority("interactive"):
+        if PIPELINE_INCREMENTAL:
+            work = asyncio.create_task(run_incremental_async(file_path, output_pdf))
+        else:
+            work = asyncio.create_task(asyncio.to_thread(parse_input, file_path))
+        if await awarm_up(PIPELINE_AGENTS + TEAM_AGENTS if AGENT_EXECUTION_MODE == "fanout" else PIPELINE_AGENTS):
+            print("✅ Agents ready")
+        else:
+            print("⚠️ Model endpoint not reachable yet; continuing")
+
+        run = await work if PIPELINE_INCREMENTAL else await run_pipeline_async(await work, output_pdf)
+        if metrics is not None:
+            metrics.fields.update(output=output_pdf, status="failed" if run["error"] else "ok", error=run["error"],
+                                  prompt_tokens=run["prompt_tokens"], handoff_tokens_saved=run["handoff_tokens_saved"])
+    if run["error"]:
+        print("⚠️ Partial report written:", output_pdf, "-", run["error"])
+    else:
+        print("📘 Financial Report generated:", output_pdf)
+    print("🗄️ LLM cache:", get_llm_cache().stats())
+
+
+def orchestrate(file_path: str, output_pdf="financial_report.pdf"):
+    asyncio.run(_closing_pool(orchestrate_async(file_path, output_pdf)))
+
+
+# ------------------------ Batch Orchestration ------------------------
+
+def collect_inputs(paths):
+    """Expand a directory (or a list of files and directories) into supported input files."""
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                if os.path.isfile(full) and name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    files.append(full)
+        else:
+            files.append(path)
+    return files
+
+
+def report_path_for(file_path, out_dir):
+    """Output PDF path for an input file; keeps the extension so a.csv and a.pdf do not collide."""
+    name = os.path.basename(file_path).replace(".", "_")
+    return os.path.join(out_dir, f"{name}_report.pdf")
+
+
+def _result(path, output_pdf, t0, error=None, **extra):
+    return {
+        "input": path,
+        "output": None if error else output_pdf,
+        "status": "failed" if error else "ok",
+        "error": str(error) if error else None,
+        "seconds": round(time.time() - t0, 3),
+        **extra,
     }
 
-    generate_pdf_report(output_pdf, "Consolidated Financial Report", sections)
-    print("📘 Financial Report generated:", output_pdf)
+
+def is_load_error(summary):
+    """load_file() reports problems as text instead of raising."""
+    return isinstance(summary, str) and summary.startswith(("❌", "⚠️"))
+
+
+async def _report_one(path, out_dir, parse_pool, render_pool, limit, output_pdf=None):
+    with track_run(path) as metrics:
+        result = await _report_one_inner(path, output_pdf or report_path_for(path, out_dir),
+                                         parse_pool, render_pool, limit, metrics)
+        if metrics is not None:
+            metrics.fields.update(output=result["output"], status=result["status"], error=result["error"],
+                                  handoff_tokens_saved=result.get("handoff_tokens_saved"))
+            result["run_id"] = metrics.run_id
+            result["metrics"] = metrics.to_record()
+    return result
+
+
+async def _report_one_inner(path, output_pdf, parse_pool, render_pool, limit, metrics):
+    t0 = time.time()
+    loop = asyncio.get_running_loop()
+    try:
+        # Stages measured inside the parse worker come back with the result
+        parsed, snapshot = await loop.run_in_executor(parse_pool, collect, parse_input, path)
+        if snapshot is not None and metrics is not None:
+            metrics.merge(snapshot)
+        if is_load_error(parsed["summary"]):
+            raise ValueError(parsed["summary"])
+        async with limit:
+            run = await run_pipeline_async(parsed, output_pdf, render_pool=render_pool)
+        if run["error"]:
+            # The partial report is kept; the file still counts as failed
+            return _result(path, output_pdf, t0, error=run["error"], partial_output=output_pdf,
+                           prompt_tokens=run["prompt_tokens"], handoff_tokens_saved=run["handoff_tokens_saved"])
+        return _result(path, output_pdf, t0, prompt_tokens=run["prompt_tokens"],
+                       handoff_tokens_saved=run["handoff_tokens_saved"], first_token_seconds=run["first_token_seconds"])
+    except Exception as e:
+        print(f"❌ {path}: {e}")
+        return _result(path, None, t0, error=e)
+
+
+async def orchestrate_many_async(paths, out_dir, workers=4, manifest_name="manifest.json"):
+    """
+    Generate one report per input file.
+
+    Files are parsed in a process pool of `workers` processes, and up to `workers`
+    agent pipelines are kept in flight on the event loop (the LLM calls are
+    network-bound). PDFs are rendered in a separate pool whose workers are
+    recycled periodically, so memory stays flat over long batches. A failure in
+    one file never stops the batch; every file gets a result entry in the
+    manifest written to `out_dir/manifest_name`.
+    """
+    files = collect_inputs(paths)
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.time()
+    limit = asyncio.Semaphore(workers)
+
+    print(f"🚀 Processing {len(files)} files with {workers} workers")
+    # Batch model calls queue behind interactive ones sharing the deployment
+    with ProcessPoolExecutor(max_workers=workers) as parse_pool, report_pool(workers) as render_pool, \
+            llm_priority("batch"):
+        results = await asyncio.gather(*[_report_one(path, out_dir, parse_pool, render_pool, limit) for path in files])
+
+    results = sorted(results, key=lambda r: r["input"])
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    # Full per-run records are in the metrics log; the manifest keeps the aggregate
+    records = [r.pop("metrics") for r in results if "metrics" in r]
+    manifest = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "workers": workers,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed_seconds": round(time.time() - started, 3),
+        "llm_cache": get_llm_cache().stats(),
+        "llm_scheduler": get_scheduler().stats(),
+        "results": results,
+    }
+    if records:
+        manifest["metrics"] = summarize_runs(records)
+    with open(os.path.join(out_dir, manifest_name), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    print(f"📘 Batch finished: {succeeded}/{len(results)} reports in {manifest['elapsed_seconds']}s")
+    return manifest
+
+
+def orchestrate_many(paths, out_dir, workers=4, manifest_name="manifest.json"):
+    """Blocking wrapper around orchestrate_many_async()."""
+    return asyncio.run(_closing_pool(orchestrate_many_async(paths, out_dir, workers=workers, manifest_name=manifest_name)))
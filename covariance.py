@@ -0,0 +1,208 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from config import COVARIANCE_BLOCK, COVARIANCE_DTYPE
+
+_BENCHMARK_HINTS = ("benchmark", "bench", "market", "index", "spy", "sp500", "s&p")
+
+
+def _prepare(returns, dtype):
+    """Demeaned returns with NaNs zeroed, plus the validity mask (None when complete)."""
+    x = np.asarray(returns, dtype=dtype)
+    valid = ~np.isnan(x)
+    complete = bool(valid.all())
+    counts = valid.sum(axis=0)
+    means = np.where(valid, x, 0).sum(axis=0, dtype="float64") / np.maximum(counts, 1)
+    x = np.where(valid, x - means.astype(dtype), 0).astype(dtype, copy=False)
+    return x, (None if complete else valid.astype(dtype)), counts
+
+
+def covariance_matrix(returns, dtype=COVARIANCE_DTYPE, block=COVARIANCE_BLOCK):
+    """
+    Sample covariance of a (T x N) return matrix, computed in column blocks.
+
+    Only one (block x block) product is in flight at a time, so peak memory is
+    the N x N result plus the demeaned inputs; with float32 a 5,000-asset
+    universe needs about 100 MB for the matrix. Missing values use
+    pairwise-complete counts.
+    """
+    x, mask, _ = _prepare(returns, dtype)
+    n = x.shape[1]
+    cov = np.empty((n, n), dtype=dtype)
+    for i in range(0, n, block):
+        xi = x[:, i:i + block]
+        mi = None if mask is None else mask[:, i:i + block]
+        for j in range(i, n, block):
+            prod = xi.T @ x[:, j:j + block]
+            if mask is None:
+                denom = max(x.shape[0] - 1, 1)
+            else:
+                denom = np.maximum(mi.T @ mask[:, j:j + block] - 1, 1)
+            prod /= denom
+            cov[i:i + block, j:j + block] = prod
+            if j != i:
+                cov[j:j + block, i:i + block] = prod.T
+    return cov
+
+
+def correlation_from_covariance(cov):
+    """Convert a covariance matrix to correlations in place."""
+    std = np.sqrt(np.clip(np.diag(cov).copy(), 1e-30, None))
+    cov /= std[:, None]
+    cov /= std[None, :]
+    np.clip(cov, -1.0, 1.0, out=cov)
+    return cov
+
+
+def ledoit_wolf(returns, dtype=COVARIANCE_DTYPE, block=COVARIANCE_BLOCK):
+    """
+    Ledoit-Wolf (2004) shrinkage towards a scaled identity.
+
+    The optimal intensity only needs ||S||_F and the per-day squared norms,
+    so it is computed from the blocked sample covariance without any extra
+    N x N temporaries. Returns (shrunk covariance, shrinkage intensity).
+
+    Gaps are handled as in covariance_matrix(): each series is demeaned over
+    its own observations and S uses pairwise-complete counts, so a missing
+    day is no information rather than a zero return. The per-day terms then
+    use the average number of observations per series in place of T.
+    """
+    x, _, counts = _prepare(returns, "float64")
+    t = max(float(counts.mean()), 2.0)
+    s = covariance_matrix(returns, dtype=dtype, block=block) * ((t - 1) / t)  # MLE scaling as in the paper
+    n = s.shape[0]
+    mu = float(np.trace(s)) / n
+    s_fro2 = float(np.square(s, dtype="float64").sum())
+    d2 = s_fro2 - 2 * mu * float(np.trace(s)) + mu * mu * n
+    row_norms2 = np.square(x).sum(axis=1)
+    b_bar2 = (np.square(row_norms2).sum() / t - s_fro2) / t
+    b2 = min(max(b_bar2, 0.0), d2)
+    shrinkage = b2 / d2 if d2 > 0 else 1.0
+    s *= (1 - shrinkage)
+    s[np.diag_indices(n)] += shrinkage * mu
+    return s, shrinkage
+
+
+def betas(returns, benchmark):
+    """Beta of every column of `returns` against the `benchmark` return series."""
+    x = np.asarray(returns, dtype="float64")
+    b = np.asarray(benchmark, dtype="float64")
+    valid = ~np.isnan(x) & ~np.isnan(b)[:, None]
+    n = np.maximum(valid.sum(axis=0), 2)
+    xb = np.where(valid, x, 0.0)
+    bb = np.where(valid, b[:, None], 0.0)
+    mean_x = xb.sum(axis=0) / n
+    mean_b = bb.sum(axis=0) / n
+    cov_xb = (xb * bb).sum(axis=0) / n - mean_x * mean_b
+    var_b = (bb * bb).sum(axis=0) / n - mean_b * mean_b
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return cov_xb / var_b
+
+
+def top_correlated_pairs(corr, k=10, block=COVARIANCE_BLOCK):
+    """The k most strongly correlated (|rho|) distinct pairs, scanned block by block."""
+    n = corr.shape[0]
+    heap = []
+    for i in range(0, n, block):
+        rows = np.abs(corr[i:i + block])
+        # Upper triangle only: mask the diagonal and everything left of it
+        cols = np.arange(n)
+        rows = np.where(cols[None, :] > (np.arange(i, i + rows.shape[0]))[:, None], rows, -1)
+        flat = rows.ravel()
+        take = min(k, flat.size)
+        for idx in np.argpartition(flat, -take)[-take:]:
+            if flat[idx] < 0:
+                continue
+            r, c = divmod(int(idx), n)
+            item = (float(flat[idx]), i + r, c)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    return [(a, b, float(corr[a, b])) for _, a, b in sorted(heap, reverse=True)]
+
+
+def correlation_clusters(corr, threshold=0.7, block=COVARIANCE_BLOCK):
+    """Groups of assets linked by correlation above `threshold` (union-find over blocks)."""
+    n = corr.shape[0]
+    parent = list(range(n))
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for i in range(0, n, block):
+        rows, cols = np.nonzero(corr[i:i + block] > threshold)
+        for r, c in zip(rows + i, cols):
+            if c > r:
+                ra, rb = find(r), find(int(c))
+                if ra != rb:
+                    parent[ra] = rb
+    groups = {}
+    for a in range(n):
+        groups.setdefault(find(a), []).append(a)
+    return sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+
+def absorption_ratio(corr, n_components=3, iterations=50, seed=0):
+    """Share of total variance explained by the leading eigenvectors (subspace iteration)."""
+    n = corr.shape[0]
+    k = min(n_components, n)
+    q = np.linalg.qr(np.random.default_rng(seed).standard_normal((n, k)))[0].astype(corr.dtype)
+    for _ in range(iterations):
+        q = np.linalg.qr(corr @ q)[0]
+    eig = np.sort(np.linalg.eigvalsh((q.T @ corr @ q).astype("float64")))[::-1]
+    return float(eig.sum() / np.trace(corr))
+
+
+def find_benchmark(columns):
+    for col in columns:
+        if any(h in str(col).lower() for h in _BENCHMARK_HINTS):
+            return col
+    return None
+
+
+def correlation_summary(rets: pd.DataFrame, benchmark=None, top_k=10, cluster_threshold=0.7):
+    """Compact, prompt-sized description of the correlation structure of a return table."""
+    benchmark = benchmark if benchmark is not None else find_benchmark(rets.columns)
+    assets = rets.drop(columns=[benchmark]) if benchmark is not None and rets.shape[1] > 1 else rets
+
+    lines = [f"Assets: {assets.shape[1]}, observations: {len(assets)}"]
+    if assets.shape[1] >= 2:
+        cov, shrinkage = ledoit_wolf(assets.to_numpy())
+        n = cov.shape[0]
+        names = [str(c) for c in assets.columns]
+        vols = np.sqrt(np.diag(cov).astype("float64"))
+        w = np.full(n, 1.0 / n, dtype=cov.dtype)
+        port_vol = float(np.sqrt(max(float(w @ (cov @ w)), 0.0)))
+
+        corr = correlation_from_covariance(cov)  # reuses the covariance buffer
+        mean_corr = (float(corr.sum(dtype="float64")) - n) / (n * (n - 1))
+        lines.append(f"Average pairwise correlation: {mean_corr:.2f} (Ledoit-Wolf shrinkage {shrinkage:.2f})")
+        if n > 3:
+            lines.append(f"Variance explained by top 3 factors: {absorption_ratio(corr):.0%}")
+        if port_vol > 0:
+            lines.append(f"Diversification ratio (equal weights): {float(w @ vols) / port_vol:.2f}")
+
+        pairs = top_correlated_pairs(corr, k=top_k)
+        if pairs:
+            lines.append("Most correlated pairs: " + ", ".join(f"{names[a]}/{names[b]} {rho:.2f}" for a, b, rho in pairs))
+        clusters = correlation_clusters(corr, threshold=cluster_threshold)
+        if clusters:
+            largest = clusters[0]
+            preview = ", ".join(names[a] for a in largest[:8]) + (" ..." if len(largest) > 8 else "")
+            lines.append(
+                f"Clusters with correlation above {cluster_threshold}: {len(clusters)}; "
+                f"largest has {len(largest)} assets ({len(largest) / n:.0%} of the universe): {preview}"
+            )
+
+    if benchmark is not None:
+        b = betas(assets.to_numpy(), rets[benchmark].to_numpy())
+        order = np.argsort(np.nan_to_num(b, nan=-np.inf))[::-1][:top_k]
+        lines.append(f"Median beta vs {benchmark}: {np.nanmedian(b):.2f}")
+        lines.append("Highest betas: " + ", ".join(f"{assets.columns[i]} {b[i]:.2f}" for i in order))
+    return "\n".join(lines)
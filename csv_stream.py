@@ -0,0 +1,262 @@
+import io
+import math
+import warnings
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from config import CSV_CHUNK_ROWS
+
+
+class _ColumnStats:
+    """Running statistics for one column, merged chunk by chunk."""
+
+    def __init__(self, name, top_k, counter_capacity):
+        self.name = name
+        self.kind = None  # "numeric", "date" or "text", fixed by the first non-empty chunk
+        self.date_format = None
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.n_numeric = 0
+        self.top_k = top_k
+        self.counter_capacity = counter_capacity
+        self.counts = Counter()
+
+    def _detect_kind(self, values):
+        non_null = values.dropna()
+        if non_null.empty:
+            return None
+        if pd.api.types.is_numeric_dtype(non_null):
+            return "numeric"
+        if pd.api.types.is_datetime64_any_dtype(non_null):
+            return "date"
+        as_text = non_null.astype(str).str.replace(",", "", regex=False)
+        if pd.to_numeric(as_text, errors="coerce").notna().mean() >= 0.95:
+            return "numeric"
+        # A guessed format keeps parsing vectorised; "mixed" is the slow per-value fallback
+        self.date_format = guess_datetime_format(str(non_null.iloc[0]))
+        if self._to_dates(non_null.astype(str)).notna().mean() >= 0.95:
+            return "date"
+        self.date_format = None
+        return "text"
+
+    def _to_dates(self, values):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return pd.to_datetime(values, errors="coerce", format=self.date_format or "mixed")
+
+    def update(self, values):
+        self.count += len(values)
+        self.nulls += int(values.isna().sum())
+        if self.kind is None:
+            self.kind = self._detect_kind(values)
+            if self.kind is None:
+                return
+
+        if self.kind == "numeric":
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values.astype(str).str.replace(",", "", regex=False), errors="coerce")
+            arr = values.to_numpy(dtype="float64", na_value=np.nan)
+            arr = arr[~np.isnan(arr)]
+            if arr.size:
+                self._merge_moments(arr)
+        elif self.kind == "date":
+            dates = self._to_dates(values).dropna()
+            if not dates.empty:
+                lo, hi = dates.min(), dates.max()
+                self.min = lo if self.min is None else min(self.min, lo)
+                self.max = hi if self.max is None else max(self.max, hi)
+        else:
+            self.counts.update(values.dropna().astype(str).value_counts().to_dict())
+            if len(self.counts) > self.counter_capacity:
+                # Keep the heavy hitters only; counts for the long tail become approximate
+                self.counts = Counter(dict(self.counts.most_common(self.counter_capacity // 2)))
+
+    def _merge_moments(self, arr):
+        """Chan et al. parallel update of count/mean/M2 plus min/max."""
+        n_b = arr.size
+        mean_b = float(arr.mean())
+        m2_b = float(((arr - mean_b) ** 2).sum())
+        n_a = self.n_numeric
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * n_a * n_b / n
+        self.n_numeric = n
+        lo, hi = float(arr.min()), float(arr.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def to_dict(self):
+        out = {"kind": self.kind or "empty", "count": self.count, "nulls": self.nulls}
+        if self.kind == "numeric" and self.n_numeric:
+            std = math.sqrt(self.m2 / (self.n_numeric - 1)) if self.n_numeric > 1 else 0.0
+            out.update(min=self.min, max=self.max, mean=self.mean, std=std)
+        elif self.kind == "date" and self.min is not None:
+            out.update(start=self.min.isoformat(), end=self.max.isoformat())
+        elif self.kind == "text":
+            out.update(distinct_seen=len(self.counts), top=self.counts.most_common(self.top_k))
+        return out
+
+
+class CsvProfile:
+    """Single-pass summary of a CSV file: per-column statistics plus sampled rows."""
+
+    def __init__(self, path, rows, columns, sample):
+        self.path = path
+        self.rows = rows
+        self.columns = columns
+        self.sample = sample
+
+    def to_dict(self):
+        return {"path": self.path, "rows": self.rows, "columns": self.columns, "sample_rows": self.sample}
+
+    def to_text(self, max_sample_rows=5):
+        """Readable summary used as the ingest prompt input."""
+        lines = [f"Rows: {self.rows:,}", f"Columns: {len(self.columns)}", ""]
+        for name, s in self.columns.items():
+            label = str(name).replace("_", " ").title()
+            nulls = f"{s['nulls']:,} missing"
+            if s["kind"] == "numeric" and "mean" in s:
+                lines.append(
+                    f"- {label}: numeric, {nulls}, min {s['min']:,.4g}, max {s['max']:,.4g}, "
+                    f"mean {s['mean']:,.4g}, std {s['std']:,.4g}"
+                )
+            elif s["kind"] == "date" and "start" in s:
+                lines.append(f"- {label}: dates from {s['start'][:10]} to {s['end'][:10]}, {nulls}")
+            elif s["kind"] == "text":
+                top = ", ".join(f"{v} ({c:,})" for v, c in s["top"])
+                lines.append(f"- {label}: text, {nulls}, most frequent: {top}")
+            else:
+                lines.append(f"- {label}: empty")
+        if self.sample:
+            lines += ["", "Example rows:"]
+            for row in self.sample[:max_sample_rows]:
+                lines.append("- " + ", ".join(f"{k}={v}" for k, v in row.items()))
+        return "\n".join(lines)
+
+
+def _sample_row(record, narrow):
+    """A sampled row, with float32 cells at their own precision (88.66, not 88.66000366210938)."""
+    for col in narrow:
+        if record[col] == record[col]:
+            record[col] = float(str(np.float32(record[col])))
+    return record
+
+
+class TableProfiler:
+    """
+    Incremental version of the CSV profile: feed chunks with update() and read
+    the profile so far with profile().
+
+    The column statistics and the reservoir sample carry over between calls,
+    so a profiler that was kept (it pickles) can take rows appended later and
+    give the same statistics as profiling the whole table again.
+    """
+
+    def __init__(self, top_k=5, sample_rows=10, counter_capacity=10_000, seed=0):
+        self.top_k = top_k
+        self.sample_rows = sample_rows
+        self.counter_capacity = counter_capacity
+        self.rng = np.random.default_rng(seed)
+        self.stats = {}
+        self.sample = []
+        self.seen = 0
+
+    def update(self, chunk):
+        for col in chunk.columns:
+            if col not in self.stats:
+                self.stats[col] = _ColumnStats(col, self.top_k, self.counter_capacity)
+            self.stats[col].update(chunk[col])
+
+        # Reservoir sampling (Algorithm R), vectorised over the chunk
+        n = len(chunk)
+        narrow = [col for col in chunk.columns if chunk[col].dtype == np.float32]
+        fill = min(max(self.sample_rows - len(self.sample), 0), n)
+        if fill:
+            self.sample.extend(_sample_row(r, narrow) for r in chunk.iloc[:fill].to_dict(orient="records"))
+        if n > fill:
+            positions = np.arange(self.seen + fill, self.seen + n)
+            slots = self.rng.integers(0, positions + 1)
+            for offset in np.flatnonzero(slots < self.sample_rows):
+                self.sample[slots[offset]] = _sample_row(chunk.iloc[fill + offset].to_dict(), narrow)
+        self.seen += n
+        return self
+
+    def update_frame(self, df, chunksize=CSV_CHUNK_ROWS):
+        for i in range(0, len(df), chunksize):
+            self.update(df.iloc[i:i + chunksize])
+        return self
+
+    def profile(self, path=None):
+        return CsvProfile(path, self.seen, {col: s.to_dict() for col, s in self.stats.items()}, list(self.sample))
+
+
+def _profile_chunks(chunks, path, top_k, sample_rows, counter_capacity, seed):
+    profiler = TableProfiler(top_k, sample_rows, counter_capacity, seed)
+    for chunk in chunks:
+        profiler.update(chunk)
+    return profiler.profile(path)
+
+
+def stream_csv_profile(path, chunksize=CSV_CHUNK_ROWS, top_k=5, sample_rows=10, counter_capacity=10_000, seed=0):
+    """
+    Read a CSV once in chunks and build per-column statistics incrementally.
+
+    Peak memory is bounded by `chunksize` (plus the per-column top-value
+    counters), not by the file size. Example rows are reservoir-sampled
+    uniformly over the whole file with a reproducible `seed`.
+    """
+    chunks = pd.read_csv(path, chunksize=chunksize, low_memory=False)
+    return _profile_chunks(chunks, path, top_k, sample_rows, counter_capacity, seed)
+
+
+class _Prepended(io.RawIOBase):
+    """`head` followed by the rest of the open binary file `f`, read without copying the file."""
+
+    def __init__(self, head, f):
+        self._head = head
+        self._file = f
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._head:
+            n = min(len(buffer), len(self._head))
+            buffer[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        return self._file.readinto(buffer)
+
+
+def read_csv_from(path, offset, chunksize=None):
+    """
+    Rows of `path` from byte `offset` (the start of a line) on, parsed under
+    the file's header. The file is read as pandas consumes it, so with
+    `chunksize` memory stays bounded however much was appended.
+    """
+    f = open(path, "rb")
+    header = f.readline()
+    f.seek(max(offset, len(header)))
+    stream = io.BufferedReader(_Prepended(header, f))
+    if chunksize is None:
+        with f:
+            return pd.read_csv(stream, low_memory=False)
+    return _closing_chunks(pd.read_csv(stream, chunksize=chunksize, low_memory=False), f)
+
+
+def _closing_chunks(reader, f):
+    with f, reader:
+        yield from reader
+
+
+def profile_dataframe(df, chunksize=CSV_CHUNK_ROWS, top_k=5, sample_rows=10, counter_capacity=10_000, seed=0):
+    """Same profile as stream_csv_profile() for a table that is already in memory."""
+    return TableProfiler(top_k, sample_rows, counter_capacity, seed).update_frame(df, chunksize).profile()
@@ -0,0 +1,413 @@
+import io
+import itertools
+import os
+import re
+from html import unescape
+from xml.parsers import expat
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.styles.stylesheet import apply_stylesheet
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+
+from config import EXCEL_BLOCK_ROWS, EXCEL_COLUMNS, EXCEL_ROW_LIMIT, EXCEL_SHEETS
+
+
+class SheetTables(dict):
+    """Sheet name -> DataFrame, in workbook order, for a workbook loaded with several sheets."""
+
+    def shapes(self):
+        return {name: df.shape for name, df in self.items()}
+
+
+def _column_names(header):
+    """Header cells as unique strings; blanks become 'Unnamed: i' as in pandas."""
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = str(value).strip() if value is not None and str(value).strip() else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _selected(names, columns):
+    """Positions of the wanted columns; `columns` may hold header names or 0-based positions."""
+    if not columns:
+        return list(range(len(names)))
+    wanted = set(columns)
+    return [i for i, name in enumerate(names) if name in wanted or i in wanted]
+
+
+_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_ROW, _CELL, _VALUE, _TEXT = (f"{_NS} {tag}" for tag in ("row", "c", "v", "t"))
+
+# Cells as written by Excel, LibreOffice, openpyxl and XlsxWriter: an unprefixed
+# tag with the reference as the first attribute; a plain <v> value is captured
+# directly, anything else (formulas, inline strings) as the raw inner XML
+_CELL_RE = re.compile(r'<c r="([A-Z]+)(\d+)"([^>]*?)(?:/>|>(?:<v>([^<]*)</v>|(.*?))</c>)', re.S)
+_TYPE_RE = re.compile(r'\bt="(\w+)"')
+_STYLE_RE = re.compile(r'\bs="(\d+)"')
+_VALUE_RE = re.compile(r"<v>(.*?)</v>", re.S)
+_INLINE_RE = re.compile(r"<t(?: [^>]*)?>(.*?)</t>", re.S)
+
+
+class _IrregularSheet(Exception):
+    """The sheet XML is not laid out the way the regex scan expects."""
+
+
+def _cast_number(text):
+    # Same rule as openpyxl: integers stay int so integer columns get an integer dtype
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+class _XlsxSheets:
+    """
+    Sheet list, shared strings and date styles of an .xlsx package, read
+    without touching any sheet data.
+
+    load_workbook(read_only=True) builds every ReadOnlyWorksheet up front, and
+    one without a <dimension> element (as written by many exporters) is parsed
+    in full just to learn its size - before a single row is read.
+    """
+
+    def __init__(self, path):
+        reader = ExcelReader(path, read_only=True, data_only=True)
+        reader.read_manifest()
+        reader.read_strings()
+        reader.read_workbook()
+        apply_stylesheet(reader.archive, reader.wb)
+        self.archive = reader.archive
+        self.shared_strings = reader.shared_strings
+        self.epoch = reader.wb.epoch
+        self.date_styles = {str(i) for i in reader.wb._date_formats}
+        self.timedelta_styles = {str(i) for i in reader.wb._timedelta_formats}
+        self.targets = {
+            sheet.name: rel.target
+            for sheet, rel in reader.parser.find_sheets()
+            if rel.target in reader.valid_files and "chartsheet" not in rel.Type
+        }
+        self.sheetnames = list(self.targets)
+
+    def rows(self, name):
+        return _SheetScanner(self, self.targets[name])
+
+    def close(self):
+        self.archive.close()
+
+
+class _SheetScanner:
+    """
+    Rows of one worksheet as {column position: value} dicts, parsed straight
+    from the sheet XML: a regex scan over blocks of rows for the usual layout,
+    expat for anything else.
+
+    openpyxl builds a dict per cell, parses every coordinate and dispatches on
+    every value; here only the cells in `keep` (set once the header is known)
+    are converted at all. Values follow openpyxl's data_only rules.
+    """
+
+    def __init__(self, book, target, chunk_bytes=1 << 20):
+        self.book = book
+        self.target = target
+        self.chunk_bytes = chunk_bytes
+        self.keep = None
+        self._letters = {}
+
+    def _column(self, ref, previous):
+        if ref is None:
+            return previous + 1
+        letters = ref.rstrip("0123456789")
+        col = self._letters.get(letters)
+        if col is None:
+            col = 0
+            for ch in letters:
+                col = col * 26 + ord(ch) - 64
+            col = self._letters[letters] = col - 1
+        return col
+
+    @staticmethod
+    def _attrs(attrs, cache):
+        """(type, style) from a cell's attribute text; a sheet only has a handful of distinct ones."""
+        m = _TYPE_RE.search(attrs)
+        s = _STYLE_RE.search(attrs)
+        parsed = cache[attrs] = (m.group(1) if m else "n", s.group(1) if s else None)
+        return parsed
+
+    def _value(self, kind, style, text):
+        if kind == "n":
+            value = _cast_number(text)
+            if style in self.book.date_styles:
+                return from_excel(value, self.book.epoch, timedelta=style in self.book.timedelta_styles)
+            return value
+        if kind == "s":
+            return self.book.shared_strings[int(text)]
+        if kind in ("str", "inlineStr"):
+            return text
+        if kind == "b":
+            return text == "1"
+        if kind == "d":
+            return from_ISO8601(text)
+        return None  # "e": error cells read as missing
+
+    def __iter__(self):
+        done = 0
+        try:
+            for cells in self._regex_rows():
+                yield cells
+                done += 1
+        except _IrregularSheet:
+            yield from itertools.islice(self._expat_rows(), done, None)
+
+    def _regex_rows(self):
+        """
+        Whole blocks of complete rows matched by one C-level findall() each.
+
+        Every block is checked (cell count, unprefixed tags) before any of its
+        rows are yielded, so an unusual sheet falls back to expat cleanly.
+        """
+        shared = self.book.shared_strings
+        column = self._column
+        letters_cache = self._letters
+        attr_cache = {}
+        tail = ""
+        first = True
+        with self.book.archive.open(self.target) as raw, io.TextIOWrapper(raw, encoding="utf-8") as src:
+            while True:
+                chunk = src.read(self.chunk_bytes)
+                text = tail + chunk
+                cut = len(text) if not chunk else text.rfind("</row>") + len("</row>")
+                if chunk and cut < len("</row>"):
+                    tail = text
+                    continue
+                block, tail = text[:cut], text[cut:]
+                if first:
+                    if "<sheetData" not in block and ":sheetData" in block:
+                        raise _IrregularSheet()
+                    first = False
+
+                matches = _CELL_RE.findall(block)
+                if len(matches) != block.count("<c ") + block.count("<c>"):
+                    raise _IrregularSheet()
+                keep = self.keep
+                rows = []
+                cells, current, col = None, None, -1
+                for letters, row, attrs, value, inner in matches:
+                    if row != current:
+                        if cells:
+                            rows.append(cells)
+                        cells, current = {}, row
+                    col = letters_cache.get(letters)
+                    if col is None:
+                        col = column(letters, col)
+                    if keep is not None and col not in keep:
+                        continue
+                    kind, style = attr_cache.get(attrs) or self._attrs(attrs, attr_cache)
+                    if not value:
+                        if not inner:
+                            continue
+                        if kind == "inlineStr":
+                            value = "".join(_INLINE_RE.findall(inner))
+                        else:
+                            m = _VALUE_RE.search(inner)
+                            value = m.group(1) if m else None
+                        if not value:
+                            continue  # e.g. a formula with no cached result
+                    if kind == "s":
+                        cells[col] = shared[int(value)]
+                    elif kind == "n" and style is None:
+                        cells[col] = _cast_number(value)
+                    else:
+                        if kind in ("str", "inlineStr"):
+                            value = unescape(value)
+                        cells[col] = self._value(kind, style, value)
+                if cells:
+                    rows.append(cells)
+                yield from rows
+                if not chunk:
+                    break
+
+    def _expat_rows(self):
+        rows = []
+        state = {"cells": None, "col": -1, "kind": "n", "style": None, "parts": None}
+        shared = self.book.shared_strings
+
+        def start(name, attrs):
+            if name == _CELL:
+                state["col"] = self._column(attrs.get("r"), state["col"])
+                state["kind"] = attrs.get("t", "n")
+                state["style"] = attrs.get("s")
+            elif (name == _VALUE or name == _TEXT) and state["parts"] is None:
+                state["parts"] = []
+            elif name == _ROW:
+                state["cells"] = {}
+                state["col"] = -1
+
+        def data(text):
+            parts = state["parts"]
+            if parts is not None:
+                parts.append(text)
+
+        def end(name):
+            if name == _CELL:
+                parts = state["parts"]
+                state["parts"] = None
+                col = state["col"]
+                if not parts or (self.keep is not None and col not in self.keep):
+                    return
+                text = "".join(parts)
+                kind = state["kind"]
+                if kind == "s":
+                    state["cells"][col] = shared[int(text)]
+                elif kind == "n" and state["style"] is None:
+                    state["cells"][col] = _cast_number(text)
+                else:
+                    state["cells"][col] = self._value(kind, state["style"], text)
+            elif name == _ROW:
+                if state["cells"]:
+                    rows.append(state["cells"])
+                state["cells"] = None
+
+        parser = expat.ParserCreate(namespace_separator=" ")
+        parser.buffer_text = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = data
+        with self.book.archive.open(self.target) as src:
+            while True:
+                chunk = src.read(self.chunk_bytes)
+                parser.Parse(chunk, not chunk)
+                yield from rows
+                rows.clear()
+                if not chunk:
+                    break
+
+
+class _OpenpyxlSheets:
+    """The same interface through load_workbook(read_only=True), should openpyxl's internals change."""
+
+    def __init__(self, path):
+        self.wb = load_workbook(path, read_only=True, data_only=True)
+        self.sheetnames = self.wb.sheetnames
+
+    def rows(self, name):
+        return _OpenpyxlRows(self.wb[name])
+
+    def close(self):
+        self.wb.close()
+
+
+class _OpenpyxlRows:
+    def __init__(self, ws):
+        self.ws = ws
+        self.keep = None
+
+    def __iter__(self):
+        for row in self.ws.iter_rows(values_only=True):
+            cells = {i: v for i, v in enumerate(row) if v is not None}
+            if cells:
+                yield cells
+
+
+def _open_xlsx(path):
+    try:
+        return _XlsxSheets(path)
+    except (AttributeError, ImportError, TypeError):
+        return _OpenpyxlSheets(path)
+
+
+def _read_sheet(rows, columns, max_rows, block_rows):
+    it = iter(rows)
+    # The first non-empty row is the header
+    header = next(it, None)
+    if header is None:
+        return pd.DataFrame()
+
+    # Positions past the header (named or not) are columns too, "Unnamed: i" as in pandas
+    width = max(header) + 1
+    if columns:
+        width = max([width] + [c + 1 for c in columns if isinstance(c, int)])
+    names = _column_names(header.get(i) for i in range(width))
+    keep = _selected(names, columns)
+    if not keep:
+        return pd.DataFrame()
+    # Without a selection every cell is read, so data wider than the header widens the table
+    rows.keep = set(keep) if columns else None
+    cols = [names[i] for i in keep]
+
+    blocks, buf, n_rows = [], [], 0
+    for cells in it:
+        if max_rows is not None and n_rows >= max_rows:
+            break
+        if not columns and max(cells, default=-1) >= len(names):
+            if buf:
+                blocks.append(pd.DataFrame.from_records(buf, columns=cols))
+                buf = []
+            names = _column_names(header.get(i) for i in range(max(cells) + 1))
+            keep = list(range(len(names)))
+            cols = names
+        values = [cells.get(i) for i in keep]
+        if all(v is None for v in values):
+            continue
+        buf.append(values)
+        n_rows += 1
+        if len(buf) >= block_rows:
+            # Typed blocks instead of millions of row lists of Python objects
+            blocks.append(pd.DataFrame.from_records(buf, columns=cols))
+            buf = []
+    if buf or not blocks:
+        blocks.append(pd.DataFrame.from_records(buf, columns=cols))
+    df = blocks[0] if len(blocks) == 1 else pd.concat(blocks, ignore_index=True)[cols]
+    # Typing and downcasting happen in normalize_financial_table()
+    return df.infer_objects()
+
+
+def read_excel_sheets(path, sheets=EXCEL_SHEETS, columns=EXCEL_COLUMNS, max_rows=EXCEL_ROW_LIMIT,
+                      block_rows=EXCEL_BLOCK_ROWS):
+    """
+    Read a workbook into one DataFrame per sheet.
+
+    .xlsx sheets are streamed straight from the package XML (cell values only,
+    no styles or object model). `sheets` selects sheets by name or 0-based
+    position (None = all), `columns` prunes columns by header name or
+    position, and `max_rows` caps the data rows read per sheet. Cells past the
+    end of the header become "Unnamed: i" columns, as in pandas. Legacy .xls
+    files go through pandas.read_excel with the same selection.
+    """
+    if os.path.splitext(path)[1].lower() == ".xls":
+        frames = pd.read_excel(path, sheet_name=None if sheets is None else list(sheets), nrows=max_rows)
+        if columns:
+            # usecols cannot mix header names and positions; select after reading
+            frames = {name: df.iloc[:, _selected([str(c) for c in df.columns], columns)]
+                      for name, df in frames.items()}
+        return SheetTables((str(name), df) for name, df in frames.items())
+
+    book = _open_xlsx(path)
+    try:
+        names = book.sheetnames
+        if sheets is not None:
+            wanted = set(sheets)
+            names = [n for i, n in enumerate(names) if n in wanted or i in wanted]
+            if not names:
+                raise ValueError(f"None of the sheets {list(sheets)} exist in {path}")
+        return SheetTables((name, _read_sheet(book.rows(name), columns, max_rows, block_rows)) for name in names)
+    finally:
+        book.close()
+
+
+def load_excel(path, **options):
+    """
+    read_excel_sheets() without the empty sheets; a single table comes back
+    as a plain DataFrame.
+    """
+    tables = SheetTables((name, df) for name, df in read_excel_sheets(path, **options).items() if not df.empty)
+    if len(tables) <= 1:
+        return next(iter(tables.values()), pd.DataFrame())
+    return tables
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import random
+import time
+from collections import namedtuple
+from dataclasses import dataclass
+
+from agno.models.openai.like import OpenAILike
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from llm_scheduler import LocalClient
+from prompt_builder import count_tokens
+
+_WORDS = (
+    "revenue", "margin", "growth", "liquidity", "exposure", "volatility", "drawdown", "allocation",
+    "portfolio", "hedging", "duration", "credit", "equity", "cash", "flow", "quarter", "guidance",
+    "increased", "declined", "stable", "risk", "return", "benchmark", "sector", "rebalance",
+    "the", "of", "and", "to", "in", "with", "on", "for", "across", "remains", "compared",
+)
+
+
+def fake_completion_text(prompt, completion_tokens, seed=0):
+    """
+    Deterministic pseudo-analysis for `prompt`: same prompt and seed, same text.
+
+    Roughly `completion_tokens` tokens of plain sentences with figures in them,
+    so downstream prompt budgets and report layout see realistic content.
+    """
+    digest = hashlib.sha256(f"{seed}|{prompt}".encode()).digest()
+    rng = random.Random(int.from_bytes(digest[:8], "big"))
+    words = []
+    target = max(1, int(completion_tokens * 0.75))
+    sentence = 0
+    while len(words) < target:
+        length = rng.randint(8, 18)
+        for i in range(length):
+            if rng.random() < 0.12:
+                words.append(f"{rng.uniform(-25, 40):.1f}%")
+            else:
+                words.append(rng.choice(_WORDS))
+        words[-length] = words[-length].capitalize()
+        words[-1] += "."
+        sentence += 1
+        if sentence % 4 == 0:
+            words[-1] += "\n"
+    return " ".join(words[:target]).replace("\n ", "\n")
+
+
+Reply = namedtuple("Reply", "text prompt_tokens completion_tokens first_token_delay total_delay")
+
+
+def _usage(prompt_tokens, completion_tokens):
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class _Completions:
+    """
+    chat.completions backed by a local `respond(messages, params) -> Reply`.
+
+    Replies come back as real SDK ChatCompletion / ChatCompletionChunk objects,
+    so agno parses them exactly as it parses service responses; streamed
+    replies are cut into chunks spread between the first-token and total delay.
+    """
+
+    def __init__(self, model_id, respond, chunk_tokens=4):
+        self.model_id = model_id
+        self.respond = respond
+        self.chunk_tokens = chunk_tokens
+
+    def _pieces(self, text):
+        """Split `text` into deltas of roughly `chunk_tokens` tokens each."""
+        words = text.split(" ")
+        step = max(1, int(self.chunk_tokens * 0.75))
+        for i in range(0, len(words), step):
+            piece = " ".join(words[i:i + step])
+            yield piece if i == 0 else " " + piece
+
+    def _completion(self, reply):
+        return ChatCompletion.model_validate({
+            "id": "local", "object": "chat.completion", "created": int(time.time()), "model": self.model_id,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": reply.text}}],
+            "usage": _usage(reply.prompt_tokens, reply.completion_tokens),
+        })
+
+    def _chunk(self, delta=None, finish=None, usage=None):
+        choices = [] if usage else [{"index": 0, "delta": delta or {}, "finish_reason": finish}]
+        return ChatCompletionChunk.model_validate({
+            "id": "local", "object": "chat.completion.chunk", "created": int(time.time()), "model": self.model_id,
+            "choices": choices, "usage": usage,
+        })
+
+    def _stream_items(self, reply):
+        """(delay before item, chunk) pairs for a streamed reply."""
+        pieces = list(self._pieces(reply.text))
+        gap = max(reply.total_delay - reply.first_token_delay, 0.0) / max(len(pieces) - 1, 1)
+        for i, piece in enumerate(pieces):
+            delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+            yield (reply.first_token_delay if i == 0 else gap), self._chunk(delta)
+        yield 0.0, self._chunk(finish="stop")
+        yield 0.0, self._chunk(usage=_usage(reply.prompt_tokens, reply.completion_tokens))
+
+
+class _SyncCompletions(_Completions):
+    def create(self, model=None, messages=(), stream=False, **params):
+        reply = self.respond(messages, params)
+        if not stream:
+            time.sleep(reply.total_delay)
+            return self._completion(reply)
+
+        def iterate():
+            for delay, chunk in self._stream_items(reply):
+                if delay:
+                    time.sleep(delay)
+                yield chunk
+        return iterate()
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, model=None, messages=(), stream=False, **params):
+        reply = self.respond(messages, params)
+        if not stream:
+            await asyncio.sleep(reply.total_delay)
+            return self._completion(reply)
+
+        async def iterate():
+            for delay, chunk in self._stream_items(reply):
+                if delay:
+                    await asyncio.sleep(delay)
+                yield chunk
+        return iterate()
+
+
+def prompt_text(messages):
+    return "\n".join(str(m.get("content") or "") for m in messages)
+
+
+@dataclass
+class FakeModel(OpenAILike):
+    """
+    Deterministic stand-in for the Azure model, for benchmarks and offline runs.
+
+    Responses are generated locally from a hash of the prompt and go through
+    agno's real response parsing. `latency` is the time to the first token and
+    `tokens_per_second` the generation rate (0 = instant).
+    """
+
+    id: str = "fake-model"
+    name: str = "FakeModel"
+    provider: str = "Fake"
+    api_key: str = "fake"
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    completion_tokens: int = 300
+    chunk_tokens: int = 4
+    seed: int = 0
+    calls: int = 0
+
+    def respond(self, messages, params=None):
+        self.calls += 1
+        prompt = prompt_text(messages)
+        text = fake_completion_text(prompt, self.completion_tokens, self.seed)
+        completion_tokens = count_tokens(text)
+        rate = self.tokens_per_second
+        total = self.latency + (completion_tokens / rate if rate else 0.0)
+        return Reply(text, count_tokens(prompt), completion_tokens, self.latency, total)
+
+    def get_client(self):
+        return LocalClient(_SyncCompletions(self.id, self.respond, self.chunk_tokens))
+
+    def get_async_client(self):
+        return LocalClient(_AsyncCompletions(self.id, self.respond, self.chunk_tokens))
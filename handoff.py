@@ -0,0 +1,124 @@
+import re
+from functools import lru_cache
+
+from config import HANDOFF_MAX_FACTS, HANDOFF_MAX_FLAGS, HANDOFF_MAX_METRICS, HANDOFF_MAX_TOKENS
+from prompt_builder import count_tokens, truncate_to_tokens
+
+# Part of the stage keys of prompts that carry hand-offs; bump when extraction changes
+HANDOFF_VERSION = "2"
+
+_BULLET = re.compile(r"^(?:[•●▪◦*–-]|\(?\d{1,2}[.)]|\(?[a-h][.)])\s+")
+# "Label: value" lines whose value carries a figure
+_METRIC = re.compile(r"^(?P<label>[A-Za-z][\w ()/&%.,'-]{1,60}?)\s*[:=]\s*(?P<value>\S.*\d.*)$")
+# Labels that read as a clause ("Concentration risk is elevated: ...") are sentences
+_CLAUSE = re.compile(r"\b(?:is|are|was|were|has|have|remains?|shows?|appears?)\b", re.IGNORECASE)
+# End of the figure in a metric's value: the explanation that follows is dropped
+_VALUE_END = re.compile(r"(?<=\S)[;.]\s|,\s(?:meaning|which|indicating|suggesting|so|implying)\b")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+(?=[A-Z(\"'])")
+# Text ending in an abbreviation ("vs.", "e.g.", "U.S.", "Inc.", "No. 3") is not the end of a sentence
+_ABBREVIATION = re.compile(
+    r"(?:^|[\s(])(?:(?:[A-Za-z]\.){2,}|(?:vs|etc|approx|incl|est|avg|cf|al|Inc|Ltd|Corp|Co|Bros|No|Nos|Mr|Mrs|Ms|Dr"
+    r"|St|Jr|Sr|Fig|Jan|Feb|Mar|Apr|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)\.)$"
+)
+_FLAG = re.compile(
+    r"\b(?:breach\w*|exceed\w*|warning|alert|critical|concern\w*|caution|missing|outliers?|inconsisten\w*"
+    r"|anomal\w*|declin\w*|deteriorat\w*|loss(?:es)?|negative|elevated|vulnerab\w*|shortfall|default\w*"
+    r"|downgrade\w*|covenant\w*|impairment\w*|underperform\w*|below (?:the )?(?:\S+ )?(?:benchmark|target|threshold)"
+    r"|high(?:er)? (?:risk|volatility|leverage|concentration))\b",
+    re.IGNORECASE,
+)
+_MAX_ITEM_CHARS = 240
+_MAX_VALUE_CHARS = 100
+
+
+def _clip(text, limit=_MAX_ITEM_CHARS):
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + " ..."
+
+
+def _sentences(line):
+    sentences = []
+    for piece in _SENTENCE.split(line):
+        if sentences and _ABBREVIATION.search(sentences[-1]):
+            sentences[-1] += " " + piece
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def _is_heading(text):
+    return not re.search(r"\d", text) and not text.endswith((".", "!", "?")) and len(text.split()) <= 8
+
+
+def extract_handoff(text, max_metrics=HANDOFF_MAX_METRICS, max_flags=HANDOFF_MAX_FLAGS, max_facts=HANDOFF_MAX_FACTS):
+    """
+    Compact record of one agent's response for the agents after it.
+
+    "metrics" maps the labels of "Label: value" lines to their values,
+    "flags" holds sentences naming a problem (breaches, losses, missing data,
+    elevated risk), "facts" the other sentences that carry a figure, and
+    "summary" and "conclusion" the first and last sentences of plain prose.
+    Headings and the rest of the prose are left out; the full text still goes
+    into the report.
+    """
+    record = {"summary": None, "metrics": {}, "flags": [], "facts": [], "conclusion": None}
+    seen = set()
+    last_prose = None
+    for raw in text.splitlines():
+        line = _BULLET.sub("", raw.strip()).strip()
+        if not line:
+            continue
+        match = _METRIC.match(line)
+        if match and len(match["label"].split()) <= 6 and not _CLAUSE.search(match["label"]):
+            if len(record["metrics"]) < max_metrics:
+                value = _VALUE_END.split(match["value"], maxsplit=1)[0].rstrip(".")
+                record["metrics"].setdefault(match["label"].strip(), _clip(value.strip(), _MAX_VALUE_CHARS))
+            continue
+        for sentence in _sentences(line):
+            sentence = sentence.strip()
+            if sentence in seen or len(sentence) < 12 or _is_heading(sentence):
+                continue
+            seen.add(sentence)
+            if record["summary"] is None:
+                record["summary"] = _clip(sentence)
+            elif _FLAG.search(sentence):
+                if len(record["flags"]) < max_flags:
+                    record["flags"].append(_clip(sentence))
+            elif re.search(r"\d", sentence):
+                if len(record["facts"]) < max_facts:
+                    record["facts"].append(_clip(sentence))
+            else:
+                last_prose = sentence
+    if last_prose is not None:
+        record["conclusion"] = _clip(last_prose)
+    return record
+
+
+def handoff_to_text(record, max_tokens=HANDOFF_MAX_TOKENS):
+    """The record as labelled plain-text lines, cut at a line boundary to `max_tokens`."""
+    lines = []
+    if record["summary"]:
+        lines.append(f"Summary: {record['summary']}")
+    if record["metrics"]:
+        lines.append("Metrics:")
+        lines.extend(f"  {label}: {value}" for label, value in record["metrics"].items())
+    for key, title in (("flags", "Flags"), ("facts", "Facts")):
+        if record[key]:
+            lines.append(f"{title}:")
+            lines.extend(f"  - {item}" for item in record[key])
+    if record["conclusion"]:
+        lines.append(f"Conclusion: {record['conclusion']}")
+    return truncate_to_tokens("\n".join(lines), max_tokens)
+
+
+@lru_cache(maxsize=128)
+def compact_handoff(text):
+    """
+    What the next agent receives in place of `text`: its record as text, or
+    `text` itself when that is no longer (short responses, or nothing found).
+    """
+    if not text:
+        return text
+    compact = handoff_to_text(extract_handoff(text))
+    return compact if compact and count_tokens(compact) < count_tokens(text) else text
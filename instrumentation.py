@@ -0,0 +1,269 @@
+import contextvars
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from config import METRICS_ENABLED, METRICS_LOG_PATH, METRICS_TRACE_MEMORY
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float("inf"))
+
+_current = contextvars.ContextVar("run_metrics", default=None)
+_NOOP = nullcontext()
+_write_lock = threading.Lock()
+_enabled = METRICS_ENABLED
+
+
+def metrics_enabled():
+    return _enabled
+
+
+def set_metrics_enabled(enabled=True, trace_memory=METRICS_TRACE_MEMORY):
+    """
+    Turn instrumentation on or off for this process (forked workers inherit it).
+
+    `trace_memory` starts tracemalloc so stages also report peak Python
+    allocations; it slows allocation-heavy code noticeably, so it is separate.
+    """
+    global _enabled
+    _enabled = enabled
+    if enabled and trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def peak_rss_mb():
+    """Highest resident set size of this process so far (never goes down)."""
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024), 1)
+
+
+def current_rss_mb():
+    """Resident set size of this process now, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+class RunMetrics:
+    """
+    Measurements for one report: a list of timed stages, token counts per
+    agent and cache hit/miss counters.
+
+    Each stage records how much the process's resident memory grew while it
+    ran ("rss_delta_mb") and the process's lifetime peak when it ended
+    ("process_peak_rss_mb"); with tracemalloc on, "peak_alloc_mb" is the
+    stage's own peak of Python allocations. CPU time and RSS are process-wide,
+    so with several reports in flight on one event loop they include the
+    neighbours' work; wall time is always exact.
+    """
+
+    def __init__(self, input_path=None):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.input = input_path
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+        self.agents = {}
+        self.cache = {}
+        self.fields = {}
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        entry = {"stage": name}
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        rss = current_rss_mb()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        try:
+            yield entry
+        finally:
+            entry["wall_seconds"] = round(time.perf_counter() - wall, 4)
+            entry["cpu_seconds"] = round(time.process_time() - cpu, 4)
+            if rss is not None:
+                entry["rss_delta_mb"] = round(current_rss_mb() - rss, 1)
+            entry["process_peak_rss_mb"] = peak_rss_mb()
+            if tracemalloc.is_tracing():
+                entry["peak_alloc_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            self.stages.append(entry)
+
+    def add_tokens(self, agent, prompt_tokens, completion_tokens, estimated=False, cached=False):
+        self.agents[agent] = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "estimated": estimated,
+            "cached": cached,
+        }
+
+    def count_cache(self, cache, hit):
+        counts = self.cache.setdefault(cache, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+    def snapshot(self):
+        return {"stages": self.stages, "agents": self.agents, "cache": self.cache}
+
+    def merge(self, snapshot):
+        """Fold in what a worker process measured (see collect())."""
+        self.stages.extend(snapshot["stages"])
+        self.agents.update(snapshot["agents"])
+        for cache, counts in snapshot["cache"].items():
+            mine = self.cache.setdefault(cache, {"hits": 0, "misses": 0})
+            mine["hits"] += counts["hits"]
+            mine["misses"] += counts["misses"]
+
+    def to_record(self):
+        return {
+            "run_id": self.run_id,
+            "input": self.input,
+            "started_at": self.started_at,
+            "wall_seconds": round(time.perf_counter() - self._t0, 4),
+            **self.fields,
+            **self.snapshot(),
+        }
+
+
+def current_run():
+    return _current.get()
+
+
+def stage(name):
+    """Time a block as a stage of the current run; a shared no-op when there is none."""
+    run = _current.get()
+    return _NOOP if run is None else run.stage(name)
+
+
+def add_tokens(agent, prompt_tokens, completion_tokens, estimated=False, cached=False):
+    run = _current.get()
+    if run is not None:
+        run.add_tokens(agent, prompt_tokens, completion_tokens, estimated, cached)
+
+
+def count_cache(cache, hit):
+    run = _current.get()
+    if run is not None:
+        run.count_cache(cache, hit)
+
+
+@contextmanager
+def track_run(input_path=None, log_path=METRICS_LOG_PATH):
+    """
+    Collect metrics for everything run inside the block (including tasks and
+    threads it starts) and append the record to `log_path` as one JSON line.
+    Yields None when instrumentation is off.
+    """
+    if not _enabled:
+        yield None
+        return
+    run = RunMetrics(input_path)
+    token = _current.set(run)
+    try:
+        yield run
+    except BaseException as e:
+        run.fields.setdefault("status", "failed")
+        run.fields.setdefault("error", str(e))
+        raise
+    finally:
+        _current.reset(token)
+        if log_path:
+            write_record(run.to_record(), log_path)
+
+
+def collect(fn, *args):
+    """
+    Run fn(*args) in a worker process and return (result, snapshot) so the
+    parent can merge() the worker's stages into its own run.
+    """
+    if not _enabled:
+        return fn(*args), None
+    run = RunMetrics()
+    token = _current.set(run)
+    try:
+        return fn(*args), run.snapshot()
+    finally:
+        _current.reset(token)
+
+
+def write_record(record, log_path=METRICS_LOG_PATH):
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _write_lock, open(log_path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def load_records(log_path=METRICS_LOG_PATH):
+    with open(log_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ------------------------ Aggregation ------------------------
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    idx = min(int(round(p / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+
+def latency_histogram(values, buckets=LATENCY_BUCKETS):
+    counts = {}
+    for upper in buckets:
+        counts[f"<={upper:g}s" if upper != float("inf") else f">{buckets[-2]:g}s"] = 0
+    labels = list(counts)
+    for v in values:
+        for label, upper in zip(labels, buckets):
+            if v <= upper:
+                counts[label] += 1
+                break
+    return counts
+
+
+def summarize_runs(records):
+    """Latency distribution per stage, plus token, cache and hand-off savings totals, across a batch of run records."""
+    by_stage = {}
+    for record in records:
+        for entry in record.get("stages", []):
+            by_stage.setdefault(entry["stage"], []).append(entry["wall_seconds"])
+        by_stage.setdefault("total", []).append(record["wall_seconds"])
+
+    stages = {}
+    for name, values in by_stage.items():
+        values.sort()
+        stages[name] = {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 4),
+            "p50": _percentile(values, 50),
+            "p90": _percentile(values, 90),
+            "p99": _percentile(values, 99),
+            "max": values[-1],
+            "histogram": latency_histogram(values),
+        }
+
+    tokens = {}
+    caches = {}
+    handoff_saved = 0
+    for record in records:
+        handoff_saved += sum((record.get("handoff_tokens_saved") or {}).values())
+        for agent, t in record.get("agents", {}).items():
+            total = tokens.setdefault(agent, {"prompt_tokens": 0, "completion_tokens": 0, "calls": 0, "cached": 0})
+            total["prompt_tokens"] += t["prompt_tokens"]
+            total["completion_tokens"] += t["completion_tokens"]
+            total["calls"] += 1
+            total["cached"] += int(t["cached"])
+        for cache, counts in record.get("cache", {}).items():
+            total = caches.setdefault(cache, {"hits": 0, "misses": 0})
+            total["hits"] += counts["hits"]
+            total["misses"] += counts["misses"]
+    return {"runs": len(records), "stages": stages, "tokens": tokens, "cache": caches,
+            "handoff_tokens_saved": handoff_saved}
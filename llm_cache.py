@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import (
+    AZURE_OPENAI_DEPLOYMENT,
+    LLM_CACHE_BYPASS,
+    LLM_CACHE_DIR,
+    LLM_CACHE_MAX_AGE_SECONDS,
+    LLM_CACHE_MAX_BYTES,
+)
+
+
+def cache_key(agent, prompt):
+    """
+    Content hash of everything that shapes an agent's answer.
+
+    The role text and instructions are part of the key, so editing a prompt in
+    agents.py invalidates that agent's entries without any manual flushing.
+    Models whose answers must not mix with the deployment's own (replayed or
+    generated text) set `cache_namespace`, which keeps their entries apart.
+    """
+    model = getattr(agent, "model", None)
+    model_id = getattr(model, "id", None) or AZURE_OPENAI_DEPLOYMENT
+    parts = [
+        getattr(agent, "name", None),
+        getattr(agent, "role", None),
+        list(getattr(agent, "instructions", None) or []),
+        model_id,
+        prompt,
+    ]
+    namespace = getattr(model, "cache_namespace", None)
+    if namespace:
+        parts.append(namespace)
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """On-disk (SQLite) cache of agent responses with size- and age-based eviction."""
+
+    def __init__(self, path=None, max_bytes=LLM_CACHE_MAX_BYTES, max_age=LLM_CACHE_MAX_AGE_SECONDS, bypass=LLM_CACHE_BYPASS):
+        path = path or os.path.join(LLM_CACHE_DIR, "responses.sqlite")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, agent TEXT, response TEXT,"
+            " size INTEGER, created REAL, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self._conn.commit()
+
+    def get(self, agent, prompt):
+        """Cached response text, or None on a miss (always None when bypassed)."""
+        if self.bypass:
+            return None
+        key = cache_key(agent, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, agent, prompt, response):
+        if self.bypass:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key(agent, prompt), getattr(agent, "name", None), response, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are back under budget
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size, "bypass": self.bypass}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Process-wide cache instance shared by all agent calls."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
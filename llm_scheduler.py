@@ -0,0 +1,403 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import openai
+
+from config import (
+    LLM_EXPECTED_COMPLETION_TOKENS,
+    LLM_MAX_RETRIES,
+    LLM_RATE_BURST_SECONDS,
+    LLM_RATE_LIMITS,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+)
+from prompt_builder import count_tokens
+
+# Lower runs first
+PRIORITIES = {"interactive": 0, "default": 1, "batch": 2}
+
+_priority = contextvars.ContextVar("llm_priority", default=PRIORITIES["default"])
+
+# Statuses worth another attempt; 4xx other than these are the request's own fault
+_RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# How often a waiter that is not first in line looks again
+_POLL_SECONDS = 0.05
+
+
+def _level(priority):
+    return PRIORITIES[priority] if isinstance(priority, str) else int(priority)
+
+
+@contextmanager
+def llm_priority(priority):
+    """Model calls made inside the block (and tasks started from it) queue at `priority`."""
+    token = _priority.set(_level(priority))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(messages, params):
+    """What a request counts against TPM before it runs: prompt plus the completion it may produce."""
+    prompt = sum(count_tokens(str(m.get("content") or "")) for m in messages)
+    completion = params.get("max_completion_tokens") or params.get("max_tokens") or LLM_EXPECTED_COMPLETION_TOKENS
+    return prompt + completion
+
+
+class TokenBucket:
+    """
+    At most `per_minute` units in any 60-second window.
+
+    The bucket holds `burst_seconds` worth of quota and refills with the
+    rest, so a full bucket plus a minute of refill never exceeds the quota;
+    sustained throughput is `per_minute` less the burst.
+    """
+
+    def __init__(self, per_minute, burst_seconds=LLM_RATE_BURST_SECONDS):
+        self.per_minute = per_minute
+        self.capacity = max(1.0, per_minute * burst_seconds / 60.0)
+        self.rate = max(per_minute - self.capacity, per_minute / 2) / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (requests larger than the bucket wait for a full one)."""
+        self._refill(now)
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, amount):
+        # May go negative for an oversized request; later requests then wait it off
+        self.level -= amount
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "cancelled")
+
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class DeploymentLimiter:
+    """
+    RPM/TPM budget of one deployment, handed out in priority order.
+
+    Waiting requests form one queue ordered by (priority, arrival); only the
+    head may take from the buckets, so a large batch request is not starved
+    by a stream of small ones and interactive work always goes first. A 429
+    from the service pauses the whole deployment for its Retry-After.
+    """
+
+    def __init__(self, name, rpm=None, tpm=None, burst_seconds=LLM_RATE_BURST_SECONDS):
+        self.name = name
+        self.requests = TokenBucket(rpm, burst_seconds) if rpm else None
+        self.tokens = TokenBucket(tpm, burst_seconds) if tpm else None
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self.counts = {"granted": 0, "rate_limited": 0, "retries": 0, "failed": 0,
+                       "wait_seconds": 0.0, "tokens_charged": 0}
+
+    def _enqueue(self, priority):
+        with self._lock:
+            ticket = _Ticket(priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            return ticket
+
+    def _cancel(self, ticket):
+        with self._lock:
+            ticket.cancelled = True
+
+    def _try_acquire(self, ticket, tokens):
+        """0 when granted, else seconds to wait before trying again."""
+        with self._lock:
+            while self._queue and self._queue[0].cancelled:
+                heapq.heappop(self._queue)
+            if self._queue[0] is not ticket:
+                return _POLL_SECONDS
+            now = time.monotonic()
+            wait = self.paused_until - now
+            if self.requests is not None:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            heapq.heappop(self._queue)
+            self.counts["granted"] += 1
+            self.counts["tokens_charged"] += tokens
+            return 0.0
+
+    def acquire(self, tokens, priority):
+        """Block until a request of `tokens` fits the budget."""
+        ticket = self._enqueue(priority)
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self._try_acquire(ticket, tokens)
+                if not wait:
+                    break
+                time.sleep(wait)
+        finally:
+            self._cancel(ticket)
+        self._waited(started)
+
+    async def aacquire(self, tokens, priority):
+        ticket = self._enqueue(priority)
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self._try_acquire(ticket, tokens)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            self._cancel(ticket)
+        self._waited(started)
+
+    def _waited(self, started):
+        self.count("wait_seconds", time.monotonic() - started)
+
+    def count(self, key, n=1):
+        with self._lock:
+            self.counts[key] += n
+
+    def charge(self, tokens):
+        """Count tokens a response used beyond its estimate."""
+        if tokens <= 0:
+            return
+        with self._lock:
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            self.counts["tokens_charged"] += tokens
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rpm": self.requests.per_minute if self.requests else None,
+                "tpm": self.tokens.per_minute if self.tokens else None,
+                "waiting": sum(1 for t in self._queue if not t.cancelled),
+                **self.counts,
+                "wait_seconds": round(self.counts["wait_seconds"], 3),
+            }
+
+
+def _retry_after(error):
+    """Seconds the service asked us to wait, from Azure's retry-after-ms or the standard header."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _retryable(error):
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in _RETRY_STATUSES
+
+
+class LLMScheduler:
+    """
+    The gate every model call goes through.
+
+    Each call waits for its deployment's RPM/TPM budget (LLM_RATE_LIMITS;
+    deployments without an entry are not throttled locally), in priority
+    order (see llm_priority()). Transient failures such as 429, 5xx,
+    timeouts and dropped connections are retried up to `max_retries` times
+    with jittered exponential backoff, never sooner than the service's
+    Retry-After. Streams are retried only if they fail before the first
+    chunk. `tokens` replaces the TPM estimate for requests that are not chat
+    completions, such as embeddings.
+    """
+
+    def __init__(self, limits=LLM_RATE_LIMITS, max_retries=LLM_MAX_RETRIES, base_delay=LLM_RETRY_BASE_DELAY,
+                 max_delay=LLM_RETRY_MAX_DELAY, burst_seconds=LLM_RATE_BURST_SECONDS):
+        self.limits = dict(limits or {})
+        self.burst_seconds = burst_seconds
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, deployment):
+        with self._lock:
+            limiter = self._limiters.get(deployment)
+            if limiter is None:
+                budget = self.limits.get(deployment) or {}
+                limiter = self._limiters[deployment] = DeploymentLimiter(
+                    deployment, budget.get("rpm"), budget.get("tpm"), self.burst_seconds)
+            return limiter
+
+    def _backoff(self, error, attempt, limiter):
+        """Seconds before the next attempt, or None when `error` should be raised."""
+        if attempt >= self.max_retries or not _retryable(error):
+            limiter.count("failed")
+            return None
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+        retry_after = _retry_after(error)
+        if isinstance(error, openai.RateLimitError):
+            limiter.count("rate_limited")
+            # Everyone waits, not just this request: the quota is shared
+            limiter.pause(retry_after if retry_after is not None else delay)
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, self.base_delay))
+        limiter.count("retries")
+        return delay
+
+    @staticmethod
+    def _settle(limiter, estimate, usage):
+        if usage is not None:
+            limiter.charge(usage.total_tokens - estimate)
+
+    def call(self, send, model, messages, params, stream=False, tokens=None):
+        limiter = self.limiter(model)
+        estimate = tokens if tokens is not None else estimate_tokens(messages, params)
+        priority = _priority.get()
+        for attempt in itertools.count():
+            limiter.acquire(estimate, priority)
+            try:
+                response = send()
+            except Exception as e:
+                delay = self._backoff(e, attempt, limiter)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            if not stream:
+                self._settle(limiter, estimate, response.usage)
+                return response
+
+            def iterate():
+                usage = None
+                for chunk in response:
+                    usage = chunk.usage or usage
+                    yield chunk
+                self._settle(limiter, estimate, usage)
+            return iterate()
+
+    async def acall(self, send, model, messages, params, stream=False, tokens=None):
+        limiter = self.limiter(model)
+        estimate = tokens if tokens is not None else estimate_tokens(messages, params)
+        priority = _priority.get()
+        for attempt in itertools.count():
+            await limiter.aacquire(estimate, priority)
+            try:
+                response = await send()
+            except Exception as e:
+                delay = self._backoff(e, attempt, limiter)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            if not stream:
+                self._settle(limiter, estimate, response.usage)
+                return response
+
+            async def iterate():
+                usage = None
+                async for chunk in response:
+                    usage = chunk.usage or usage
+                    yield chunk
+                self._settle(limiter, estimate, usage)
+            return iterate()
+
+    def stats(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+class _ScheduledSync:
+    def __init__(self, completions, scheduler):
+        self._completions = completions
+        self._scheduler = scheduler
+
+    def create(self, model=None, messages=(), stream=False, **params):
+        send = lambda: self._completions.create(model=model, messages=messages, stream=stream, **params)
+        return self._scheduler.call(send, model, messages, params, stream)
+
+
+class _ScheduledAsync:
+    def __init__(self, completions, scheduler):
+        self._completions = completions
+        self._scheduler = scheduler
+
+    async def create(self, model=None, messages=(), stream=False, **params):
+        send = lambda: self._completions.create(model=model, messages=messages, stream=stream, **params)
+        return await self._scheduler.acall(send, model, messages, params, stream)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """The process-wide scheduler; every pooled Azure client goes through it."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler=None):
+    """Swap in a differently configured scheduler (None = rebuild from config on next use)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class LocalClient:
+    """Just enough of the OpenAI SDK client surface for agno's chat model."""
+
+    def __init__(self, completions):
+        self.chat = _Chat(completions)
+
+    def is_closed(self):
+        return False
+
+
+def scheduled(client, is_async=False):
+    """`client` (an SDK client) with its chat completions going through the scheduler."""
+    wrapper = _ScheduledAsync if is_async else _ScheduledSync
+    return LocalClient(wrapper(client.chat.completions, get_scheduler()))
@@ -0,0 +1,164 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import MONTE_CARLO_CHUNK_PATHS, MONTE_CARLO_HORIZON, MONTE_CARLO_PATHS, MONTE_CARLO_SEED
+
+_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def portfolio_inputs(returns, weights=None):
+    """
+    Reduce a (T x N) simple-return matrix to what the simulator needs.
+
+    The book is held at constant weights (rebalanced each step), so its
+    one-step log-return is w.x with x ~ N(mu, Sigma) for GBM: the full asset
+    covariance enters through w' Sigma w, and no (paths x steps x assets)
+    array is ever materialised. For the bootstrap, whole historical days are
+    resampled, which keeps the cross-asset correlation of each day intact.
+    """
+    r = np.asarray(returns, dtype="float64")
+    n_assets = r.shape[1]
+    w = np.full(n_assets, 1.0 / n_assets) if weights is None else np.asarray(weights, dtype="float64")
+    w = w / w.sum()
+
+    log_r = np.log1p(r)
+    valid = ~np.isnan(log_r)
+    # Pairwise-complete covariance: instruments with gaps still contribute
+    filled = np.where(valid, log_r, 0.0)
+    counts = valid.astype("float64")
+    n_pair = counts.T @ counts
+    means = filled.sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    centered = np.where(valid, log_r - means, 0.0)
+    cov = (centered.T @ centered) / np.maximum(n_pair - 1, 1)
+
+    variance = max(float(w @ cov @ w), 0.0)
+    arithmetic = np.where(valid, r, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+
+    return {
+        "assets": n_assets,
+        "mean": float(w @ arithmetic),
+        "sigma": float(np.sqrt(variance)),
+        # Historical one-day portfolio log-returns for the bootstrap
+        "history": np.log1p(np.nan_to_num(r) @ w),
+    }
+
+
+def _simulate_chunk(args):
+    """Simulate one chunk of paths; returns (terminal P&L, max drawdown) per path."""
+    method, n_paths, horizon, mu, sigma, history, block, seed = args
+    rng = np.random.default_rng(seed)
+    if method == "gbm":
+        steps = rng.standard_normal((n_paths, horizon), dtype=np.float32)
+        steps *= np.float32(sigma)
+        steps += np.float32(mu)
+    else:
+        # Moving block bootstrap over historical days
+        n_blocks = -(-horizon // block)
+        starts = rng.integers(0, len(history) - block + 1, size=(n_paths, n_blocks))
+        idx = (starts[:, :, None] + np.arange(block)).reshape(n_paths, -1)[:, :horizon]
+        steps = history.astype(np.float32)[idx]
+
+    log_value = np.cumsum(steps, axis=1, out=steps)
+    terminal = np.expm1(log_value[:, -1])
+    running_peak = np.maximum.accumulate(np.maximum(log_value, 0.0), axis=1)
+    max_drawdown = np.expm1((log_value - running_peak).min(axis=1))
+    return terminal.astype(np.float32), max_drawdown.astype(np.float32)
+
+
+def simulate_portfolio(returns, weights=None, n_paths=MONTE_CARLO_PATHS, horizon=MONTE_CARLO_HORIZON,
+                       method="gbm", vol_multiplier=1.0, block=5, chunk_paths=MONTE_CARLO_CHUNK_PATHS,
+                       workers=None, seed=MONTE_CARLO_SEED):
+    """
+    Monte Carlo distribution of portfolio P&L and drawdown over `horizon` steps.
+
+    `method` is "gbm" (correlated lognormal, parameters estimated from the
+    history) or "bootstrap" (historical days resampled in blocks of `block`).
+    `vol_multiplier` > 1 gives a stressed GBM run. Paths are generated in
+    chunks of `chunk_paths` so memory stays flat, and chunks are spread over
+    `workers` processes (1 runs inline, as does any call from inside a worker
+    process). Each chunk gets its own child seed from `seed`, so results do
+    not depend on the worker count.
+    """
+    if method not in ("gbm", "bootstrap"):
+        raise ValueError(f"Unknown simulation method: {method}")
+    inputs = portfolio_inputs(returns, weights)
+    sigma = inputs["sigma"] * vol_multiplier
+    # Constant-mix log drift: w.E[r] - sigma_p^2 / 2 (w.E[log r] would drop the diversification benefit)
+    mu = inputs["mean"] - 0.5 * sigma * sigma
+    history = inputs["history"] if method == "bootstrap" else None
+    if history is not None and len(history) < block:
+        raise ValueError("Not enough history for the bootstrap")
+
+    sizes = [chunk_paths] * (n_paths // chunk_paths)
+    if n_paths % chunk_paths:
+        sizes.append(n_paths % chunk_paths)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [
+        (method, size, horizon, mu, sigma, history, block, child)
+        for size, child in zip(sizes, seeds)
+    ]
+
+    if multiprocessing.parent_process() is not None:
+        workers = 1
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        results = [_simulate_chunk(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_simulate_chunk, tasks))
+
+    pnl = np.concatenate([r[0] for r in results])
+    drawdown = np.concatenate([r[1] for r in results])
+    weighting = "equal weights" if weights is None else "given weights"
+    return summarize_simulation(pnl, drawdown, method, horizon, inputs["assets"], vol_multiplier, weighting)
+
+
+def summarize_simulation(pnl, drawdown, method, horizon, assets, vol_multiplier=1.0, weighting="equal weights"):
+    """Distribution summary of simulated P&L and drawdown (fractions of starting value)."""
+    pnl = np.sort(pnl.astype("float64"))
+    n = len(pnl)
+    out = {
+        "method": method,
+        "paths": n,
+        "horizon": horizon,
+        "assets": assets,
+        "vol_multiplier": vol_multiplier,
+        "weighting": weighting,
+        "mean_pnl": float(pnl.mean()),
+        "prob_loss": float((pnl < 0).mean()),
+        "pnl_percentiles": {p: float(np.percentile(pnl, p)) for p in _PERCENTILES},
+        "max_drawdown_percentiles": {p: float(np.percentile(drawdown, p)) for p in (1, 5, 50)},
+    }
+    for level in (95, 99):
+        k = max(int(n * (1 - level / 100)), 1)
+        out[f"var_{level}"] = float(-pnl[k - 1])
+        out[f"es_{level}"] = float(-pnl[:k].mean())
+    return out
+
+
+def simulation_to_text(results):
+    """Readable lines for the RiskAgent prompt and the report, one block per simulation run."""
+    lines = []
+    for r in results:
+        label = {"gbm": "Correlated GBM", "bootstrap": "Historical block bootstrap"}[r["method"]]
+        if r["vol_multiplier"] != 1.0:
+            label += f" (stressed, volatility x{r['vol_multiplier']:g})"
+        p = r["pnl_percentiles"]
+        dd = r["max_drawdown_percentiles"]
+        lines += [
+            f"{label}: {r['paths']:,} paths over {r['horizon']} trading days, {r['assets']} assets, {r['weighting']}",
+            f"- Expected P&L {r['mean_pnl']:.2%}, probability of loss {r['prob_loss']:.1%}",
+            f"- P&L percentiles: 1% {p[1]:.2%}, 5% {p[5]:.2%}, median {p[50]:.2%}, 95% {p[95]:.2%}, 99% {p[99]:.2%}",
+            f"- VaR 95% {r['var_95']:.2%}, VaR 99% {r['var_99']:.2%}, ES 95% {r['es_95']:.2%}, ES 99% {r['es_99']:.2%}",
+            f"- Max drawdown: median {dd[50]:.2%}, 5% worst {dd[5]:.2%}, 1% worst {dd[1]:.2%}",
+        ]
+    if results:
+        lines.append(
+            "Note: the portfolio is simulated as a single series, its daily log-return w.x at constant weights "
+            "(rebalanced daily); asset correlations enter only through the portfolio volatility, and individual "
+            "asset paths are not simulated."
+        )
+    return "\n".join(lines)
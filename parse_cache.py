@@ -0,0 +1,298 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from config import (
+    CSV_STREAM_THRESHOLD_BYTES,
+    EXCEL_COLUMNS,
+    EXCEL_ROW_LIMIT,
+    EXCEL_SHEETS,
+    NORMALIZE_CATEGORY_MAX_RATIO,
+    NORMALIZE_FLOAT32_ATOL,
+    NORMALIZE_MIN_PARSED,
+    NORMALIZE_SAMPLE_ROWS,
+    PARSE_CACHE_BYPASS,
+    PARSE_CACHE_DIR,
+    PARSE_CACHE_MAX_AGE_SECONDS,
+    PARSE_CACHE_MAX_BYTES,
+    PDF_BACKEND,
+    PDF_MAX_CHARS,
+)
+from excel_stream import SheetTables
+from table_store import read_metadata, read_table, table_metadata, write_table
+
+# Bump whenever load_file() starts producing different output for the same bytes
+PARSER_VERSION = "9"
+
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def file_digest(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """
+    Disk cache of load_file() results keyed on file content.
+
+    A (path, mtime, size) index avoids re-hashing unchanged files; the content
+    digest means a copied or renamed file still hits. Tables are stored as
+    uncompressed Arrow IPC files (one per sheet for workbooks) that are
+    memory-mapped on read, so a hit costs no parsing or copying and worker
+    processes share the pages; each file carries the source digest, row count,
+    dtypes and column statistics (see table_metadata()); tables with columns
+    Arrow cannot represent are pickled. Text is stored as UTF-8 and JSON
+    documents as JSON. Total size and entry age are bounded.
+    """
+
+    def __init__(self, root=PARSE_CACHE_DIR, max_bytes=PARSE_CACHE_MAX_BYTES, max_age=PARSE_CACHE_MAX_AGE_SECONDS,
+                 bypass=PARSE_CACHE_BYPASS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, digest TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, kind TEXT, filename TEXT, bytes INTEGER, created REAL, accessed REAL)"
+        )
+        self._conn.commit()
+
+    # ------------------------ Keys ------------------------
+
+    def digest(self, path):
+        """Content digest of `path`, re-hashing only when mtime or size changed."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns, size, digest FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+            return row[2]
+        digest = file_digest(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (path, st.st_mtime_ns, st.st_size, digest)
+            )
+            self._conn.commit()
+        return digest
+
+    def key(self, path):
+        ext = os.path.splitext(path)[1].lower()
+        # Settings that change what load_file() returns for the same bytes
+        options = []
+        if ext in (".xls", ".xlsx"):
+            # Sheet/column/row selection
+            options += [EXCEL_SHEETS, EXCEL_COLUMNS, EXCEL_ROW_LIMIT]
+        elif ext == ".pdf":
+            # Extraction backend and the cut-off for long documents
+            options += [PDF_BACKEND, PDF_MAX_CHARS]
+        elif ext == ".csv":
+            # Decides between a loaded table and a chunked CsvProfile
+            options += [CSV_STREAM_THRESHOLD_BYTES]
+        if ext in (".csv", ".xls", ".xlsx"):
+            # Tables are cached normalized: the inferred types depend on these
+            options += [NORMALIZE_MIN_PARSED, NORMALIZE_SAMPLE_ROWS, NORMALIZE_FLOAT32_ATOL, NORMALIZE_CATEGORY_MAX_RATIO]
+        options = json.dumps(options, default=str) if options else ""
+        return hashlib.sha256(f"{self.digest(path)}|{ext}|{PARSER_VERSION}|{options}".encode()).hexdigest()
+
+    # ------------------------ Storage ------------------------
+
+    def get(self, path):
+        """Cached parse result for `path`, or None (always None when bypassed)."""
+        if self.bypass:
+            return None
+        return self._get(self.key(path))
+
+    def put(self, path, value):
+        if self.bypass:
+            return
+        self._put(self.key(path), value, {"source_digest": self.digest(path), "source_path": os.path.abspath(path)})
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT kind, filename, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[2] > self.max_age:
+            self.misses += 1
+            return None
+        try:
+            value = self._read(row[0], os.path.join(self.root, "objects", row[1]))
+        except (OSError, ValueError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        with self._lock:
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        self.hits += 1
+        return value
+
+    def _put(self, key, value, source):
+        kind, filename = self._write(key, value, source)
+        full = os.path.join(self.root, "objects", filename)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, filename, _size(full), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _write(self, key, value, source):
+        objects = os.path.join(self.root, "objects")
+        if isinstance(value, pd.DataFrame):
+            try:
+                filename, kind = f"{key}.arrow", "arrow"
+                write_table(value, os.path.join(objects, filename), self._table_metadata(value, source))
+                return kind, filename
+            except Exception:
+                # Column types Arrow cannot represent, e.g. mixed Python objects
+                filename, kind = f"{key}.pkl", "pickle"
+                tmp = os.path.join(objects, filename + ".tmp")
+                value.to_pickle(tmp)
+        elif isinstance(value, SheetTables):
+            # One Arrow file per sheet in a directory, renamed into place whole
+            filename, kind = f"{key}.sheets", "sheets"
+            tmp = os.path.join(objects, filename + ".tmp")
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            try:
+                for i, (name, df) in enumerate(value.items()):
+                    write_table(df, os.path.join(tmp, f"{i:04d}.arrow"), self._table_metadata(df, source, sheet=name))
+            except Exception:
+                shutil.rmtree(tmp, ignore_errors=True)
+                filename, kind = f"{key}.pkl", "pickle"
+                tmp = os.path.join(objects, filename + ".tmp")
+                with open(tmp, "wb") as f:
+                    pickle.dump(value, f)
+            else:
+                _remove(os.path.join(objects, filename))
+        elif isinstance(value, str):
+            filename, kind = f"{key}.txt", "text"
+            tmp = os.path.join(self.root, "objects", filename + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(value)
+        elif type(value) in (dict, list):
+            filename, kind = f"{key}.json", "json"
+            tmp = os.path.join(self.root, "objects", filename + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+        else:
+            # e.g. a CsvProfile from streaming ingestion
+            filename, kind = f"{key}.pkl", "pickle"
+            tmp = os.path.join(self.root, "objects", filename + ".tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f)
+        os.replace(tmp, os.path.join(objects, filename))
+        return kind, filename
+
+    @staticmethod
+    def _table_metadata(df, source, **extra):
+        return table_metadata(df, source["source_digest"], source_path=source["source_path"],
+                              parser_version=PARSER_VERSION, **extra)
+
+    def _read(self, kind, full):
+        if kind == "arrow":
+            return read_table(full)
+        if kind == "sheets":
+            return SheetTables(
+                (read_metadata(os.path.join(full, name))["sheet"], read_table(os.path.join(full, name)))
+                for name in sorted(os.listdir(full))
+            )
+        if kind == "pickle":
+            return pd.read_pickle(full)
+        with open(full, "r", encoding="utf-8") as f:
+            return f.read() if kind == "text" else json.load(f)
+
+    def _evict(self, now):
+        rows = self._conn.execute("SELECT key, filename, bytes, created FROM entries ORDER BY accessed").fetchall()
+        total = sum(r[2] for r in rows)
+        for key, filename, size, created in rows:
+            if total <= self.max_bytes and now - created <= self.max_age:
+                continue
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            _remove(os.path.join(self.root, "objects", filename))
+            total -= size
+
+    def clear(self):
+        """Drop every entry and its files."""
+        with self._lock:
+            for (filename,) in self._conn.execute("SELECT filename FROM entries").fetchall():
+                _remove(os.path.join(self.root, "objects", filename))
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def table_metadata(self, path):
+        """
+        Stored metadata (source digest, rows, dtypes, column statistics) of the
+        cached table(s) for `path`, read without loading any column data; a
+        dict per sheet for workbooks. None when `path` has no cached table.
+        """
+        if self.bypass:
+            return None
+        key = self.key(path)
+        with self._lock:
+            row = self._conn.execute("SELECT kind, filename FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] not in ("arrow", "sheets"):
+            return None
+        full = os.path.join(self.root, "objects", row[1])
+        try:
+            if row[0] == "arrow":
+                return read_metadata(full)
+            sheets = (read_metadata(os.path.join(full, name)) for name in sorted(os.listdir(full)))
+            return {meta["sheet"]: meta for meta in sheets}
+        except (OSError, ValueError):
+            return None
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size, "bypass": self.bypass}
+
+
+_default_cache = None
+_default_pid = None
+_default_lock = threading.Lock()
+
+
+def get_parse_cache():
+    """Per-process cache instance; forked workers open their own SQLite connection."""
+    global _default_cache, _default_pid
+    with _default_lock:
+        if _default_cache is None or _default_pid != os.getpid():
+            _default_cache = ParseCache()
+            _default_pid = os.getpid()
+        return _default_cache
@@ -0,0 +1,175 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from config import PDF_PAGE_CACHE_DIR, PDF_PAGE_CACHE_MAX_BYTES, PDF_PARALLEL_MIN_PAGES, PDF_WORKERS
+from parse_cache import get_parse_cache
+
+BACKENDS = ("pypdf2", "pdfplumber")
+
+
+# ------------------------ Backends ------------------------
+
+def _extract_range(path, backend, start, stop):
+    """Text of pages [start, stop) with one open of the file. Top-level so workers can run it."""
+    if backend == "pdfplumber":
+        import pdfplumber
+
+        texts = []
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages[start:stop]:
+                texts.append(page.extract_text() or "")
+                page.close()  # drop the page's parsed objects right away
+        return texts
+
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def page_count(path):
+    from PyPDF2 import PdfReader
+
+    return len(PdfReader(path).pages)
+
+
+def choose_backend(path):
+    """
+    Pick a backend for this document from its first page.
+
+    PyPDF2 is several times faster, so it wins unless it gets noticeably
+    less text out of the page than pdfplumber does (complex layouts, odd
+    encodings).
+    """
+    fast = _extract_range(path, "pypdf2", 0, 1)[0]
+    if len(fast.strip()) >= 200:
+        return "pypdf2"
+    try:
+        slow = _extract_range(path, "pdfplumber", 0, 1)[0]
+    except ImportError:
+        return "pypdf2"
+    return "pdfplumber" if len(slow.strip()) > 1.2 * len(fast.strip()) + 20 else "pypdf2"
+
+
+# ------------------------ Page cache ------------------------
+
+def _cache_path(digest, backend):
+    return os.path.join(PDF_PAGE_CACHE_DIR, f"{digest}-{backend}.json")
+
+
+def _load_pages(digest, backend):
+    try:
+        with open(_cache_path(digest, backend), "r", encoding="utf-8") as f:
+            return {int(k): v for k, v in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_pages(digest, backend, pages):
+    os.makedirs(PDF_PAGE_CACHE_DIR, exist_ok=True)
+    path = _cache_path(digest, backend)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(pages, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    _evict_pages()
+
+
+def _evict_pages():
+    """Drop least recently written documents once the page cache is over budget."""
+    entries = []
+    for name in os.listdir(PDF_PAGE_CACHE_DIR):
+        full = os.path.join(PDF_PAGE_CACHE_DIR, name)
+        if name.endswith(".json"):
+            st = os.stat(full)
+            entries.append((st.st_mtime, st.st_size, full))
+    total = sum(e[1] for e in entries)
+    for _, size, full in sorted(entries):
+        if total <= PDF_PAGE_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(full)
+        except OSError:
+            pass
+        total -= size
+
+
+# ------------------------ Extraction ------------------------
+
+def extract_pdf_pages(path, backend="auto", workers=PDF_WORKERS, max_chars=None, use_cache=True):
+    """
+    Extract page texts from a PDF.
+
+    Pages are split into contiguous ranges across a process pool (serially for
+    short documents, or when already running inside a worker process). With
+    `max_chars`, pages are pulled in order, one window at a time, and
+    extraction stops once enough text has been collected. Extracted pages are
+    cached per document digest and backend, so lazy runs can be extended later
+    without redoing earlier pages.
+    """
+    if backend == "auto":
+        backend = choose_backend(path)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend}")
+
+    use_cache = use_cache and not get_parse_cache().bypass
+    digest = get_parse_cache().digest(path) if use_cache else None
+    cached = _load_pages(digest, backend) if use_cache else {}
+    n_pages = page_count(path)
+    if n_pages == 0:
+        return []
+
+    if multiprocessing.parent_process() is not None:
+        workers = 1
+    workers = max(1, min(workers or os.cpu_count() or 1, n_pages))
+    if n_pages < PDF_PARALLEL_MIN_PAGES:
+        workers = 1
+
+    pages = []
+    collected = 0
+    extracted = False
+    window = workers * max(1, PDF_PARALLEL_MIN_PAGES // 2)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for start in range(0, n_pages, window if max_chars else n_pages):
+            stop = min(start + (window if max_chars else n_pages), n_pages)
+            missing = [i for i in range(start, stop) if i not in cached]
+            if missing:
+                lo, hi = missing[0], missing[-1] + 1
+                for i, text in zip(range(lo, hi), _run_ranges(pool, path, backend, lo, hi, workers)):
+                    cached[i] = text
+                extracted = True
+            for i in range(start, stop):
+                pages.append(cached[i])
+                collected += len(cached[i])
+            if max_chars and collected >= max_chars:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if use_cache and extracted:
+        _save_pages(digest, backend, cached)
+    return pages
+
+
+def _run_ranges(pool, path, backend, start, stop, workers):
+    if pool is None:
+        return _extract_range(path, backend, start, stop)
+    step = -(-(stop - start) // workers)
+    futures = [
+        pool.submit(_extract_range, path, backend, lo, min(lo + step, stop))
+        for lo in range(start, stop, step)
+    ]
+    texts = []
+    for future in futures:
+        texts.extend(future.result())
+    return texts
+
+
+def extract_pdf_text(path, backend="auto", workers=PDF_WORKERS, max_chars=None, use_cache=True):
+    """Whole-document text (or at least `max_chars` of it, in lazy mode)."""
+    pages = extract_pdf_pages(path, backend=backend, workers=workers, max_chars=max_chars, use_cache=use_cache)
+    return "\n".join(pages).strip()
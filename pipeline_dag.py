@@ -0,0 +1,380 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+from config import PIPELINE_CACHE_DIR, PIPELINE_CACHE_MAX_AGE_SECONDS, PIPELINE_CACHE_MAX_BYTES
+from instrumentation import count_cache
+from parse_cache import ParseCache, file_digest
+
+
+def _hash(*parts):
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+def content_digest(value):
+    """Digest of a text or JSON-like output, for nodes whose output is worth comparing (see Node)."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _prefix_digest(path, size, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while size > 0:
+            block = f.read(min(block_size, size))
+            if not block:
+                break
+            h.update(block)
+            size -= len(block)
+    return h.hexdigest()
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class Appended:
+    """The source is its last-run version plus bytes from `offset` on."""
+
+    def __init__(self, offset, previous_digest):
+        self.offset = offset
+        self.previous_digest = previous_digest
+
+
+class StageStore(ParseCache):
+    """
+    Outputs of the stage graph, keyed on each node's inputs.
+
+    Values are stored in the parse cache's formats (Arrow tables, text, JSON,
+    pickles) under the same size and age limits. Next to each output the store
+    keeps the digest its dependents are keyed on, and for every source file
+    the version last run and the key each node had then, which is how a later
+    run recognises appended rows and finds the results to extend.
+    """
+
+    def __init__(self, root=PIPELINE_CACHE_DIR, max_bytes=PIPELINE_CACHE_MAX_BYTES,
+                 max_age=PIPELINE_CACHE_MAX_AGE_SECONDS):
+        super().__init__(root, max_bytes, max_age, bypass=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS outputs (key TEXT PRIMARY KEY, node TEXT, digest TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lineage (path TEXT, node TEXT, key TEXT, signature TEXT,"
+            " PRIMARY KEY (path, node))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, digest TEXT, size INTEGER, ends_newline INTEGER)"
+        )
+        self._conn.commit()
+
+    def lookup(self, key):
+        """Digest of the live output stored under `key`, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT o.digest, e.created FROM outputs o JOIN entries e ON e.key = o.key WHERE o.key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.max_age:
+            return None
+        return row[0]
+
+    def load(self, key):
+        return self._get(key)
+
+    def save(self, key, node, value, digest, source):
+        self._put(key, value, source)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)", (key, node, digest))
+            self._conn.commit()
+
+    def _evict(self, now):
+        super()._evict(now)
+        self._conn.execute("DELETE FROM outputs WHERE key NOT IN (SELECT key FROM entries)")
+
+    def clear(self):
+        """Drop every output and what is known about earlier runs."""
+        super().clear()
+        with self._lock:
+            for table in ("outputs", "lineage", "sources"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.commit()
+
+    # ------------------------ Lineage ------------------------
+
+    def previous_key(self, path, node, signature):
+        """Key `node` had in the last run of `path`, if its version and settings are unchanged since."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, signature FROM lineage WHERE path = ? AND node = ?", (path, node)
+            ).fetchone()
+        return row[0] if row and row[1] == signature else None
+
+    def source_version(self, path):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT digest, size, ends_newline FROM sources WHERE path = ?", (path,)
+            ).fetchone()
+
+    def record(self, path, digest, keys, signatures):
+        """Remember the version of `path` just run and the key of each node it reached."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                (path, digest, os.path.getsize(path), int(_ends_with_newline(path))),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO lineage VALUES (?, ?, ?, ?)",
+                [(path, node, key, signatures[node]) for node, key in keys.items()],
+            )
+            self._conn.commit()
+
+    def find_append(self, path, digest):
+        """Appended when `path` (now at `digest`) is the version last run with data added at the end."""
+        row = self.source_version(path)
+        if row is None or row[0] == digest:
+            return None
+        previous_digest, size, ends_newline = row
+        # Appended rows start on a new line; anything else is an edit
+        if not ends_newline or os.path.getsize(path) <= size:
+            return None
+        if _prefix_digest(path, size) != previous_digest:
+            return None
+        return Appended(size, previous_digest)
+
+
+class Node:
+    """
+    One stage of a StageGraph: `fn(run, *inputs)`, plain or async, gets the
+    outputs of `deps` ("source" is the input file's path).
+
+    The node's key hashes its name, `version`, `params(run)` (settings the
+    output depends on) and the digests of its inputs. With `store` the output
+    is kept under that key; otherwise the node is recomputed whenever a
+    dependent needs it. Dependents see `digest(value)`, by default the key
+    itself, which suits deterministic nodes. Nodes that can give the same
+    output for different inputs use content_digest(), so an unchanged result
+    stops recomputation from spreading further down.
+
+    `incremental` nodes may extend their output from the last run of the same
+    file when rows were appended (see Run.previous()).
+    """
+
+    def __init__(self, name, deps, fn, version="1", params=None, store=True, digest=None, incremental=False):
+        self.name = name
+        self.deps = tuple(deps)
+        self.fn = fn
+        self.version = version
+        self.params = params
+        self.store = store
+        self.digest = digest
+        self.incremental = incremental
+
+    def signature(self, run):
+        return _hash(self.name, self.version, self.params(run) if self.params else None)
+
+
+class StageGraph:
+    """Named nodes in dependency order; start() begins one evaluation for a file."""
+
+    def __init__(self, nodes):
+        self.nodes = {}
+        for node in nodes:
+            missing = [d for d in node.deps if d != "source" and d not in self.nodes]
+            if missing:
+                raise ValueError(f"{node.name} depends on unknown or later nodes: {missing}")
+            self.nodes[node.name] = node
+
+    def start(self, path, store=None, **context):
+        return Run(self, path, store, context)
+
+
+class Run:
+    """
+    One evaluation of a StageGraph for one source file.
+
+    resolve(name) works out the node's key from its inputs' digests and only
+    computes it when the store has nothing under that key; get(name) returns
+    its output, loading or computing it on first use. Independent nodes run
+    concurrently. `status` records per node whether it was "cached",
+    "computed" or "incremental" (extended from the previous run's output).
+    Without a store every node is computed.
+    """
+
+    def __init__(self, graph, path, store, context):
+        self.graph = graph
+        self.path = os.path.abspath(path)
+        self.store = store
+        self.context = context
+        self.keys = {}
+        self.status = {}
+        self.seconds = {}
+        self.failed = None
+        self.appended = None
+        self._source_digest = None
+        self._digests = {}
+        self._values = {}
+        self._resolving = {}
+        self._loading = {}
+        self._reused = set()
+        self._lock = threading.Lock()
+
+    # ------------------------ Keys ------------------------
+
+    def _source(self):
+        if self._source_digest is None:
+            self._source_digest = self.store.digest(self.path) if self.store else file_digest(self.path)
+            if self.store is not None:
+                self.appended = self.store.find_append(self.path, self._source_digest)
+                if self.appended is not None and not self._previous_available():
+                    self.appended = None
+        return self._source_digest
+
+    def _previous_available(self):
+        return all(
+            self._previous_key(node) is not None
+            for node in self.graph.nodes.values() if node.incremental
+        )
+
+    def _previous_key(self, node):
+        key = self.store.previous_key(self.path, node.name, node.signature(self))
+        return key if key is not None and self.store.lookup(key) is not None else None
+
+    async def resolve(self, name):
+        """Digest of node `name`'s output, computing only what changed."""
+        if name not in self._resolving:
+            work = asyncio.to_thread(self._source) if name == "source" else self._resolve(name)
+            self._resolving[name] = asyncio.ensure_future(work)
+        return await self._resolving[name]
+
+    async def _resolve(self, name):
+        node = self.graph.nodes[name]
+        digests = await asyncio.gather(*(self.resolve(d) for d in node.deps), return_exceptions=True)
+        # A failed dependency is raised only once the others have settled (and been stored)
+        for digest in digests:
+            if isinstance(digest, BaseException):
+                raise digest
+        key = _hash(name, node.signature(self), digests)
+        self.keys[name] = key
+        if not node.store:
+            return key
+        if self.store is not None:
+            digest = self.store.lookup(key)
+            count_cache("stage", digest is not None)
+            if digest is not None:
+                self.status[name] = "cached"
+                return digest
+        value = await self._compute(node)
+        digest = node.digest(value) if node.digest else key
+        if self.store is not None:
+            await asyncio.to_thread(
+                self.store.save, key, name, value, digest,
+                {"source_digest": self._source_digest, "source_path": self.path},
+            )
+        self._values[name] = value
+        return digest
+
+    # ------------------------ Values ------------------------
+
+    async def get(self, name):
+        """Output of node `name`."""
+        if name == "source":
+            return self.path
+        if name not in self._loading:
+            self._loading[name] = asyncio.ensure_future(self._get(name))
+        return await self._loading[name]
+
+    async def _get(self, name):
+        await self.resolve(name)
+        if name in self._values:
+            return self._values[name]
+        node = self.graph.nodes[name]
+        if node.store and self.store is not None:
+            value = await asyncio.to_thread(self.store.load, self.keys[name])
+            if value is not None:
+                self._values[name] = value
+                return value
+        # Transient node, or the stored output vanished between lookup and load
+        value = self._values[name] = await self._compute(node)
+        return value
+
+    async def _compute(self, node):
+        inputs = await asyncio.gather(*(self.get(d) for d in node.deps))
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(node.fn):
+                value = await node.fn(self, *inputs)
+            else:
+                value = await asyncio.to_thread(node.fn, self, *inputs)
+        except Exception:
+            if self.failed is None:
+                self.failed = node.name
+            raise
+        self.seconds[node.name] = round(time.perf_counter() - started, 3)
+        self.status[node.name] = "incremental" if node.name in self._reused else "computed"
+        return value
+
+    def previous(self, name):
+        """
+        Output `name` had in the last run of this file, when this run's source
+        is that version with rows appended; None otherwise. Only for nodes
+        declared `incremental`.
+        """
+        node = self.graph.nodes[name]
+        if self.appended is None or not node.incremental:
+            return None
+        key = self._previous_key(node)
+        value = self.store.load(key) if key is not None else None
+        if value is not None:
+            with self._lock:
+                self._reused.add(name)
+        return value
+
+    def has(self, name):
+        return name in self._values or self.status.get(name) == "cached"
+
+    def finish(self):
+        """
+        Record this version of the file and the keys of the outputs stored for
+        it, for the next run's append check. Skipped unless every incremental
+        node got that far: the next run must extend this version, not an older one.
+        """
+        if self.store is None or self._source_digest is None:
+            return
+        stored = {name: self.keys[name] for name in self.status if self.graph.nodes[name].store}
+        if any(node.incremental and node.name not in stored for node in self.graph.nodes.values()):
+            return
+        signatures = {name: self.graph.nodes[name].signature(self) for name in stored}
+        self.store.record(self.path, self._source_digest, stored, signatures)
+
+    def stats(self):
+        return {name: {"status": self.status[name], "seconds": self.seconds.get(name)} for name in self.status}
+
+
+_default_store = None
+_default_pid = None
+_default_lock = threading.Lock()
+
+
+def get_stage_store():
+    """Per-process store, like get_parse_cache()."""
+    global _default_store, _default_pid
+    with _default_lock:
+        if _default_store is None or _default_pid != os.getpid():
+            _default_store = StageStore()
+            _default_pid = os.getpid()
+        return _default_store
+
+
+def set_stage_store(store=None):
+    """Swap in a store elsewhere than PIPELINE_CACHE_DIR (None = the default again on next use)."""
+    global _default_store, _default_pid
+    with _default_lock:
+        _default_store = store
+        _default_pid = os.getpid() if store is not None else None
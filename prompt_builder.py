@@ -0,0 +1,157 @@
+import re
+from functools import lru_cache
+
+from config import AZURE_OPENAI_DEPLOYMENT
+
+_NUMBER = re.compile(r"[$€£¥]?\(?-?\d[\d,]*(?:\.\d+)?\)?\s?(?:%|bn|mn|m|k|million|billion)?", re.IGNORECASE)
+_NUMBERED_HEADING = re.compile(r"^(?:\d+(?:\.\d+)*|[IVX]+|item\s+\d+[a-z]?|section\s+\d+|note\s+\d+)[.):]?\s+\S", re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def _encoder(model):
+    """tiktoken encoder for the deployment, or None when tiktoken (or its BPE files) are unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Offline and no cached BPE file
+        return None
+
+
+def count_tokens(text, model=AZURE_OPENAI_DEPLOYMENT):
+    """Token count for `model`; falls back to ~4 characters per token without tiktoken."""
+    if not text:
+        return 0
+    enc = _encoder(model)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _cut_line(line, max_tokens, model):
+    """Prefix of one line within `max_tokens`, cut at a token boundary."""
+    enc = _encoder(model)
+    if enc is None:
+        return line[:max_tokens * 4]
+    # A multi-byte character split across tokens decodes to U+FFFD; drop it
+    return enc.decode(enc.encode(line, disallowed_special=())[:max_tokens]).rstrip("\ufffd")
+
+
+def truncate_to_tokens(text, max_tokens, model=AZURE_OPENAI_DEPLOYMENT):
+    """
+    Longest prefix of `text` ending on a line boundary that fits in
+    `max_tokens`. When whole lines would fill less than half the budget (a
+    long single-paragraph answer, say), the line that does not fit is cut
+    inside instead, at a token boundary.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    kept = []
+    used = 0
+    for line in text.splitlines():
+        cost = count_tokens(line + "\n", model)
+        if used + cost > max_tokens:
+            if used < max_tokens / 2:
+                kept.append(_cut_line(line, max_tokens - used - 1, model))
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+
+def _is_heading(line):
+    if len(line) > 90 or line.endswith((".", ",", ";")):
+        return False
+    if _NUMBERED_HEADING.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) < 3:
+        return False
+    words = line.split()
+    return line.isupper() or (len(words) <= 10 and sum(w[:1].isupper() for w in words) >= 0.7 * len(words))
+
+
+def document_digest(text, max_tokens, model=AZURE_OPENAI_DEPLOYMENT):
+    """
+    Most informative lines of a long document, in original order, under `max_tokens`.
+
+    Repeated lines (page headers and footers) are dropped first. If the rest
+    still does not fit, section headings and lines carrying figures are kept
+    ahead of plain prose, so key numbers from late pages are not lost the way
+    they are with a fixed-length prefix.
+    """
+    seen = set()
+    lines = []
+    for raw in text.splitlines():
+        line = raw.strip()
+        if line and line not in seen:
+            seen.add(line)
+            lines.append(line)
+
+    full = "\n".join(lines)
+    if count_tokens(full, model) <= max_tokens:
+        return full
+
+    scored = []
+    for pos, line in enumerate(lines):
+        figures = len(_NUMBER.findall(line))
+        if _is_heading(line):
+            score = 3.0
+        elif figures:
+            score = 2.0 + min(figures, 5) * 0.2
+        else:
+            score = 0.0
+        # Earlier text breaks ties: introductions usually summarise the document
+        scored.append((-score, pos, line))
+    scored.sort()
+
+    if not any(count_tokens(line + "\n", model) <= max_tokens for line in lines):
+        # One line longer than the whole budget (e.g. text without line breaks)
+        return truncate_to_tokens(full, max_tokens, model)
+
+    chosen = []
+    used = 0
+    for _, pos, line in scored:
+        cost = count_tokens(line + "\n", model)
+        if used + cost > max_tokens:
+            continue
+        chosen.append((pos, line))
+        used += cost
+        if used >= max_tokens:
+            break
+    return "\n".join(line for _, line in sorted(chosen))
+
+
+def build_prompt(instruction, parts, max_tokens, model=AZURE_OPENAI_DEPLOYMENT):
+    """
+    Assemble `instruction` plus labelled `parts` under a token budget.
+
+    `parts` is a list of (label, text) in priority order; a label of None
+    inlines the text directly. Parts that do not fit are cut at a line
+    boundary (see truncate_to_tokens()); a part that does not fit at all is
+    skipped and later ones still get the room left. Returns
+    (prompt, token_count).
+    """
+    prompt = instruction
+    used = count_tokens(prompt, model)
+    for label, text in parts:
+        if not text:
+            continue
+        header = f"\n{label}:\n" if label else "\n"
+        room = max_tokens - used - count_tokens(header, model)
+        if room <= 0:
+            break
+        body = truncate_to_tokens(str(text), room, model)
+        if not body:
+            # A shorter part further down may still fit
+            continue
+        prompt += header + body
+        used = count_tokens(prompt, model)
+    return prompt, used
@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+from agent_registry import PooledAzureOpenAI, set_model_factory
+from config import (
+    AZURE_OPENAI_API_KEY,
+    AZURE_OPENAI_DEPLOYMENT,
+    AZURE_OPENAI_ENDPOINT,
+    LLM_REPLAY_LATENCY_SCALE,
+    LLM_REPLAY_MODE,
+    LLM_REPLAY_PATH,
+)
+from fake_model import Reply, _AsyncCompletions, _SyncCompletions, fake_completion_text, prompt_text
+from llm_scheduler import LocalClient
+from prompt_builder import count_tokens
+
+MODES = ("record", "replay", "strict")
+
+# Request arguments that change how the answer is delivered, not what it says
+_TRANSPORT_PARAMS = {"stream", "stream_options", "timeout", "extra_headers", "extra_query", "extra_body"}
+
+
+class ReplayMissError(LookupError):
+    """Strict replay was asked for a request that was never recorded."""
+
+
+def request_key(model_id, messages, params=None):
+    """Content hash of a chat request: deployment, messages and sampling parameters."""
+    params = {k: v for k, v in (params or {}).items() if k not in _TRANSPORT_PARAMS and v is not None}
+    payload = json.dumps([model_id, list(messages), params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _pack(obj):
+    return zlib.compress(json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class Cassette:
+    """
+    Recorded request/response pairs in one SQLite file, indexed by request_key().
+
+    Requests and responses are stored zlib-compressed JSON; each row also keeps
+    the time to first token and the total duration seen while recording, so a
+    replay can reproduce the service's pacing.
+    """
+
+    def __init__(self, path=LLM_REPLAY_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS exchanges ("
+            " key TEXT PRIMARY KEY, model TEXT, request BLOB, response BLOB,"
+            " first_token_seconds REAL, total_seconds REAL, created REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Reply fields for `key` as a dict, or None when it was never recorded."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, first_token_seconds, total_seconds FROM exchanges WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        response = _unpack(row[0])
+        response["first_token_seconds"] = row[1]
+        response["total_seconds"] = row[2]
+        return response
+
+    def put(self, key, model_id, request, response, first_token_seconds, total_seconds):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO exchanges VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model_id, _pack(request), _pack(response), first_token_seconds, total_seconds, time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(request) + LENGTH(response)), 0) FROM exchanges"
+            ).fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path=LLM_REPLAY_PATH):
+    """One open Cassette per file and process, shared by every model using it."""
+    path = os.path.abspath(path)
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = _cassettes[path] = Cassette(path)
+        return cassette
+
+
+# ------------------------ Recording ------------------------
+
+class _Recorder:
+    """Accumulates one live response (streamed or not) and stores it when complete."""
+
+    def __init__(self, cassette, model_id, messages, params):
+        self.cassette = cassette
+        self.model_id = model_id
+        self.request = {"messages": list(messages), "params": {k: v for k, v in params.items() if k not in _TRANSPORT_PARAMS}}
+        self.key = request_key(model_id, messages, params)
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.parts = []
+        self.usage = None
+
+    def feed(self, chunk):
+        for choice in chunk.choices or ():
+            if choice.delta and choice.delta.content:
+                if self.first_token is None:
+                    self.first_token = time.perf_counter() - self.started
+                self.parts.append(choice.delta.content)
+        if chunk.usage is not None:
+            self.usage = chunk.usage
+        return chunk
+
+    def finish(self, completion=None):
+        total = time.perf_counter() - self.started
+        if completion is not None:
+            self.parts = [completion.choices[0].message.content or ""] if completion.choices else []
+            self.usage = completion.usage
+        text = "".join(self.parts)
+        prompt = prompt_text(self.request["messages"])
+        response = {
+            "text": text,
+            "prompt_tokens": self.usage.prompt_tokens if self.usage else count_tokens(prompt),
+            "completion_tokens": self.usage.completion_tokens if self.usage else count_tokens(text),
+        }
+        first = self.first_token if self.first_token is not None else total
+        self.cassette.put(self.key, self.model_id, self.request, response, round(first, 4), round(total, 4))
+
+
+class _RecordingSync:
+    def __init__(self, completions, cassette):
+        self._completions = completions
+        self._cassette = cassette
+
+    def create(self, model=None, messages=(), stream=False, **params):
+        recorder = _Recorder(self._cassette, model, messages, params)
+        response = self._completions.create(model=model, messages=messages, stream=stream, **params)
+        if not stream:
+            recorder.finish(response)
+            return response
+
+        def iterate():
+            for chunk in response:
+                yield recorder.feed(chunk)
+            recorder.finish()
+        return iterate()
+
+
+class _RecordingAsync:
+    def __init__(self, completions, cassette):
+        self._completions = completions
+        self._cassette = cassette
+
+    async def create(self, model=None, messages=(), stream=False, **params):
+        recorder = _Recorder(self._cassette, model, messages, params)
+        response = await self._completions.create(model=model, messages=messages, stream=stream, **params)
+        if not stream:
+            recorder.finish(response)
+            return response
+
+        async def iterate():
+            async for chunk in response:
+                yield recorder.feed(chunk)
+            recorder.finish()
+        return iterate()
+
+
+# ------------------------ Model ------------------------
+
+@dataclass
+class RecordReplayModel(PooledAzureOpenAI):
+    """
+    The pooled Azure model with a cassette in front of it.
+
+    - record: calls Azure as usual and stores every completed exchange.
+    - replay: answers from the cassette without any network access; requests
+      that were never recorded get deterministic fake_model text instead.
+    - strict: like replay, but an unrecorded request raises ReplayMissError.
+
+    `latency_scale` paces replies at that multiple of the recorded timing
+    (0 = as fast as possible, 1 = as recorded).
+    """
+
+    mode: str = "replay"
+    cassette_path: str = LLM_REPLAY_PATH
+    latency_scale: float = LLM_REPLAY_LATENCY_SCALE
+    chunk_tokens: int = 4
+
+    def __post_init__(self):
+        super().__post_init__()
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown replay mode: {self.mode!r} (expected one of {', '.join(MODES)})")
+
+    @property
+    def cache_namespace(self):
+        # Replayed and generated answers stay out of the real deployment's
+        # LLM cache and stage store; record mode gets real answers and shares them
+        return None if self.mode == "record" else f"replay:{self.cassette_path}"
+
+    @property
+    def cassette(self):
+        return get_cassette(self.cassette_path)
+
+    def respond(self, messages, params=None):
+        response = self.cassette.get(request_key(self.id, messages, params))
+        if response is None:
+            if self.mode == "strict":
+                raise ReplayMissError(f"No recorded response for this {self.id} request in {self.cassette_path}")
+            prompt = prompt_text(messages)
+            text = fake_completion_text(prompt, 300)
+            return Reply(text, count_tokens(prompt), count_tokens(text), 0.0, 0.0)
+        scale = self.latency_scale
+        return Reply(
+            response["text"],
+            response["prompt_tokens"],
+            response["completion_tokens"],
+            response["first_token_seconds"] * scale,
+            response["total_seconds"] * scale,
+        )
+
+    def get_client(self):
+        if self.mode == "record":
+            return LocalClient(_RecordingSync(super().get_client().chat.completions, self.cassette))
+        return LocalClient(_SyncCompletions(self.id, self.respond, self.chunk_tokens))
+
+    def get_async_client(self):
+        if self.mode == "record":
+            return LocalClient(_RecordingAsync(super().get_async_client().chat.completions, self.cassette))
+        return LocalClient(_AsyncCompletions(self.id, self.respond, self.chunk_tokens))
+
+
+def enable_replay(mode=LLM_REPLAY_MODE, path=LLM_REPLAY_PATH, latency_scale=LLM_REPLAY_LATENCY_SCALE):
+    """
+    Route every registry agent through a RecordReplayModel in `mode`
+    (None restores the plain Azure model).
+    """
+    if not mode:
+        set_model_factory(None)
+        return
+    if mode not in MODES:
+        raise ValueError(f"Unknown replay mode: {mode!r} (expected one of {', '.join(MODES)})")
+    set_model_factory(lambda: RecordReplayModel(
+        id=AZURE_OPENAI_DEPLOYMENT,
+        api_key=AZURE_OPENAI_API_KEY,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        mode=mode,
+        cassette_path=path,
+        latency_scale=latency_scale,
+    ))
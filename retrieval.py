@@ -0,0 +1,409 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import zlib
+from os import getenv
+
+import numpy as np
+
+from config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_DIM,
+    LLM_SCHEDULER_ENABLED,
+    PROMPT_TOKEN_BUDGETS,
+    RETRIEVAL_ANN_MIN_CHUNKS,
+    RETRIEVAL_ANN_PROBES,
+    RETRIEVAL_CHUNK_OVERLAP,
+    RETRIEVAL_CHUNK_TOKENS,
+    RETRIEVAL_ENABLED,
+    RETRIEVAL_EXCERPT_TOKENS,
+    RETRIEVAL_INDEX_DIR,
+    RETRIEVAL_INDEX_MAX_AGE_SECONDS,
+    RETRIEVAL_INDEX_MAX_BYTES,
+    RETRIEVAL_QUERIES,
+    RETRIEVAL_TOP_K,
+    TEXT_EMBEDDING_MODEL,
+)
+from instrumentation import stage
+from prompt_builder import count_tokens
+
+# Bump whenever chunking or the stored layout changes
+INDEX_FORMAT_VERSION = 1
+# Chunks scoring below this share of the best match are left out even when there is room
+MIN_RELATIVE_SCORE = 0.5
+
+_WORD = re.compile(r"[a-z][a-z'&-]*|\d+(?:[.,]\d+)*%?")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which will with".split()
+)
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+# ------------------------ Embedders ------------------------
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder: word unigrams and bigrams hashed into `dim`
+    signed buckets, log-scaled and normalised to unit length. Needs no model
+    or network, so offline runs and tests use it. It matches wording rather
+    than meaning.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        words = [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+        # Figures all look alike; "<num> million" still says there is one
+        words = ["<num>" if w[0].isdigit() else w for w in words]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            h = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+            # Low bits pick the bucket, the top bit the sign
+            counts = np.bincount(h % self.dim, weights=np.where(h >> 31, -1.0, 1.0), minlength=self.dim)
+            out[row] = np.sign(counts) * np.log1p(np.abs(counts))
+        return _unit(out)
+
+
+class AzureEmbedder:
+    """
+    An Azure embeddings deployment, `batch_size` texts per request, on the
+    pooled client and (with LLM_SCHEDULER_ENABLED) within the deployment's
+    rate budget.
+    """
+
+    def __init__(self, model, batch_size=EMBEDDING_BATCH_SIZE):
+        self.model = model
+        self.batch_size = batch_size
+        self.name = f"azure-{model}"
+
+    def embed(self, texts):
+        # Imported here: the local embedder must work without the agent stack
+        from agent_registry import shared_client
+        from llm_scheduler import get_scheduler
+
+        client = shared_client()
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = list(texts[i:i + self.batch_size])
+            send = lambda: client.embeddings.create(model=self.model, input=batch)
+            if LLM_SCHEDULER_ENABLED:
+                tokens = sum(count_tokens(t) for t in batch)
+                response = get_scheduler().call(send, self.model, [], {}, tokens=tokens)
+            else:
+                response = send()
+            vectors.extend(d.embedding for d in sorted(response.data, key=lambda d: d.index))
+        return _unit(np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1))
+
+
+def get_embedder(backend=EMBEDDING_BACKEND):
+    """The configured embedder: Azure TEXT_EMBEDDING_MODEL, or the local one when none is set (or "local")."""
+    model = TEXT_EMBEDDING_MODEL or getenv("TEXT_EMBEDDING_MODEL")
+    if backend == "azure" and not model:
+        raise ValueError('EMBEDDING_BACKEND is "azure" but TEXT_EMBEDDING_MODEL is not set')
+    if backend in ("azure", "auto") and model:
+        return AzureEmbedder(model)
+    return HashingEmbedder()
+
+
+# ------------------------ Chunking ------------------------
+
+def document_lines(text, max_tokens=RETRIEVAL_CHUNK_TOKENS):
+    """
+    Non-empty lines with repeats (page headers and footers) dropped, as in
+    document_digest(). Lines longer than a chunk are split on words.
+    """
+    seen = set()
+    lines = []
+    max_chars = max_tokens * 3
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line in seen:
+            continue
+        seen.add(line)
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            lines.append(line[:cut])
+            line = line[cut:].lstrip()
+        if line:
+            lines.append(line)
+    return lines
+
+
+def chunk_lines(costs, max_tokens=RETRIEVAL_CHUNK_TOKENS, overlap=RETRIEVAL_CHUNK_OVERLAP):
+    """
+    (start, stop) line ranges of at most `max_tokens` (given each line's token
+    cost), each beginning with up to `overlap` tokens of the previous one so a
+    passage cut at a boundary is still whole in one chunk.
+    """
+    chunks = []
+    start, n = 0, len(costs)
+    while start < n:
+        stop, used = start, 0
+        while stop < n and (stop == start or used + costs[stop] <= max_tokens):
+            used += costs[stop]
+            stop += 1
+        chunks.append((start, stop))
+        if stop >= n:
+            break
+        back, carried = stop, 0
+        while back - 1 > start and carried + costs[back - 1] <= overlap:
+            back -= 1
+            carried += costs[back]
+        start = back
+    return chunks
+
+
+# ------------------------ Vector index ------------------------
+
+def _kmeans(vectors, k, seed=0, iterations=10):
+    """Spherical k-means: (unit centroids, assignment of each vector)."""
+    rng = np.random.default_rng(seed)
+    centroids = np.array(vectors[rng.choice(len(vectors), k, replace=False)], dtype=np.float32)
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        # A centroid that lost all its vectors keeps its place
+        filled = np.linalg.norm(sums, axis=1) > 0
+        centroids[filled] = _unit(sums[filled])
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class VectorIndex:
+    """
+    Unit vectors searched by cosine similarity.
+
+    Exact search is one matrix-vector product over every vector. An index
+    built `approximate` also groups the vectors under k-means centroids (an
+    IVF layout), and search then scores only the vectors under the `probes`
+    centroids nearest the query. That may miss a few neighbours but does not
+    grow linearly with the document.
+    """
+
+    def __init__(self, vectors, centroids=None, order=None, offsets=None):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, vectors, approximate=None, seed=0):
+        if approximate is None:
+            approximate = RETRIEVAL_ANN_MIN_CHUNKS is not None and len(vectors) >= RETRIEVAL_ANN_MIN_CHUNKS
+        if not approximate or len(vectors) < 4:
+            return cls(vectors)
+        centroids, assign = _kmeans(vectors, int(np.sqrt(len(vectors))), seed)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))])
+        return cls(vectors, centroids, order, offsets)
+
+    @property
+    def approximate(self):
+        return self.centroids is not None
+
+    def search(self, query, k, probes=RETRIEVAL_ANN_PROBES):
+        """(positions, scores) of the `k` best vectors for unit vector `query`, best first."""
+        if self.approximate:
+            nearest = np.argsort(-(self.centroids @ query), kind="stable")[:probes]
+            candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in nearest])
+            scores = self.vectors[candidates] @ query
+        else:
+            candidates = None
+            scores = self.vectors @ query
+        k = min(k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return (top if candidates is None else candidates[top]), scores[top]
+
+    def save(self, directory):
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        if self.approximate:
+            np.savez(os.path.join(directory, "ivf.npz"), centroids=self.centroids, order=self.order,
+                     offsets=self.offsets)
+
+    @classmethod
+    def load(cls, directory):
+        # Memory-mapped: only the rows a search touches are read
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        ivf = os.path.join(directory, "ivf.npz")
+        if not os.path.exists(ivf):
+            return cls(vectors)
+        with np.load(ivf) as f:
+            return cls(vectors, f["centroids"], f["order"], f["offsets"])
+
+
+class DocumentIndex:
+    """A document's lines, its chunks as line ranges, and one embedding per chunk."""
+
+    def __init__(self, lines, costs, chunks, index, embedder_name):
+        self.lines = lines
+        self.costs = costs
+        self.chunks = chunks
+        self.index = index
+        self.embedder_name = embedder_name
+
+    @classmethod
+    def build(cls, text, embedder):
+        lines = document_lines(text)
+        costs = [count_tokens(line + "\n") for line in lines]
+        chunks = chunk_lines(costs)
+        vectors = embedder.embed(["\n".join(lines[s:e]) for s, e in chunks])
+        return cls(lines, costs, chunks, VectorIndex.build(vectors), embedder.name)
+
+    def excerpt(self, query, max_tokens, top_k=RETRIEVAL_TOP_K):
+        """
+        The best of the `top_k` chunks for unit vector `query` that fit in
+        `max_tokens`, merged and in document order, with "[...]" where text
+        was left out. Weak matches (see MIN_RELATIVE_SCORE) are dropped, and
+        nothing is returned when even the best chunk does not score above zero.
+        """
+        positions, scores = self.index.search(query, top_k)
+        if not len(scores) or scores[0] <= 0:
+            return ""
+        chosen = set()
+        used = 0
+        for pos, score in zip(positions, scores):
+            if score < MIN_RELATIVE_SCORE * scores[0]:
+                break
+            start, stop = self.chunks[pos]
+            new = [i for i in range(start, stop) if i not in chosen]
+            cost = sum(self.costs[i] for i in new)
+            if used + cost > max_tokens:
+                continue
+            chosen.update(new)
+            used += cost
+        out = []
+        previous = -1
+        for i in sorted(chosen):
+            if out and i != previous + 1:
+                out.append("[...]")
+            out.append(self.lines[i])
+            previous = i
+        return "\n".join(out)
+
+    def save(self, directory):
+        tmp = directory + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        with open(os.path.join(tmp, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump({"embedder": self.embedder_name, "lines": self.lines, "costs": self.costs,
+                       "chunks": self.chunks}, f, ensure_ascii=False)
+        self.index.save(tmp)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp, directory)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "chunks.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        chunks = [tuple(c) for c in meta["chunks"]]
+        return cls(meta["lines"], meta["costs"], chunks, VectorIndex.load(directory), meta["embedder"])
+
+
+def index_key(text, embedder):
+    payload = json.dumps([INDEX_FORMAT_VERSION, embedder.name, RETRIEVAL_CHUNK_TOKENS, RETRIEVAL_CHUNK_OVERLAP,
+                          RETRIEVAL_ANN_MIN_CHUNKS])
+    h = hashlib.sha256(payload.encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+def document_index(text, embedder, root=RETRIEVAL_INDEX_DIR):
+    """The index for `text`, loaded from `root` when this text was indexed before with the same embedder."""
+    directory = os.path.join(root, index_key(text, embedder))
+    if os.path.isdir(directory):
+        try:
+            doc = DocumentIndex.load(directory)
+            # The directory's mtime is its last use, for eviction
+            os.utime(directory)
+            return doc
+        except (OSError, ValueError, KeyError):
+            pass
+    doc = DocumentIndex.build(text, embedder)
+    os.makedirs(root, exist_ok=True)
+    doc.save(directory)
+    _evict_indexes(root)
+    return doc
+
+
+def _evict_indexes(root, max_bytes=RETRIEVAL_INDEX_MAX_BYTES, max_age=RETRIEVAL_INDEX_MAX_AGE_SECONDS):
+    """Drop indexes unused for `max_age`, then the least recently used until `root` is under `max_bytes`."""
+    entries = []
+    for name in os.listdir(root):
+        full = os.path.join(root, name)
+        if not os.path.isdir(full) or name.endswith(".tmp"):
+            continue
+        try:
+            size = sum(os.path.getsize(os.path.join(full, f)) for f in os.listdir(full))
+            entries.append((os.stat(full).st_mtime, size, full))
+        except OSError:
+            continue
+    now = time.time()
+    total = sum(e[1] for e in entries)
+    for used, size, full in sorted(entries):
+        if total <= max_bytes and now - used <= max_age:
+            continue
+        shutil.rmtree(full, ignore_errors=True)
+        total -= size
+
+
+# ------------------------ Per-agent excerpts ------------------------
+
+def excerpt_budgets(queries):
+    # The ingest prompt is mostly the excerpt; leave room for its instruction
+    return {
+        name: int(PROMPT_TOKEN_BUDGETS["ingest"] * 0.9) if name == "ingest" else RETRIEVAL_EXCERPT_TOKENS
+        for name in queries
+    }
+
+
+def document_excerpts(text, queries=None, budgets=None, embedder=None):
+    """
+    Passages of a long document most relevant to each agent's query, as
+    {agent: text}. "ingest" gets most of the ingest budget, the others
+    RETRIEVAL_EXCERPT_TOKENS. None when retrieval is off or the document fits
+    in the ingest prompt whole.
+    """
+    if not RETRIEVAL_ENABLED or count_tokens(text) <= PROMPT_TOKEN_BUDGETS["ingest"]:
+        return None
+    queries = queries or RETRIEVAL_QUERIES
+    budgets = budgets or excerpt_budgets(queries)
+    with stage("retrieval") as entry:
+        embedder = embedder or get_embedder()
+        names = list(queries)
+
+        def search(embedder):
+            return document_index(text, embedder), embedder.embed([queries[name] for name in names])
+
+        try:
+            doc, vectors = search(embedder)
+        except Exception as e:
+            # Covers the query embeddings too: the document's index may come from disk
+            if EMBEDDING_BACKEND != "auto" or isinstance(embedder, HashingEmbedder):
+                raise
+            print(f"⚠️ Embeddings unavailable ({e}); using the local embedder")
+            embedder = HashingEmbedder()
+            doc, vectors = search(embedder)
+        excerpts = {name: doc.excerpt(vector, budgets[name]) for name, vector in zip(names, vectors)}
+        if entry is not None:
+            entry.update(chunks=len(doc.chunks), embedder=embedder.name, approximate=doc.index.approximate)
+    return excerpts
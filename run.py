@@ -1,7 +1,25 @@
 # run.py
 
-from coordinator import orchestrate
+import os
+import sys
+
+from config import LLM_REPLAY_MODE
+from coordinator import orchestrate, orchestrate_many
+from replay_model import enable_replay
+from worker_service import serve
 
 if __name__ == "__main__":
-    path = 'sample_input.pdf'
-    orchestrate(path, output_pdf="final_financial_report.pdf")
+    path = sys.argv[1] if len(sys.argv) > 1 else 'sample_input.pdf'
+    # LLM_REPLAY=record|replay|strict captures or replays model traffic (replay_model.py)
+    replay_mode = os.environ.get("LLM_REPLAY", LLM_REPLAY_MODE)
+    if replay_mode:
+        enable_replay(replay_mode)
+    if path == "serve":
+        # Worker mode: python run.py serve [inbox_dir] [output_dir]; jobs also via POST /jobs
+        serve(*sys.argv[2:4])
+    elif os.path.isdir(path):
+        # Batch mode: python run.py <input_dir> [output_dir]
+        out_dir = sys.argv[2] if len(sys.argv) > 2 else 'reports'
+        orchestrate_many(path, out_dir, workers=int(os.environ.get("REPORT_WORKERS", 8)))
+    else:
+        orchestrate(path, output_pdf="final_financial_report.pdf")
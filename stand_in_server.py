@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInServer:
+    """
+    Local HTTP stand-in for the Azure OpenAI chat completions endpoint, for
+    exercising the real SDK clients (agent_registry, llm_scheduler) offline.
+
+    Every POST is answered as a chat completion (streamed when asked) with
+    `reply`. With `rpm` the server enforces its own sliding 60-second window
+    and answers requests over it with 429 and Azure's retry-after headers,
+    like the real service; `fail` is a list of statuses returned, in order,
+    to the next requests before any succeed. HEAD requests (connection
+    warm-up) get a 404. Use as a context manager; `url` is the endpoint.
+
+    `requests` records the last message of each accepted request in arrival
+    order, `statuses` the status of every response, and `connections` the
+    client addresses seen, so connection reuse can be checked.
+    """
+
+    def __init__(self, rpm=None, fail=(), latency=0.0, reply="Stand-in analysis. Figures unchanged.",
+                 retry_after_ms=None, host="127.0.0.1", port=0):
+        self.rpm = rpm
+        self.fail = list(fail)
+        self.latency = latency
+        self.reply = reply
+        self.retry_after_ms = retry_after_ms
+        self.requests = []
+        self.statuses = []
+        self.connections = set()
+        self.heads = 0
+        self._window = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stand-in-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, status):
+        with self._lock:
+            return self.statuses.count(status)
+
+    def _admit(self, message):
+        """(status, headers) for the next request, recording it when accepted."""
+        now = time.monotonic()
+        with self._lock:
+            if self.fail:
+                status = self.fail.pop(0)
+                self.statuses.append(status)
+                wait_ms = self.retry_after_ms if self.retry_after_ms is not None else 100
+                return status, {"retry-after-ms": str(wait_ms)} if status == 429 else {}
+            while self._window and self._window[0] <= now - 60:
+                self._window.popleft()
+            if self.rpm is not None and len(self._window) >= self.rpm:
+                wait_ms = self.retry_after_ms
+                if wait_ms is None:
+                    wait_ms = int((self._window[0] + 60 - now) * 1000) + 1
+                self.statuses.append(429)
+                return 429, {"retry-after-ms": str(wait_ms), "retry-after": str(wait_ms // 1000 + 1)}
+            self._window.append(now)
+            self.requests.append(message)
+            self.statuses.append(200)
+            return 200, {}
+
+
+def _completion(text, stream):
+    if not stream:
+        return "application/json", json.dumps({
+            "id": "stand-in", "object": "chat.completion", "created": int(time.time()), "model": "stand-in",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 6, "total_tokens": 16},
+        })
+    events = []
+    for i, word in enumerate(text.split(" ")):
+        delta = {"role": "assistant", "content": word if i == 0 else " " + word}
+        events.append({"id": "stand-in", "object": "chat.completion.chunk", "created": 1, "model": "stand-in",
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+    events.append({"id": "stand-in", "object": "chat.completion.chunk", "created": 1, "model": "stand-in",
+                   "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    return "text/event-stream", "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+
+
+def _handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, body, content_type="application/json", headers=None):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_HEAD(self):
+            with server._lock:
+                server.connections.add(self.client_address)
+                server.heads += 1
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            with server._lock:
+                server.connections.add(self.client_address)
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            messages = body.get("messages") or [{}]
+            status, headers = server._admit(messages[-1].get("content"))
+            if status != 200:
+                error = {"error": {"code": str(status), "message": f"Stand-in status {status}"}}
+                return self._send(status, json.dumps(error), headers=headers)
+            if server.latency:
+                time.sleep(server.latency)
+            content_type, payload = _completion(server.reply, body.get("stream"))
+            self._send(200, payload, content_type)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
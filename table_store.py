@@ -0,0 +1,92 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# Key of our entry in the Arrow schema metadata
+METADATA_KEY = b"kroolo"
+TABLE_FORMAT_VERSION = 1
+
+
+def column_stats(s):
+    """Summary of one column for the table metadata: dtype, nulls and a range where it has one."""
+    out = {"dtype": str(s.dtype), "nulls": int(s.isna().sum())}
+    if pd.api.types.is_bool_dtype(s):
+        return out
+    if pd.api.types.is_numeric_dtype(s):
+        values = s.to_numpy(dtype="float64", na_value=np.nan)
+        values = values[~np.isnan(values)]
+        if values.size:
+            out.update(min=float(values.min()), max=float(values.max()), mean=float(values.mean()),
+                       std=float(values.std(ddof=1)) if values.size > 1 else 0.0)
+    elif pd.api.types.is_datetime64_any_dtype(s):
+        non_null = s.dropna()
+        if not non_null.empty:
+            out.update(start=non_null.min().isoformat(), end=non_null.max().isoformat())
+    elif isinstance(s.dtype, pd.CategoricalDtype):
+        out["distinct"] = len(s.cat.categories)
+    return out
+
+
+def table_metadata(df, source_digest=None, **extra):
+    """
+    What the stored table carries besides its data: where it came from, its
+    shape and dtypes, and per-column statistics, so the source never has to
+    be re-read (or the table loaded) just to describe it.
+    """
+    return {
+        "format_version": TABLE_FORMAT_VERSION,
+        "source_digest": source_digest,
+        "rows": int(len(df)),
+        "columns": {str(c): column_stats(df[c]) for c in df.columns},
+        "created": datetime.now().isoformat(timespec="seconds"),
+        **extra,
+    }
+
+
+def write_table(df, path, metadata=None):
+    """
+    Write `df` as an uncompressed Arrow IPC file with `metadata` in its schema.
+
+    Uncompressed IPC is what makes read_table() zero-copy: the column buffers
+    on disk are the ones the DataFrame ends up using. Raises when a column
+    cannot be represented in Arrow (e.g. mixed Python objects).
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema_meta = dict(table.schema.metadata or {})
+    schema_meta[METADATA_KEY] = json.dumps(metadata or table_metadata(df), default=str).encode("utf-8")
+    table = table.replace_schema_metadata(schema_meta)
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+    return path
+
+
+def read_table(path, columns=None):
+    """
+    Memory-map a table written by write_table().
+
+    Numeric, datetime and categorical columns are views of the mapped file, so
+    loading is O(1) and pages are only read when touched; several processes
+    mapping the same file share one copy in the page cache. Those columns are
+    read-only: assign new columns rather than writing into them.
+    """
+    with pa.memory_map(path) as source:
+        table = ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(list(columns))
+    return table.to_pandas(split_blocks=True)
+
+
+def read_metadata(path):
+    """The metadata dict of a stored table, without loading any column data."""
+    with pa.memory_map(path) as source:
+        schema = ipc.open_file(source).schema
+    raw = (schema.metadata or {}).get(METADATA_KEY)
+    return json.loads(raw) if raw else {}
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+import agent_registry
+from agent_registry import get_agent, shared_async_client, shared_client
+from stand_in_server import StandInServer
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Registry agents on PooledAzureOpenAI models pointed at a local stand-in endpoint."""
+    with StandInServer() as server:
+        monkeypatch.setattr(agent_registry, "AZURE_OPENAI_ENDPOINT", server.url)
+        monkeypatch.setattr(agent_registry, "AZURE_OPENAI_API_KEY", "test")
+        agent_registry.set_model_factory(None)
+        yield server
+        agent_registry.reset_registry()
+
+
+def _complete(agent):
+    response = agent.model.get_client().chat.completions.create(model=agent.model.id, messages=MESSAGES)
+    return response.choices[0].message.content
+
+
+def test_agents_share_one_pool_across_threads(server):
+    seen = []
+
+    def work(name):
+        agent = get_agent(name)
+        seen.append((name, agent, shared_client(), _complete(agent)))
+
+    # One thread at a time, so a reused keep-alive connection shows up as a single client address
+    for name in ("DataIngestAgent", "RiskAgent", "StrategyAgent", "RiskAgent"):
+        thread = threading.Thread(target=work, args=(name,))
+        thread.start()
+        thread.join()
+
+    assert isinstance(get_agent("RiskAgent").model, agent_registry.PooledAzureOpenAI)
+    assert len({id(client) for _, _, client, _ in seen}) == 1
+    assert seen[1][1] is seen[3][1]
+    assert all(text == server.reply for *_, text in seen)
+    assert len(server.requests) == 4
+    assert len(server.connections) == 1
+
+
+def test_one_async_client_per_event_loop(server):
+    async def run():
+        first, second = shared_async_client(), shared_async_client()
+        agent = get_agent("RiskAgent")
+        response = await agent.model.get_async_client().chat.completions.create(model=agent.model.id,
+                                                                                  messages=MESSAGES)
+        await agent_registry.aclose_http()
+        return first, second, response.choices[0].message.content
+
+    first, second, text = asyncio.run(run())
+    other, _, _ = asyncio.run(run())
+    assert first is second
+    assert other is not first
+    assert text == server.reply
+
+
+def test_warm_up_connects_to_the_endpoint(server):
+    assert agent_registry.warm_up() is True
+    assert asyncio.run(agent_registry.awarm_up()) is True
+    assert server.heads == 2
+    assert all(name in agent_registry._agents for name in agent_registry.PIPELINE_AGENTS)
+
+
+def test_warm_up_reports_an_unreachable_endpoint(server, monkeypatch):
+    with StandInServer() as closed:
+        url = closed.url
+    monkeypatch.setattr(agent_registry, "AZURE_OPENAI_ENDPOINT", url)
+    agent_registry.reset_registry()
+    assert agent_registry.warm_up() is False
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_starts_with_fresh_state(server):
+    parent_client = shared_client()
+    parent_agent = get_agent("RiskAgent")
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            fresh = shared_client() is not parent_client and get_agent("RiskAgent") is not parent_agent
+            code = 0 if fresh and _complete(get_agent("RiskAgent")) == server.reply else 1
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # The parent's pool is untouched
+    assert shared_client() is parent_client
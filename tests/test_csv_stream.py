@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from csv_stream import TableProfiler, read_csv_from, stream_csv_profile
+
+
+def _table(rows, start=0, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "date": pd.date_range("2020-01-01", periods=rows).shift(start, freq="D").strftime("%Y-%m-%d"),
+        "price": rng.normal(100, 5, rows).round(4),
+        "sector": rng.choice(["energy", "tech", "banks"], rows),
+    })
+
+
+def _assert_same_profile(actual, expected):
+    assert actual["rows"] == expected["rows"]
+    assert actual["sample_rows"] == expected["sample_rows"]
+    assert actual["columns"].keys() == expected["columns"].keys()
+    for name, stats in expected["columns"].items():
+        for key, value in stats.items():
+            if isinstance(value, float):
+                assert actual["columns"][name][key] == pytest.approx(value)
+            else:
+                assert actual["columns"][name][key] == value
+
+
+def test_read_csv_from_parses_appended_rows_under_the_header(tmp_path):
+    path = tmp_path / "prices.csv"
+    _table(50).to_csv(path, index=False)
+    offset = path.stat().st_size
+    appended = _table(25, start=50, seed=1)
+    appended.to_csv(path, mode="a", header=False, index=False)
+
+    whole = read_csv_from(str(path), offset)
+    chunks = list(read_csv_from(str(path), offset, chunksize=10))
+
+    assert [len(c) for c in chunks] == [10, 10, 5]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), whole)
+    pd.testing.assert_frame_equal(whole, appended)
+
+
+def test_incremental_profile_matches_full_profile(tmp_path):
+    path = tmp_path / "prices.csv"
+    _table(300).to_csv(path, index=False)
+    offset = path.stat().st_size
+
+    profiler = TableProfiler()
+    for chunk in pd.read_csv(path, chunksize=100, low_memory=False):
+        profiler.update(chunk)
+    _table(200, start=300, seed=1).to_csv(path, mode="a", header=False, index=False)
+    for chunk in read_csv_from(str(path), offset, chunksize=100):
+        profiler.update(chunk)
+
+    expected = stream_csv_profile(str(path), chunksize=100).to_dict()
+    _assert_same_profile(profiler.profile(str(path)).to_dict(), expected)
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import openai
+import pytest
+from openai import AsyncAzureOpenAI, AzureOpenAI
+
+from config import API_VERSION, AZURE_OPENAI_DEPLOYMENT
+from llm_scheduler import LLMScheduler, llm_priority, scheduled, set_scheduler
+from stand_in_server import StandInServer
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def use_scheduler():
+    """Install a scheduler for the test; the process-wide one is rebuilt afterwards."""
+    def install(**options):
+        scheduler = LLMScheduler(**options)
+        set_scheduler(scheduler)
+        return scheduler
+    yield install
+    set_scheduler(None)
+
+
+def _client(server, is_async=False):
+    # SDK retries off, as in agent_registry: only the scheduler retries
+    cls = AsyncAzureOpenAI if is_async else AzureOpenAI
+    return scheduled(cls(api_key="test", azure_endpoint=server.url, api_version=API_VERSION, max_retries=0),
+                     is_async=is_async)
+
+
+def test_recovers_from_429_after_retry_after(use_scheduler):
+    scheduler = use_scheduler(limits={}, base_delay=0.01, max_retries=5)
+    with StandInServer(fail=[429, 429, 429], retry_after_ms=200) as server:
+        started = time.monotonic()
+        response = _client(server).chat.completions.create(model=AZURE_OPENAI_DEPLOYMENT, messages=MESSAGES)
+        elapsed = time.monotonic() - started
+
+    assert response.choices[0].message.content == server.reply
+    assert server.statuses == [429, 429, 429, 200]
+    # Never sooner than the service asked
+    assert elapsed >= 0.6
+    stats = scheduler.stats()[AZURE_OPENAI_DEPLOYMENT]
+    assert (stats["rate_limited"], stats["retries"], stats["failed"]) == (3, 3, 0)
+
+
+def test_gives_up_after_max_retries(use_scheduler):
+    scheduler = use_scheduler(limits={}, base_delay=0.01, max_retries=2)
+    with StandInServer(fail=[429, 429, 429], retry_after_ms=10) as server:
+        with pytest.raises(openai.RateLimitError):
+            _client(server).chat.completions.create(model=AZURE_OPENAI_DEPLOYMENT, messages=MESSAGES)
+    assert server.statuses == [429, 429, 429]
+    assert scheduler.stats()[AZURE_OPENAI_DEPLOYMENT]["failed"] == 1
+
+
+def test_does_not_retry_client_errors(use_scheduler):
+    use_scheduler(limits={}, base_delay=0.01)
+    with StandInServer(fail=[400]) as server:
+        with pytest.raises(openai.BadRequestError):
+            _client(server).chat.completions.create(model=AZURE_OPENAI_DEPLOYMENT, messages=MESSAGES)
+    assert server.statuses == [400]
+
+
+def test_enforces_rpm_locally(use_scheduler):
+    # 120 RPM with one second of burst: 2 requests at once, then one every ~0.51s
+    scheduler = use_scheduler(limits={AZURE_OPENAI_DEPLOYMENT: {"rpm": 120}}, base_delay=0.01, burst_seconds=1)
+    with StandInServer(rpm=120) as server:
+        client = _client(server)
+        started = time.monotonic()
+        for _ in range(6):
+            client.chat.completions.create(model=AZURE_OPENAI_DEPLOYMENT, messages=MESSAGES)
+        elapsed = time.monotonic() - started
+
+    assert server.count(429) == 0
+    assert 1.8 <= elapsed < 4.0
+    assert scheduler.stats()[AZURE_OPENAI_DEPLOYMENT]["granted"] == 6
+
+
+def test_interactive_requests_go_before_queued_batch_requests(use_scheduler):
+    scheduler = use_scheduler(limits={AZURE_OPENAI_DEPLOYMENT: {"rpm": 120}}, base_delay=0.01, burst_seconds=1)
+
+    async def main(server):
+        client = _client(server, is_async=True)
+
+        async def call(tag, priority):
+            with llm_priority(priority):
+                await client.chat.completions.create(model=AZURE_OPENAI_DEPLOYMENT,
+                                                     messages=[{"role": "user", "content": tag}])
+
+        batch = [asyncio.create_task(call(f"batch{i}", "batch")) for i in range(4)]
+        await asyncio.sleep(0.1)
+        interactive = [asyncio.create_task(call(f"interactive{i}", "interactive")) for i in range(2)]
+        await asyncio.gather(*batch, *interactive)
+
+    with StandInServer() as server:
+        asyncio.run(main(server))
+
+    # Two batch requests fit the burst; the interactive ones overtake the batch ones still queued
+    assert sorted(server.requests[:2]) == ["batch0", "batch1"]
+    assert server.requests[2:4] == ["interactive0", "interactive1"]
+    assert sorted(server.requests[4:]) == ["batch2", "batch3"]
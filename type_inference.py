@@ -0,0 +1,195 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from config import (
+    NORMALIZE_CATEGORY_MAX_RATIO,
+    NORMALIZE_FLOAT32_ATOL,
+    NORMALIZE_MIN_PARSED,
+    NORMALIZE_SAMPLE_ROWS,
+)
+
+# Cells that mean "no value" in financial exports
+_MISSING = r"(?i)^(?:|-|--|—|–|n/?a|na|nan|none|null|#n/a|#value!|#div/0!)$"
+_CURRENCY = r"[$€£¥₹]|\b(?:USD|EUR|GBP|JPY|INR|CHF|CAD|AUD)\b"
+# Decorations stripped before parsing: currency symbols and codes,
+# whitespace and accounting parentheses
+_DECORATION = rf"[\s()]|{_CURRENCY}"
+# Only commas in thousands positions: "1,234,567.5" loses them, "1,5" (a decimal comma) does not parse
+_THOUSANDS = r"(?<=\d),(?=\d{3}(?!\d))"
+# Trailing multipliers, longest first so "bn" is not read as "b". The one-letter
+# ones scale only amounts in a currency: "5m" alone may be five minutes
+_SUFFIXES = (("%", 0.01), ("bn", 1e9), ("mn", 1e6), ("k", 1e3), ("m", 1e6), ("b", 1e9))
+
+
+def memory_mb(df):
+    return round(float(df.memory_usage(deep=True).sum()) / 2**20, 2)
+
+
+def _as_text(s):
+    return s if isinstance(s.dtype, pd.StringDtype) else s.astype("str")
+
+
+def parse_financial_numbers(s):
+    """
+    Parse formatted numbers in bulk: currency symbols and codes, thousands
+    separators, accounting negatives "(1,234)", percentages ("12.5%" -> 0.125)
+    and mn/bn suffixes, plus K/M/B on currency amounts ("$3.5M"). Unparseable
+    cells become NaN.
+    """
+    text = _as_text(s).str.strip()
+    text = text.mask(text.str.fullmatch(_MISSING, na=False))
+    negative = text.str.startswith("(", na=False) & text.str.endswith(")", na=False)
+    currency = text.str.contains(_CURRENCY, na=False).to_numpy(dtype=bool)
+    text = text.str.replace(_DECORATION, "", regex=True).str.replace(_THOUSANDS, "", regex=True)
+    # Every step is a whole-column string kernel; no per-cell Python regex
+    factor = np.ones(len(text))
+    lower = text.str.lower()
+    unmatched = np.ones(len(text), dtype=bool)
+    for suffix, scale in _SUFFIXES:
+        hit = lower.str.endswith(suffix, na=False).to_numpy(dtype=bool) & unmatched
+        if len(suffix) == 1 and suffix != "%":
+            hit &= currency
+        if hit.any():
+            factor[hit] = scale
+            text = text.mask(hit, text.str[:-len(suffix)])
+            unmatched &= ~hit
+    values = pd.to_numeric(text, errors="coerce").to_numpy(dtype="float64", na_value=np.nan, copy=True)
+    values *= factor
+    values[negative.to_numpy(dtype=bool)] *= -1
+    return pd.Series(values, index=s.index, name=s.name)
+
+
+def parse_dates(s):
+    """
+    Parse date strings in bulk: the format guessed from the first value is
+    applied vectorised, and only the cells it misses go through pandas' slow
+    per-value "mixed" parser.
+    """
+    text = _as_text(s).str.strip()
+    non_null = text.dropna()
+    if non_null.empty:
+        return pd.to_datetime(text, errors="coerce")
+    fmt = guess_datetime_format(str(non_null.iloc[0]))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        dates = pd.to_datetime(text, format=fmt or "mixed", errors="coerce")
+        rest = dates.isna() & text.notna()
+        if fmt and rest.any():
+            dates[rest] = pd.to_datetime(text[rest], format="mixed", errors="coerce")
+    return dates
+
+
+def _parsed_share(parsed, original):
+    present = original.notna().sum()
+    return parsed.notna().sum() / present if present else 0.0
+
+
+def infer_column(s, min_parsed=NORMALIZE_MIN_PARSED, sample_rows=NORMALIZE_SAMPLE_ROWS):
+    """
+    (kind, series) for one text column: "numeric" or "date" when at least
+    `min_parsed` of the non-empty cells parse, else "text". The decision is
+    made on a sample so text columns are never parsed in full.
+    """
+    text = _as_text(s)
+    text = text.mask(text.str.strip().str.fullmatch(_MISSING, na=False))
+    present = text.dropna()
+    if present.empty:
+        return "empty", s
+    sample = present.sample(min(sample_rows, len(present)), random_state=0) if len(present) > sample_rows else present
+
+    if _parsed_share(parse_financial_numbers(sample), sample) >= min_parsed:
+        values = parse_financial_numbers(text)
+        if _parsed_share(values, text) >= min_parsed:
+            return "numeric", values
+    if _parsed_share(parse_dates(sample), sample) >= min_parsed:
+        dates = parse_dates(text)
+        if _parsed_share(dates, text) >= min_parsed:
+            return "date", dates
+    return "text", s
+
+
+def downcast(s, float32_atol=NORMALIZE_FLOAT32_ATOL, category_max_ratio=NORMALIZE_CATEGORY_MAX_RATIO):
+    """
+    Smallest dtype that holds the column: integer columns to the narrowest
+    integer type, whole-valued floats without gaps to int32 (int64 when they
+    do not fit; never narrower, so sums and products of what were floats
+    cannot overflow a tiny type), other floats to float32 when every value
+    survives the round trip within `float32_atol` (None keeps float64),
+    repetitive text to categorical.
+    """
+    if pd.api.types.is_bool_dtype(s) or isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        return pd.to_numeric(s, downcast="integer")
+    if pd.api.types.is_float_dtype(s):
+        values = s.to_numpy(dtype="float64", na_value=np.nan)
+        finite = values[np.isfinite(values)]
+        if finite.size == values.size and finite.size and np.all(finite == np.round(finite)) \
+                and np.abs(finite).max() < 2**53:
+            return s.astype("int32" if np.abs(finite).max() < 2**31 else "int64")
+        if float32_atol is not None and finite.size:
+            if np.abs(finite).max() < np.finfo(np.float32).max \
+                    and np.abs(finite.astype(np.float32) - finite).max() <= float32_atol:
+                return s.astype("float32")
+        return s
+    if pd.api.types.is_string_dtype(s) or s.dtype == object:
+        present = s.count()
+        if present and s.nunique() <= category_max_ratio * present:
+            return s.astype("category")
+    return s
+
+
+def normalize_financial_table(df: pd.DataFrame, report=None):
+    """
+    Clean a loaded table and give every column its real type.
+
+    Drops fully empty rows, tidies the headers, parses formatted numbers and
+    date columns (see infer_column()) and downcasts everything (see
+    downcast()). With a `report` dict, fills in memory before/after in MB and
+    the kind inferred for each converted column.
+    """
+    if report is not None:
+        report["memory_before_mb"] = memory_mb(df)
+    df = df.dropna(how="all")
+    df.columns = [str(c).strip().replace("\n", "_") for c in df.columns]
+    columns = []
+    converted = {}
+    for i, col in enumerate(df.columns):
+        s = df.iloc[:, i]
+        if pd.api.types.is_string_dtype(s) or s.dtype == object:
+            kind, s = infer_column(s)
+            if kind in ("numeric", "date"):
+                converted[col] = kind
+        columns.append(downcast(s))
+    # Built by position, so duplicate header names survive
+    out = pd.DataFrame(dict(enumerate(columns)), index=df.index)
+    out.columns = df.columns
+    if report is not None:
+        report["memory_after_mb"] = memory_mb(out)
+        report["converted"] = converted
+    return out
+
+
+def append_rows(df, rows):
+    """
+    `df` with `rows` (the same columns, normalized on their own) appended.
+
+    Cells of appended rows are parsed to the numeric/date type the column
+    already has, and columns whose dtypes disagree are downcast again over the
+    combined values, so e.g. categories are merged and narrow integers widen.
+    """
+    rows = rows.copy()
+    for i in range(df.shape[1]):
+        s, new = df.iloc[:, i], rows.iloc[:, i]
+        if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_numeric_dtype(new):
+            rows.isetitem(i, parse_financial_numbers(new))
+        elif pd.api.types.is_datetime64_any_dtype(s) and not pd.api.types.is_datetime64_any_dtype(new):
+            rows.isetitem(i, parse_dates(new))
+    out = pd.concat([df, rows], ignore_index=True)
+    for i in range(out.shape[1]):
+        if out.dtypes.iloc[i] != df.dtypes.iloc[i]:
+            out.isetitem(i, downcast(out.iloc[:, i]))
+    return out
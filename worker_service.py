@@ -0,0 +1,533 @@
+import asyncio
+import itertools
+import json
+import os
+import random
+import shutil
+import signal
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agent_registry import aclose_http, awarm_up
+from config import (
+    WORKER_CONCURRENCY,
+    WORKER_HISTORY,
+    WORKER_HOST,
+    WORKER_INBOX,
+    WORKER_MAX_RETRIES,
+    WORKER_OUT_DIR,
+    WORKER_POLL_SECONDS,
+    WORKER_PORT,
+    WORKER_QUEUE_SIZE,
+    WORKER_RETRY_BACKOFF,
+    WORKER_SHUTDOWN_TIMEOUT,
+    WORKER_SLOWDOWN_FACTOR,
+)
+from coordinator import SUPPORTED_EXTENSIONS, _report_one, is_load_error, report_path_for
+from instrumentation import write_record
+from llm_cache import get_llm_cache
+from llm_scheduler import PRIORITIES, get_scheduler, llm_priority
+from report_utils import report_pool
+
+# Sub-directories of the inbox that watched files move through
+PROCESSING, DONE, FAILED = ".processing", ".done", ".failed"
+
+FINISHED = ("ok", "failed", "cancelled")
+
+
+class QueueFullError(Exception):
+    """The job queue is at capacity; the caller should retry later."""
+
+
+class ShuttingDownError(Exception):
+    """The service is draining and takes no new jobs."""
+
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, input_path, output_pdf, source, name=None, priority="interactive"):
+        self.id = f"{next(self._ids):05d}-{uuid.uuid4().hex[:8]}"
+        self.input = input_path
+        self.output = output_pdf
+        self.source = source
+        self.priority = priority
+        self.name = name or os.path.basename(input_path)
+        self.status = "queued"
+        self.attempts = 0
+        self.error = None
+        self.result = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "input": self.input,
+            "output": self.output,
+            "source": self.source,
+            "priority": self.priority,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "submitted_at": datetime.fromtimestamp(self.submitted_at).isoformat(timespec="seconds"),
+            "queued_seconds": round((self.started_at or time.time()) - self.submitted_at, 3),
+            "seconds": round(self.finished_at - self.started_at, 3) if self.finished_at and self.started_at else None,
+            "result": self.result,
+        }
+
+
+class AdaptiveLimit:
+    """
+    How many jobs may be in flight, adjusted to how fast the model answers.
+
+    `async with limit:` wraps the model-bound part of a job (the agent
+    pipeline) and records its duration. When the smoothed duration exceeds
+    `slowdown` times the best seen so far, the limit is halved, so a slow or
+    throttling endpoint gets fewer concurrent requests and the queue fills
+    up instead; every run of fast completions raises it by one again, up to
+    `maximum`. The baseline creeps up slowly so a shift to larger documents
+    does not keep the service throttled forever.
+    """
+
+    def __init__(self, maximum, slowdown=WORKER_SLOWDOWN_FACTOR, alpha=0.3):
+        self.maximum = maximum
+        self.limit = maximum
+        self.active = 0
+        self.slowdown = slowdown
+        self.alpha = alpha
+        self.ewma = None
+        self.baseline = None
+        self._streak = 0
+        self._room = asyncio.Condition()
+        self._started = {}
+
+    async def acquire(self):
+        async with self._room:
+            await self._room.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self):
+        async with self._room:
+            self.active -= 1
+            self._room.notify_all()
+
+    def observe(self, seconds):
+        self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+        self.baseline = self.ewma if self.baseline is None else min(self.ewma, self.baseline * 1.05)
+        if self.ewma > self.slowdown * self.baseline:
+            if self.limit > 1:
+                self.limit = max(1, self.limit // 2)
+                print(f"🐢 Model calls slowed to {self.ewma:.1f}s (usual {self.baseline:.1f}s); "
+                      f"concurrency down to {self.limit}")
+            self._streak = 0
+        else:
+            self._streak += 1
+            if self._streak >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._streak = 0
+
+    async def __aenter__(self):
+        self._started[asyncio.current_task()] = time.perf_counter()
+
+    async def __aexit__(self, *exc):
+        self.observe(time.perf_counter() - self._started.pop(asyncio.current_task()))
+        async with self._room:
+            self._room.notify_all()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "maximum": self.maximum,
+            "active": self.active,
+            "model_seconds": round(self.ewma, 3) if self.ewma is not None else None,
+            "baseline_seconds": round(self.baseline, 3) if self.baseline is not None else None,
+        }
+
+
+class WorkerService:
+    """
+    Report generation as a long-running process.
+
+    Modules, agents, the model's HTTP pool and the parse/render process pools
+    are set up once, so each job only pays for parsing, model calls and
+    rendering. Jobs arrive from a watched directory (`inbox`) and/or a local
+    HTTP endpoint and wait in a bounded queue; when it is full, HTTP
+    submissions get 429 and watched files stay in the inbox until there is
+    room. Failed jobs are retried with exponential backoff, except when the
+    input itself cannot be loaded. stop() stops intake, lets running jobs
+    finish and hands queued watched files back to the inbox.
+
+    Finished jobs are appended to `out_dir/jobs.jsonl`.
+    """
+
+    def __init__(self, inbox=WORKER_INBOX, out_dir=WORKER_OUT_DIR, host=WORKER_HOST, port=WORKER_PORT,
+                 concurrency=WORKER_CONCURRENCY, queue_size=WORKER_QUEUE_SIZE, max_retries=WORKER_MAX_RETRIES,
+                 retry_backoff=WORKER_RETRY_BACKOFF, poll_seconds=WORKER_POLL_SECONDS,
+                 shutdown_timeout=WORKER_SHUTDOWN_TIMEOUT):
+        self.inbox = inbox
+        self.out_dir = out_dir
+        self.host = host
+        self.port = port
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.poll_seconds = poll_seconds
+        self.shutdown_timeout = shutdown_timeout
+        self.jobs = OrderedDict()
+        self.counts = {"submitted": 0, "ok": 0, "failed": 0, "retried": 0, "cancelled": 0}
+        self.started_at = None
+        self.loop = None
+        self.queue = None
+        self.limit = None
+        self._stopping = None
+        self._running = set()
+        self._retries = set()
+        self._claimed = set()
+        self._http = None
+
+    @property
+    def log_path(self):
+        return os.path.join(self.out_dir, "jobs.jsonl")
+
+    # ------------------------ Intake ------------------------
+
+    def submit(self, input_path, output_pdf=None, source="api", name=None, priority="interactive"):
+        """
+        Queue a report for `input_path`. Must be called on the service's event
+        loop. `priority` orders its model calls against other jobs' (see
+        llm_scheduler.PRIORITIES); the queue itself is first come, first served.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority!r} (expected one of {', '.join(PRIORITIES)})")
+        if self._stopping.is_set():
+            raise ShuttingDownError("Worker is shutting down")
+        if self.queue.full():
+            raise QueueFullError(f"Job queue is full ({self.queue_size} waiting)")
+        job = Job(input_path, output_pdf or report_path_for(name or input_path, self.out_dir), source, name, priority)
+        self.queue.put_nowait(job)
+        self._remember(job)
+        self.counts["submitted"] += 1
+        return job
+
+    def submit_threadsafe(self, input_path, output_pdf=None, priority="interactive", timeout=10):
+        """submit() from another thread (the HTTP server's)."""
+        async def call():
+            return self.submit(input_path, output_pdf, source="http", priority=priority).to_dict()
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result(timeout)
+
+    def _remember(self, job):
+        self.jobs[job.id] = job
+        while len(self.jobs) > WORKER_HISTORY:
+            oldest = next(iter(self.jobs.values()))
+            if oldest.status not in FINISHED:
+                break
+            self.jobs.popitem(last=False)
+
+    async def _watch_inbox(self):
+        """Claim new files from the inbox while there is room in the queue."""
+        for sub in (PROCESSING, DONE, FAILED):
+            os.makedirs(os.path.join(self.inbox, sub), exist_ok=True)
+        # Files left mid-job by a previous run go back to the inbox
+        for name in os.listdir(os.path.join(self.inbox, PROCESSING)):
+            os.replace(os.path.join(self.inbox, PROCESSING, name), os.path.join(self.inbox, name))
+        sizes = {}
+        while not self._stopping.is_set():
+            for name in sorted(os.listdir(self.inbox)):
+                path = os.path.join(self.inbox, name)
+                if not os.path.isfile(path) or not name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    continue
+                # Only files whose size held still for one poll: copies may still be in progress
+                size = os.path.getsize(path)
+                if sizes.get(name) != size:
+                    sizes[name] = size
+                    continue
+                if self.queue.full():
+                    break
+                sizes.pop(name, None)
+                claimed = os.path.join(self.inbox, PROCESSING, name)
+                os.replace(path, claimed)
+                self._claimed.add(claimed)
+                # Dropped files are unattended work: their model calls yield to API jobs
+                self.submit(claimed, source="inbox", name=name, priority="batch")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _file_away(self, job):
+        """Move a finished watched file to .done or .failed; cancelled ones go back to the inbox."""
+        if job.source != "inbox" or job.input not in self._claimed:
+            return
+        self._claimed.discard(job.input)
+        folder = {"ok": DONE, "failed": FAILED, "cancelled": ""}[job.status]
+        target = os.path.join(self.inbox, folder, job.name)
+        shutil.move(job.input, target)
+        job.input = target
+
+    # ------------------------ Execution ------------------------
+
+    async def _unless_stopping(self, aw):
+        """Await `aw`, or cancel it and return None once stop() is called."""
+        task = asyncio.ensure_future(aw)
+        stop = asyncio.ensure_future(self._stopping.wait())
+        await asyncio.wait({task, stop}, return_when=asyncio.FIRST_COMPLETED)
+        stop.cancel()
+        if task.done():
+            return task.result()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return None
+
+    async def _dispatch(self, parse_pool, render_pool):
+        while not self._stopping.is_set():
+            job = await self._unless_stopping(self.queue.get())
+            if job is None:
+                return
+            # Wait for a free slot before starting: while the model is slow, jobs stay queued
+            if not await self._unless_stopping(self._acquire()):
+                self._cancel(job)
+                return
+            task = asyncio.create_task(self._run(job, parse_pool, render_pool))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _acquire(self):
+        await self.limit.acquire()
+        return True
+
+    async def _run(self, job, parse_pool, render_pool):
+        try:
+            job.status = "running"
+            job.attempts += 1
+            job.started_at = job.started_at or time.time()
+            with llm_priority(job.priority):
+                result = await _report_one(job.input, self.out_dir, parse_pool, render_pool, self.limit,
+                                           output_pdf=job.output)
+            result.pop("metrics", None)
+            job.result = {k: v for k, v in result.items() if k not in ("input", "status", "error")}
+            job.error = result["error"]
+        except asyncio.CancelledError:
+            job.status, job.error = "cancelled", "cancelled during shutdown"
+            self._finish(job)
+            raise
+        finally:
+            await self.limit.release()
+
+        if job.error is None:
+            job.status = "ok"
+        elif is_load_error(job.error) or job.attempts > self.max_retries or self._stopping.is_set():
+            job.status = "failed"
+        else:
+            delay = self.retry_backoff * 2 ** (job.attempts - 1) * random.uniform(0.8, 1.2)
+            job.status = "retrying"
+            self.counts["retried"] += 1
+            print(f"🔁 {job.name}: attempt {job.attempts} failed, retrying in {delay:.1f}s: {job.error}")
+            task = asyncio.create_task(self._retry(job, delay))
+            self._retries.add(task)
+            task.add_done_callback(self._retries.discard)
+            return
+        self._finish(job)
+
+    async def _retry(self, job, delay):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            job.status = "queued"
+            # The queue may be full; nothing takes from it once stop() is called
+            if await self._unless_stopping(self._requeue(job)):
+                return
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            self._finish(job)
+            raise
+        job.status = "cancelled"
+        self._finish(job)
+
+    async def _requeue(self, job):
+        await self.queue.put(job)
+        return True
+
+    def _finish(self, job):
+        job.finished_at = time.time()
+        self.counts[job.status] += 1
+        self._file_away(job)
+        write_record(job.to_dict(), self.log_path)
+        icon = {"ok": "📘", "failed": "❌", "cancelled": "⏹️"}[job.status]
+        print(f"{icon} {job.name}: {job.status} after {job.attempts} attempt(s)"
+              + (f" - {job.error}" if job.error else ""))
+
+    # ------------------------ Status ------------------------
+
+    def status(self):
+        return {
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "stopping": self._stopping.is_set(),
+            "queued": self.queue.qsize(),
+            "queue_size": self.queue_size,
+            "running": len(self._running),
+            "concurrency": self.limit.stats(),
+            "jobs": dict(self.counts),
+            "llm_cache": get_llm_cache().stats(),
+            "llm_scheduler": get_scheduler().stats(),
+        }
+
+    def status_threadsafe(self, job_id=None, timeout=10):
+        async def call():
+            if job_id is None:
+                return self.status()
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job else None
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result(timeout)
+
+    def list_threadsafe(self, limit=100, timeout=10):
+        async def call():
+            return [job.to_dict() for job in list(self.jobs.values())[-limit:]]
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result(timeout)
+
+    # ------------------------ Lifecycle ------------------------
+
+    def stop(self):
+        """Stop taking jobs; running ones finish (see run())."""
+        if not self._stopping.is_set():
+            print("🛑 Shutting down: no new jobs, waiting for running ones")
+            self._stopping.set()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.queue_size)
+        self.limit = AdaptiveLimit(self.concurrency)
+        self._stopping = asyncio.Event()
+        self.started_at = time.time()
+        os.makedirs(self.out_dir, exist_ok=True)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sig, self._on_signal)
+            except (NotImplementedError, RuntimeError):  # Windows, or not the main thread
+                pass
+
+        if await awarm_up():
+            print("✅ Agents ready")
+        else:
+            print("⚠️ Model endpoint not reachable yet; continuing")
+
+        with ProcessPoolExecutor(max_workers=self.concurrency) as parse_pool, \
+                report_pool(self.concurrency) as render_pool:
+            tasks = [asyncio.create_task(self._dispatch(parse_pool, render_pool))]
+            if self.inbox:
+                tasks.append(asyncio.create_task(self._watch_inbox()))
+            if self.port is not None:
+                self._start_http()
+            sources = [s for s in (self.inbox and f"watching {self.inbox}/",
+                                   self.port is not None and f"http://{self.host}:{self.port}") if s]
+            print(f"🚀 Worker up ({', '.join(sources)}), {self.concurrency} concurrent jobs")
+            try:
+                await self._stopping.wait()
+                await asyncio.gather(*tasks)
+                await self._drain()
+            finally:
+                if self._http is not None:
+                    self._http.shutdown()
+                    self._http.server_close()
+        await aclose_http()
+        print(f"📘 Worker stopped: {self.counts}")
+        return self.counts
+
+    async def _drain(self):
+        if self._running:
+            done, pending = await asyncio.wait(set(self._running), timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._retries:
+            # Retries see the stop at once; the timeout only guards against one stuck on the way out
+            done, pending = await asyncio.wait(set(self._retries), timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        # Jobs that never started; watched files go back to the inbox for the next run
+        while not self.queue.empty():
+            self._cancel(self.queue.get_nowait())
+
+    def _cancel(self, job):
+        job.status, job.error = "cancelled", "service stopped before the job started"
+        self._finish(job)
+
+    def _on_signal(self):
+        if self._stopping.is_set():
+            # Second signal: do not wait for running jobs
+            for task in self._running:
+                task.cancel()
+        self.stop()
+
+    def _start_http(self):
+        self._http = ThreadingHTTPServer((self.host, self.port), _handler(self))
+        self._http.daemon_threads = True
+        threading.Thread(target=self._http.serve_forever, name="worker-http", daemon=True).start()
+
+
+def _handler(service):
+    class JobHandler(BaseHTTPRequestHandler):
+        """
+        POST /jobs {"input": path, "output": optional pdf path, "priority": optional} -> 202 job
+        GET /jobs, GET /jobs/<id>, GET /health
+        """
+
+        def _send(self, code, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path == "/health":
+                return self._send(200, service.status_threadsafe())
+            if path == "/jobs":
+                return self._send(200, service.list_threadsafe())
+            if path.startswith("/jobs/"):
+                job = service.status_threadsafe(path[len("/jobs/"):])
+                return self._send(200, job) if job else self._send(404, {"error": "unknown job"})
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                return self._send(404, {"error": "not found"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                input_path = os.path.abspath(body["input"])
+            except (ValueError, KeyError, TypeError):
+                return self._send(400, {"error": 'expected a JSON body like {"input": "path/to/file.csv"}'})
+            if not os.path.isfile(input_path):
+                return self._send(404, {"error": f"no such file: {input_path}"})
+            try:
+                job = service.submit_threadsafe(input_path, body.get("output"), body.get("priority", "interactive"))
+            except ValueError as e:
+                return self._send(400, {"error": str(e)})
+            except QueueFullError as e:
+                return self._send(429, {"error": str(e)}, {"Retry-After": str(max(1, round(service.retry_backoff)))})
+            except ShuttingDownError as e:
+                return self._send(503, {"error": str(e)})
+            self._send(202, job, {"Location": f"/jobs/{job['id']}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return JobHandler
+
+
+def serve(inbox=WORKER_INBOX, out_dir=WORKER_OUT_DIR, **options):
+    """Run a WorkerService until SIGINT/SIGTERM."""
+    return asyncio.run(WorkerService(inbox, out_dir, **options).run())